@@ -1,34 +1,74 @@
-import sys
+import argparse
+import multiprocessing
 import requests
-import json
 import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from http_cache import HttpCache
+from image_cache import IMAGE_EXTENSIONS, ImageCache, with_real_extension
+from parser_backend import available_backends, make_soup
+from rate_control import ControlledSession, RequestController
+from response_archive import ArchivingSession, ReplaySession, ResponseArchive
+from selector_engine import get_engine
+from tmdb_extract import build_json_data
+from tmdb_page import english_url, print_details, scrape_movie_page, unenglish_url
+from tmdb_scraper import read_batch_urls, save_to_json
 
 def transform_url_to_filename(url):
     stripped = url.replace("https://", "").replace("http://", "")
     return "site-" + stripped.replace("/", "|").replace("-", "=") + "-AI-TOOL-"
 
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python script.py <URL>")
-        return
+def download_image(http, image_url, headers, filename, chunk_size=64 * 1024):
+    """
+    Streams an image to disk in chunks, so memory stays flat whatever its size
+
+    The bytes go to <filename>.part, renamed once the transfer is complete.
 
-    url = sys.argv[1]
+    Returns:
+        int: Number of bytes written
+    """
+    part_filename = filename + '.part'
+    written = 0
+    response = http.get(image_url, headers=headers, stream=True)
+    try:
+        response.raise_for_status()
+        with open(part_filename, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+    finally:
+        response.close()
+    os.replace(part_filename, filename)
+    return written
+
+def scrape_url(url, backend=None, session=None, folder='.', chunk_size=64 * 1024, tmdb_json=False, images=True):
+    """
+    Scrapes the image and prompt (and TMDb extras) of one page
+
+    Args:
+        url (str): Page URL on a domain listed in ai-tool-scraper-config.json
+        backend (str): Parser backend, None for the fastest one installed
+        session (requests.Session or HttpCache): Optional session, e.g. the HTTP cache
+        folder (str): Folder receiving the image and prompt files
+        chunk_size (int): Image download chunk size in bytes
+        tmdb_json (bool): Also save the tmdb_scraper.py JSON record of TMDb pages
+        images (bool): Download the image; when False the image already on disk is kept
+
+    Returns:
+        int: Bytes of the saved image, None when the image or prompt could not be saved
+    """
     parsed_url = urlparse(url)
     domain = parsed_url.hostname
 
-    # Load JSON configuration
-    with open('ai-tool-scraper-config.json', 'r') as f:
-        config = json.load(f)
+    # Validated configuration with precompiled selectors, loaded once per process
+    engine = get_engine()
 
-    if domain not in config:
+    if not engine.supports(domain):
         print(f"Domain {domain} not supported in ai-tool-scraper-config.json")
-        return
-
-    selectors = config[domain]
-    image_dom = selectors["image_dom"]
-    prompt_dom = selectors["prompt_dom"]
+        return None
 
     # Get page HTML with headers to request English content
     headers = {
@@ -36,154 +76,85 @@ def main():
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36" # Good practice to include a User-Agent
     }
 
-    # Fetch the page content with the specified headers
-    resp = requests.get(url, headers=headers)
-    resp.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
+    http = session if session is not None else requests
+    more_keys = engine.more_fields(domain)
+    if more_keys:
+        ## imdb data management
+        # TMDb pages go through the extraction shared with tmdb_scraper: one
+        # download and one parse give this script's output and its JSON record
+        record, soup = scrape_movie_page(url, http, backend)
+        print("attributes: ", more_keys)
+        print_details(record)
+        if tmdb_json:
+            json_data = build_json_data(record, english_url(url))
+            save_to_json(json_data, os.path.join(folder, list(json_data)[0] + '.json'))
+    else:
+        # Fetch the page content with the specified headers
+        resp = http.get(url, headers=headers)
+        resp.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
 
-    soup = BeautifulSoup(resp.text, 'html.parser')
+        soup = make_soup(resp.text, backend)
 
     ### debug
     # print(soup.prettify())
 
     # Extract image URL and prompt
-    image_tag = soup.select_one(image_dom)
-    prompt_tag = soup.select_one(prompt_dom)
-
-
-    ## imdb data management
-
-    if "more" in config[domain]:
-        # print(f"Domain {domain} contains more attribute")
-        more_keys = list(config[domain]["more"].keys())
-        print("attributes: ", more_keys)
-
-        print("title: ", soup.select_one(config[domain]["more"]["title_dom"]))
-        print("year: ", soup.select_one(config[domain]["more"]["year_dom"]))
-
-        # genres = [genre.get_text(strip=True) for genre in soup.select(config[domain]["more"]["genre_dom"])]
-        # print("Genres: {', '.join(genres) if genres else 'N/A'}")
-
-        genres_elements = soup.select("span.genres a")
-        genres = [genre.get_text(strip=True) for genre in genres_elements]
-        print(f"Genres: {', '.join(genres) if genres else 'N/A'}")
-
-        print("tagline: ", soup.select_one(config[domain]["more"]["tagline_dom"]))
-        print("runtime: ", soup.select_one(config[domain]["more"]["runtime_dom"]))
-        print("overview: ", soup.select_one(config[domain]["more"]["overview_dom"]))
-
-        ### CAST
-        crew_list = []
-        crew_elements = soup.select("ol.people.no_image li.profile")
-
-        for crew_member in crew_elements:
-            name_element = crew_member.select_one("p a")
-            job_element = crew_member.select_one("p.character") # They use 'character' for job in this context
-
-            name = name_element.get_text(strip=True) if name_element else "N/A"
-            job = job_element.get_text(strip=True) if job_element else "N/A"
-
-            crew_list.append({"name": name, "job": job})
-
-        # Filter for specific roles
-        directors = [c["name"] for c in crew_list if "Director" in c["job"]]
-        writers = [c["name"] for c in crew_list if "Writer" in c["job"] or "Screenplay" in c["job"] or "Novel" in c["job"]]
-
-        print(f"Director(s): {', '.join(directors) if directors else 'N/A'}")
-        print(f"Writer(s): {', '.join(writers) if writers else 'N/A'}")
-
-        ### CAST
-        cast_list = []
-        # Select all list items in the 'scroller' within the 'cast_list'
-        cast_elements = soup.select("ol.cast_list li.card")
-
-        for cast_member in cast_elements:
-            name_element = cast_member.select_one("p a")
-            character_element = cast_member.select_one("p.character")
-
-            actor_name = name_element.get_text(strip=True) if name_element else "N/A"
-            character_name = character_element.get_text(strip=True) if character_element else "N/A"
-
-            cast_list.append({"actor": actor_name, "character": character_name})
-
-        print("\nTop Billed Cast:")
-        for i, actor in enumerate(cast_list[:5]): # Print top 5 for brevity
-            print(f"- {actor['actor']} as {actor['character']}")
-            if i == 4 and len(cast_list) > 5:
-                print(f"... and {len(cast_list) - 5} more cast members.")
-
-        ### FACTS
-        # Select the facts section and then its list items
-        fact_items = soup.select("section.facts ul.facts li")
-
-        movie_facts = {}
-        for item in fact_items:
-            label_element = item.select_one("strong")
-            if label_element:
-                label = label_element.get_text(strip=True).replace(':', '')
-                # Get the text directly after the strong tag, skipping any other tags
-                value = ''.join(item.find_all(string=True, recursive=False)[1:]).strip()
-                movie_facts[label] = value
-
-        print("\nMovie Facts:")
-        print(f"Status: {movie_facts.get('Status', 'N/A')}")
-        print(f"Original Language: {movie_facts.get('Original Language', 'N/A')}")
-        print(f"Budget: {movie_facts.get('Budget', 'N/A')}")
-        print(f"Revenue: {movie_facts.get('Revenue', 'N/A')}")
-
-
-#    else: 
-#        print(f"Domain {domain} does not contain more attribute")
-        
-
+    image_tag = engine.select_one(domain, "image_dom", soup)
+    prompt_tag = engine.select_one(domain, "prompt_dom", soup)
+    prompt_text = prompt_tag.get_text(strip=True) if prompt_tag else None
+    image_url = image_tag.get('src') if image_tag else None
 
     if not image_tag:
-        print(f"Image tag not found using selector: {image_dom}")
+        print(f"Image tag not found using selector: {engine.selectors(domain)['image_dom'].pattern}")
     if not prompt_tag:
-        print(f"Prompt tag not found using selector: {prompt_dom}")
+        print(f"Prompt tag not found using selector: {engine.selectors(domain)['prompt_dom'].pattern}")
 #    if more_tag:
 #        print(f"More tag found using selector: {more_dom}")
 
     if not image_tag or not prompt_tag:
-        print("Image or prompt not found on the page. Saving full HTML to 'page_dump.html' for inspection.")
-        with open("page_dump.html", "w", encoding="utf-8") as f:
+        # Named after the page, so concurrent failures do not overwrite each other
+        dump_filename = f"{transform_url_to_filename(url)}page_dump.html"
+        print(f"Image or prompt not found on the page. Saving full HTML to '{dump_filename}' for inspection.")
+        with open(os.path.join(folder, dump_filename), "w", encoding="utf-8") as f:
             f.write(soup.prettify())
-        return
+        soup.decompose()
+        return None
+    # Everything needed is out of the tree: free it before the image download
+    soup.decompose()
 
-    image_url = image_tag.get('src')
     if not image_url:
         print("No 'src' attribute found on image tag.")
-        return
+        return None
 
     if image_url.startswith("/"):
         image_url = f"https://{domain}{image_url}"
     elif not image_url.startswith("http"):
         image_url = f"https://{domain}/{image_url}"
 
-    prompt_text = prompt_tag.get_text(strip=True)
-
     # Construct base filename without extension
     base_filename = transform_url_to_filename(url)
 
-    # Extract image extension
-    image_ext = image_url.split('.')[-1].split('?')[0]
-
-    # Final filenames
-    # image_filename = f"{base_filename}.{image_ext}"
+    # The image is renamed to its real extension by with_real_extension once downloaded
     image_filename = f"{base_filename}large.webp"
     text_filename = f"{base_filename}large.txt"
 
     # Make filenames safe (strip paths)
-    image_filename = os.path.basename(image_filename)
-    text_filename = os.path.basename(text_filename)
+    image_filename = os.path.join(folder, os.path.basename(image_filename))
+    text_filename = os.path.join(folder, os.path.basename(text_filename))
 
     # Download image
-    try:
-        img_data = requests.get(image_url, headers=headers).content
-        with open(image_filename, 'wb') as f:
-            f.write(img_data)
-        print(f"Saved image as {image_filename}")
-    except Exception as e:
-        print(f"Failed to download or save image: {e}")
+    image_bytes = None
+    if not images:
+        stem = os.path.splitext(image_filename)[0]
+        existing = [stem + ext for ext in IMAGE_EXTENSIONS if os.path.exists(stem + ext)]
+        image_bytes = os.path.getsize(existing[0]) if existing else 0
+    else:
+        try:
+            image_bytes = download_image(http, image_url, headers, image_filename, chunk_size)
+            image_filename = with_real_extension(image_filename)
+            print(f"Saved image as {image_filename}")
+        except Exception as e:
+            print(f"Failed to download or save image: {e}")
 
     # Write prompt file
     try:
@@ -192,6 +163,286 @@ def main():
         print(f"Saved prompt as {text_filename}")
     except Exception as e:
         print(f"Failed to save prompt file: {e}")
+        return None
+
+    return image_bytes
+
+def make_domain_session(pool_size, cache_dir=None, cache_max_age=86400, cache_size_mb=1024, archive=None,
+                        controller=None):
+    """
+    Creates the keep-alive session of one domain, paced by a RequestController, optionally archiving
+    its pages and behind the HTTP cache
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session = ControlledSession(session, controller if controller is not None else RequestController(pool_size))
+    if archive is not None:
+        session = ArchivingSession(session, archive)
+    if cache_dir:
+        return HttpCache(cache_dir, session, max_age=cache_max_age, max_bytes=cache_size_mb * 1024 * 1024)
+    return session
+
+def run_batch(urls, folder='.', backend=None, concurrency=4, chunk_size=64 * 1024, cache_dir=None,
+              cache_max_age=86400, cache_size_mb=1024, tmdb_json=False, archive=None, retries=4,
+              thumbnails=False):
+    """
+    Scrapes many pages, each domain with its own worker pool and pooled session
+
+    URLs are grouped by domain; every domain of ai-tool-scraper-config.json
+    runs concurrently with the others, with at most its "concurrency" (or
+    the concurrency argument) pages in flight, so a slow site does not hold
+    back the rest. Within that cap the RequestController of the domain
+    lowers the requests in flight while the site answers 429 or 5xx.
+
+    Args:
+        urls (list): Page URLs
+        folder (str): Folder receiving the image and prompt files
+        backend (str): Parser backend, None for the fastest one installed
+        concurrency (int): Pages in flight per domain without a configured concurrency
+        chunk_size (int): Image download chunk size in bytes
+        cache_dir (str): HTTP cache folder, one subfolder per domain; None to disable caching
+        cache_max_age (int): Seconds a cached response is used without revalidation
+        cache_size_mb (int): Cache size per domain above which entries are evicted
+        tmdb_json (bool): Also save the tmdb_scraper.py JSON record of TMDb pages
+        archive (ResponseArchive): Optional archive receiving every downloaded page
+        retries (int): Times a request is retried after a 429 or 5xx response or a connection error
+        thumbnails (bool): Then bring the thumbnail and perceptual hash cache of folder up to date
+
+    Returns:
+        dict: {domain: {'saved', 'failed', 'bytes', 'elapsed'}}
+    """
+    engine = get_engine()
+    by_domain = {}
+    for url in urls:
+        by_domain.setdefault(urlparse(url).hostname, []).append(url)
+
+    results = {}
+    for domain in [domain for domain in by_domain if not engine.supports(domain)]:
+        print(f"Domain {domain} not supported in ai-tool-scraper-config.json, skipping {len(by_domain[domain])} URLs")
+        results[domain] = {'saved': 0, 'failed': len(by_domain.pop(domain)), 'bytes': 0, 'elapsed': 0.0}
+    lock = threading.Lock()
+
+    def run_domain(domain, domain_urls):
+        limit = engine.concurrency(domain, concurrency)
+        controller = RequestController(limit, retries=retries)
+        session = make_domain_session(limit, os.path.join(cache_dir, domain) if cache_dir else None,
+                                      cache_max_age, cache_size_mb, archive, controller)
+        result = {'saved': 0, 'failed': 0, 'bytes': 0}
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=limit) as executor:
+                futures = [executor.submit(scrape_url, url, backend, session, folder, chunk_size, tmdb_json)
+                           for url in domain_urls]
+                for url, future in zip(domain_urls, futures):
+                    try:
+                        image_bytes = future.result()
+                    except Exception as e:
+                        print(f"Error processing {url}: {e}")
+                        image_bytes = None
+                    if image_bytes is None:
+                        result['failed'] += 1
+                    else:
+                        result['saved'] += 1
+                        result['bytes'] += image_bytes
+        finally:
+            result['elapsed'] = time.perf_counter() - start
+            if isinstance(session, HttpCache):
+                result['cache'] = session.stats()
+            result['rate'] = controller.summary()
+            session.close()
+        with lock:
+            results[domain] = result
+
+    if by_domain:
+        with ThreadPoolExecutor(max_workers=len(by_domain)) as executor:
+            for future in [executor.submit(run_domain, domain, domain_urls) for domain, domain_urls in by_domain.items()]:
+                future.result()
+
+    print_summary(results)
+    if thumbnails:
+        cache = ImageCache(folder)
+        cache.update()
+        print(cache.summary())
+    return results
+
+def print_summary(results):
+    """
+    Prints the per-domain results of run_batch or replay_archive
+    """
+    print("\nBatch summary:")
+    print(f"  {'domain':<28} {'saved':>6} {'failed':>6} {'pages/s':>8} {'MB':>8} {'MB/s':>7}")
+    for domain, result in results.items():
+        elapsed = result['elapsed']
+        pages = result['saved'] + result['failed']
+        megabytes = result['bytes'] / 1048576
+        print(f"  {domain:<28} {result['saved']:>6} {result['failed']:>6} "
+              f"{(pages / elapsed if elapsed > 0 else 0.0):>8.2f} {megabytes:>8.1f} "
+              f"{(megabytes / elapsed if elapsed > 0 else 0.0):>7.2f}")
+        if 'cache' in result:
+            print(f"    {result['cache']}")
+        if 'rate' in result:
+            print('\n'.join('    ' + line for line in result['rate'].splitlines()))
+
+def archived_page_url(url):
+    """
+    Returns the page URL scrape_url was given for an archived URL
+
+    TMDb pages are archived under the english_url that was fetched.
+    """
+    if get_engine().more_fields(urlparse(url).hostname):
+        return unenglish_url(url)
+    return url
+
+def replay_url(archive_folder, entry, backend=None, folder='.', tmdb_json=False):
+    """
+    Replay worker: scrapes an archived page again, keeping the image already on disk
+    """
+    return scrape_url(archived_page_url(entry['url']), backend, ReplaySession(archive_folder, [entry]), folder,
+                      tmdb_json=tmdb_json, images=False)
+
+def replay_archive(archive, folder='.', backend=None, workers=None, tmdb_json=False, urls=None):
+    """
+    Extracts the prompts (and TMDb records) of the pages in the archive again, without the network
+
+    The latest archived version of every page of a supported domain is
+    scraped in a process pool; images are not downloaded again.
+
+    Args:
+        archive (ResponseArchive): The archive of a previous run
+        folder (str): Folder receiving the prompt files
+        backend (str): Parser backend, None for the fastest one installed
+        workers (int): Number of processes, None for one per core
+        tmdb_json (bool): Also save the tmdb_scraper.py JSON record of TMDb pages
+        urls (list): Only replay these page URLs, None for every archived page
+
+    Returns:
+        dict: {domain: {'saved', 'failed', 'bytes', 'elapsed'}}, as run_batch
+    """
+    engine = get_engine()
+    entries = [entry for entry in archive.latest()
+               if engine.supports(urlparse(entry['url']).hostname) and
+               entry['headers'].get('Content-Type', 'text/html').startswith('text/html')]
+    if urls is not None:
+        entries = [entry for entry in entries if archived_page_url(entry['url']) in urls]
+    workers = workers or os.cpu_count() or 1
+
+    results = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(replay_url, archive.folder, entry, backend, folder, tmdb_json): entry['url']
+                   for entry in entries}
+        for future in as_completed(futures):
+            url = futures[future]
+            result = results.setdefault(urlparse(url).hostname, {'saved': 0, 'failed': 0, 'bytes': 0})
+            try:
+                image_bytes = future.result()
+            except Exception as e:
+                print(f"Error processing {url}: {e}")
+                image_bytes = None
+            if image_bytes is None:
+                result['failed'] += 1
+            else:
+                result['saved'] += 1
+    elapsed = time.perf_counter() - start
+    for result in results.values():
+        result['elapsed'] = elapsed
+    print_summary(results)
+    return results
+
+def main(argv=None, session=None):
+    """
+    Scrapes one page or a batch of pages
+
+    Args:
+        argv (list): Command line arguments, None for sys.argv
+        session (requests.Session): Warm session to reuse for a single page, e.g. the daemon's
+    """
+    parser = argparse.ArgumentParser(description="Scrape image and prompt from an AI tool page.")
+    parser.add_argument('url', nargs='?', help="The page URL to scrape.")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="Scrape every URL listed in FILE (one per line, '-' for stdin) instead of a single URL.")
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help="Pages in flight per domain in batch mode, unless the domain sets \"concurrency\" in the config.")
+    parser.add_argument('--retries', type=int, default=4,
+                        help="Times a request is retried after a 429 or 5xx response or a connection error.")
+    parser.add_argument('--output', default='.',
+                        help="Folder where images and prompts are saved.")
+    parser.add_argument('--chunk-size', type=int, default=64,
+                        help="Image download chunk size in KB.")
+    parser.add_argument('--parser', choices=available_backends(), default=None,
+                        help="HTML parser backend. Defaults to the fastest one installed.")
+    parser.add_argument('--cache', metavar='DIR',
+                        help="Cache pages and images in DIR and revalidate them with ETag / If-Modified-Since.")
+    parser.add_argument('--cache-max-age', type=int, default=86400,
+                        help="Seconds a cached response is reused without revalidation.")
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help="Cache size in MB above which least recently used entries are evicted.")
+    parser.add_argument('--tmdb-json', action='store_true',
+                        help="For TMDb pages also save the JSON record of tmdb_scraper.py, from the same download.")
+    parser.add_argument('--thumbnails', action='store_true',
+                        help="In batch mode, then build the thumbnails and perceptual hashes of the new images.")
+    parser.add_argument('--archive', metavar='DIR',
+                        help="Append every downloaded page to the compressed response archive in DIR.")
+    parser.add_argument('--archive-size', type=int, default=4096,
+                        help="Archive size in MB above which the oldest segments are deleted.")
+    parser.add_argument('--replay', action='store_true',
+                        help="Scrape the pages of --archive again without the network, keeping the images on disk. "
+                             "With a URL or --batch, only those pages.")
+    args = parser.parse_args(argv)
+
+    if args.replay and not args.archive:
+        parser.error("--replay needs --archive DIR")
+    if not args.url and not args.batch and not args.replay:
+        parser.error("give a URL or --batch FILE")
+
+    archive = ResponseArchive(args.archive, max_bytes=args.archive_size * 1024 * 1024) if args.archive else None
+
+    if args.replay:
+        urls = read_batch_urls(args.batch) if args.batch else [args.url] if args.url else None
+        print(f"Replaying the archived pages of {args.archive}...")
+        try:
+            replay_archive(archive, args.output, backend=args.parser, tmdb_json=args.tmdb_json, urls=urls)
+        finally:
+            archive.close()
+        return
+
+    if args.batch:
+        urls = read_batch_urls(args.batch)
+        print(f"Scraping {len(urls)} pages...")
+        try:
+            run_batch(urls, args.output, backend=args.parser, concurrency=args.concurrency,
+                      chunk_size=args.chunk_size * 1024, cache_dir=args.cache, cache_max_age=args.cache_max_age,
+                      cache_size_mb=args.cache_size, tmdb_json=args.tmdb_json, archive=archive,
+                      retries=args.retries, thumbnails=args.thumbnails)
+        finally:
+            if archive is not None:
+                print(archive.stats())
+                archive.close()
+        return
+
+    own_session = session is None
+    if own_session:
+        session = ControlledSession(requests.Session(), RequestController(retries=args.retries))
+    if archive is not None:
+        session = ArchivingSession(session, archive)
+    if args.cache:
+        session = HttpCache(args.cache, session, max_age=args.cache_max_age, max_bytes=args.cache_size * 1024 * 1024)
+
+    try:
+        scrape_url(args.url, backend=args.parser, session=session, folder=args.output,
+                   chunk_size=args.chunk_size * 1024, tmdb_json=args.tmdb_json)
+    except requests.RequestException as e:
+        print(f"Error fetching {args.url}: {e}")
+
+    if isinstance(session, HttpCache):
+        print(session.stats())
+    if archive is not None:
+        print(archive.stats())
+        archive.close()
+    if own_session:
+        session.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,227 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import ai_tool_scraper2
+import structured_data
+import tmdb_extract
+import tmdb_scraper
+from mirror_server import MirrorServer, MirrorSession
+from parser_backend import available_backends, default_backend, make_soup
+from selector_engine import get_engine
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_fixtures')
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai-tool-scraper-config.json')
+
+def load_corpus(fixtures_dir):
+    """
+    Loads the recorded pages listed in the fixtures manifest
+
+    Returns:
+        tuple: (TMDb pages, AI-site pages), each a list of (url, html bytes)
+    """
+    with open(os.path.join(fixtures_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    tmdb_pages = []
+    ai_pages = []
+    for url, entry in manifest.items():
+        if not entry['content_type'].startswith('text/html'):
+            continue
+        with open(os.path.join(fixtures_dir, entry['file']), 'rb') as f:
+            html = f.read()
+        if '://www.themoviedb.org/movie/' in url:
+            tmdb_pages.append((url, html))
+        ai_pages.append((url, html))
+    return tmdb_pages, ai_pages
+
+def _timed(timings, field, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    timings[field] = timings.get(field, 0.0) + time.perf_counter() - start
+    return result
+
+def run_suite(suite, pages, rounds, *args):
+    """
+    Runs a suite for timing, then once more under tracemalloc for peak memory
+
+    Timing and memory tracing are kept apart because tracemalloc slows
+    allocation-heavy parsing down several times.
+
+    Returns:
+        dict: pages, pages_per_sec, field_ms (per page) and peak_kb
+    """
+    elapsed, timings = suite(pages, rounds, *args)
+    tracemalloc.start()
+    suite(pages, 1, *args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    pages = len(pages) * rounds
+    return {
+        'pages': pages,
+        'pages_per_sec': round(pages / elapsed, 2) if elapsed > 0 else 0.0,
+        'field_ms': {field: round(total * 1000 / pages, 3) for field, total in timings.items()},
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+def bench_tmdb_extract(pages, rounds, backend, restricted):
+    """
+    Parses and extracts every TMDb fixture, timing each field extractor
+    """
+    timings = {}
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for url, html in pages:
+            _timed(timings, 'head', structured_data.head_movie_data, html)
+            soup = _timed(timings, 'parse', make_soup, html, backend)
+            candidates = _timed(timings, 'candidates', tmdb_extract.collect_candidates, soup)
+            _timed(timings, 'title', tmdb_extract._extract_title, candidates)
+            _timed(timings, 'directors', tmdb_extract._extract_directors, candidates)
+            _timed(timings, 'cast', tmdb_extract._extract_cast, candidates)
+            if restricted:
+                _timed(timings, 'restricted_page', tmdb_extract.parse_movie_page, html, backend, True)
+    elapsed = time.perf_counter() - start
+    # The restricted column is an extra parse, keep pages/sec comparable
+    if restricted:
+        elapsed -= timings['restricted_page']
+    return elapsed, timings
+
+def bench_ai_selectors(pages, rounds, backend, engine):
+    """
+    Parses every AI-site fixture and runs the domain's compiled selectors
+    """
+    timings = {}
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for url, html in pages:
+            domain = url.split('/')[2]
+            soup = _timed(timings, 'parse', make_soup, html, backend)
+            for field, selector in engine.selectors(domain).items():
+                _timed(timings, field, selector.select_one, soup)
+    elapsed = time.perf_counter() - start
+    return elapsed, timings
+
+def bench_tmdb_fetch(pages, rounds, backend, restricted, base_url, stream=False):
+    """
+    Runs scrape_movie_data against the local mirror, fetch included
+    """
+    session = MirrorSession(base_url)
+    timings = {}
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(rounds):
+            for url, _ in pages:
+                _timed(timings, 'scrape_movie_data', tmdb_scraper.scrape_movie_data, url, session, backend, restricted,
+                       stream)
+    elapsed = time.perf_counter() - start
+    session.close()
+    return elapsed, timings
+
+def bench_ai_fetch(pages, rounds, backend, base_url):
+    """
+    Runs ai_tool_scraper2.scrape_url against the local mirror in a scratch folder
+    """
+    session = MirrorSession(base_url)
+    timings = {}
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix='bench_ai_')
+    os.chdir(scratch)
+    try:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(rounds):
+                for url, _ in pages:
+                    _timed(timings, 'scrape_url', ai_tool_scraper2.scrape_url, url, backend, session)
+        elapsed = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+        session.close()
+    return elapsed, timings
+
+def compare_results(results, baseline, tolerance):
+    """
+    Lists the metrics that got worse than the baseline by more than tolerance
+
+    Returns:
+        list: Human readable regression descriptions
+    """
+    regressions = []
+    for suite, result in results.items():
+        base = baseline.get(suite)
+        if not base:
+            continue
+        if result['pages_per_sec'] < base['pages_per_sec'] * (1 - tolerance):
+            regressions.append(f"{suite}: {result['pages_per_sec']} pages/s (baseline {base['pages_per_sec']})")
+        for field, ms in result['field_ms'].items():
+            base_ms = base['field_ms'].get(field)
+            if base_ms and ms > base_ms * (1 + tolerance) and ms - base_ms > 0.05:
+                regressions.append(f"{suite}.{field}: {ms} ms/page (baseline {base_ms})")
+        if result['peak_kb'] > base['peak_kb'] * (1 + tolerance):
+            regressions.append(f"{suite}: peak {result['peak_kb']} KB (baseline {base['peak_kb']})")
+    return regressions
+
+def print_results(results):
+    for suite, result in results.items():
+        print(f"\n{suite}: {result['pages_per_sec']} pages/s over {result['pages']} pages, peak {result['peak_kb']} KB")
+        for field, ms in result['field_ms'].items():
+            print(f"  {field:<20} {ms:>9.3f} ms/page")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers offline against recorded pages.")
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help="Folder holding manifest.json and the recorded pages.")
+    parser.add_argument('--rounds', type=int, default=5, help="Passes over the corpus per suite.")
+    parser.add_argument('--parser', choices=available_backends(), default=default_backend(),
+                        help="HTML parser backend. Defaults to the fastest one installed.")
+    parser.add_argument('--restricted', action='store_true', help="Also time the restricted-parse mode.")
+    parser.add_argument('--no-fetch', action='store_true', help="Skip the suites going through the local mirror server.")
+    parser.add_argument('--save', metavar='FILE', help="Write the results as JSON, e.g. to record a baseline.")
+    parser.add_argument('--compare', metavar='FILE', help="Compare against a saved baseline and fail on regressions.")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown before a metric counts as a regression.")
+    args = parser.parse_args()
+
+    engine = get_engine(CONFIG_FILE)
+    tmdb_pages, ai_pages = load_corpus(args.fixtures)
+    print(f"Corpus: {len(tmdb_pages)} TMDb pages, {len(ai_pages)} AI-site pages, parser {args.parser}")
+
+    results = {}
+    results['tmdb_extract'] = run_suite(bench_tmdb_extract, tmdb_pages, args.rounds, args.parser, args.restricted)
+    results['ai_selectors'] = run_suite(bench_ai_selectors, ai_pages, args.rounds, args.parser, engine)
+
+    if not args.no_fetch:
+        server = MirrorServer(args.fixtures)
+        base_url = server.start()
+        try:
+            results['tmdb_fetch'] = run_suite(bench_tmdb_fetch, tmdb_pages, args.rounds, args.parser, args.restricted, base_url)
+            results['tmdb_stream'] = run_suite(bench_tmdb_fetch, tmdb_pages, args.rounds, args.parser, args.restricted,
+                                               base_url, True)
+            results['ai_fetch'] = run_suite(bench_ai_fetch, ai_pages, args.rounds, args.parser, base_url)
+        finally:
+            server.stop()
+
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'parser': args.parser, 'results': results}, f, indent=2)
+        print(f"\nResults saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare_results(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from movie_catalog import MovieCatalog, url_key
+from poster_downloader import MANIFEST_NAME
+from tmdb_scraper import DOWNLOAD_FOLDER, make_session, run_batch
+
+SCAN_NAME = '.scan.json'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+# Files handed to a worker at a time: one task per file would cost more than most files take
+CHUNK = 256
+
+# Issues fixed by scraping the movie again, and what each means
+REQUEUED = {
+    'missing_poster': "img names no poster file in the folder",
+    'corrupt_poster': "poster differs from the size or SHA-256 recorded when it was downloaded",
+    'key_mismatch': "file name differs from the title key inside it",
+    'missing_json': "movie of the catalog without its JSON file",
+}
+REPORTED = {
+    'bad_json': "unreadable or not a {TitleYear: record} file",
+    'no_url': "record without the page URL it was scraped from",
+    'duplicate_url': "same movie page saved under several title keys",
+    'duplicate_key': "different movies of the catalog sharing one title key, only one has a file",
+    'empty_title_key': "title without any A-Z or 0-9 character, its key is the year only",
+    'orphan_poster': "poster no record points to",
+}
+
+def hash_file(path):
+    """
+    Returns the SHA-256 of a file, read through a memory map
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                sha.update(data)
+    return sha.hexdigest()
+
+def read_record(path):
+    """
+    Reads the fields of a <TitleYear>.json file the checks need
+
+    Returns:
+        dict: key, name, year, url (and its url_key) and img of the record,
+              or error when the file is not a record
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            movie_data = json.load(f)
+    except (OSError, ValueError) as e:
+        return {'error': str(e)}
+    if not isinstance(movie_data, dict) or len(movie_data) != 1 or not isinstance(next(iter(movie_data.values())), dict):
+        return {'error': "not a {TitleYear: record} object"}
+    key, record = next(iter(movie_data.items()))
+    url = record.get('url')
+    return {'key': key, 'name': record.get('name'), 'year': record.get('year'),
+            'url': url, 'url_key': url_key(url) if url else None, 'img': record.get('img')}
+
+def _scan_chunk(folder, names):
+    # Worker: reads the records and hashes the posters of a chunk of files
+    results = {}
+    for name in names:
+        path = os.path.join(folder, name)
+        try:
+            if name.endswith('.json'):
+                results[name] = read_record(path)
+            else:
+                results[name] = {'sha256': hash_file(path)}
+        except OSError as e:
+            results[name] = {'error': str(e)}
+    return results
+
+def scan_collection(folder, workers=16, full=False):
+    """
+    Reads every record and hashes every poster of the collection folder
+
+    Files whose size and modification time match the scan manifest
+    (.scan.json in the folder) are not read again, so a rescan only costs
+    one directory listing plus the changed files. Reading and hashing run
+    in a thread pool: hashing works on memory maps and releases the GIL.
+
+    Args:
+        folder (str): The collection folder
+        workers (int): Number of reading threads
+        full (bool): Read every file again, ignoring the manifest
+
+    Returns:
+        tuple: ({file name: {'size', ...record fields or sha256}}, number of files read)
+    """
+    manifest_path = os.path.join(folder, SCAN_NAME)
+    manifest = {}
+    if not full and os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)['files']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring scan manifest {manifest_path}: {e}")
+
+    files = {}
+    changed = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            # Dot files are bookkeeping, .part files downloads in progress
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            if not entry.name.endswith('.json') and not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            stat = entry.stat()
+            known = manifest.get(entry.name)
+            if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+                files[entry.name] = known
+            else:
+                files[entry.name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+                changed.append(entry.name)
+
+    chunks = [changed[start:start + CHUNK] for start in range(0, len(changed), CHUNK)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for results in executor.map(lambda names: _scan_chunk(folder, names), chunks):
+            for name, info in results.items():
+                files[name].update(info)
+
+    if not changed and len(files) == len(manifest):
+        return files, 0
+    tmp_path = manifest_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            # One dumps call: json.dump encodes in Python, several times slower
+            f.write(json.dumps({'scanned_at': time.time(), 'files': files}))
+        os.replace(tmp_path, manifest_path)
+    except OSError as e:
+        print(f"Error saving the scan manifest: {e}")
+    return files, len(changed)
+
+def title_key(name, year):
+    """
+    Returns the key build_json_data gives a title and year
+    """
+    return re.sub(r'[^a-zA-Z0-9]', '', name or '') + re.sub(r'[()]', '', str(year or ''))
+
+def find_issues(folder, files, catalog=None):
+    """
+    Cross-checks the records, posters, download manifest and optional catalog
+
+    Args:
+        folder (str): The collection folder
+        files (dict): As returned by scan_collection
+        catalog (MovieCatalog): Optional catalog, to find movies without a file and shared title keys
+
+    Returns:
+        list: Issues as {'kind', 'file', 'url', 'detail'} dicts; kind is a key of REQUEUED or REPORTED
+    """
+    downloads = {}
+    try:
+        with open(os.path.join(folder, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            downloads = {entry['file']: entry for entry in json.load(f)['files'].values()}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    issues = []
+
+    def issue(kind, file=None, url=None, detail=None):
+        issues.append({'kind': kind, 'file': file, 'url': url, 'detail': detail})
+
+    referenced = set()
+    by_url = {}
+    for name, info in files.items():
+        if not name.endswith('.json'):
+            continue
+        if 'error' in info:
+            issue('bad_json', name, detail=info['error'])
+            continue
+        url = info['url']
+        if not url:
+            issue('no_url', name)
+        else:
+            by_url.setdefault(info['url_key'], []).append(name)
+        if name[:-5] != info['key']:
+            issue('key_mismatch', name, url, f"holds {info['key']}")
+        if info['name'] and not title_key(info['name'], None):
+            issue('empty_title_key', name, url, info['name'])
+
+        img = info['img']
+        if img and not img.startswith(('http://', 'https://')):
+            referenced.add(img)
+        if not img or img not in files:
+            issue('missing_poster', name, url, img)
+        else:
+            recorded = downloads.get(img)
+            poster = files[img]
+            if poster.get('error') or poster['size'] == 0 or (recorded and (
+                    recorded['size'] != poster['size'] or recorded['sha256'] != poster.get('sha256'))):
+                issue('corrupt_poster', img, url, poster.get('error'))
+
+    for url, names in by_url.items():
+        if len(names) > 1:
+            issue('duplicate_url', ', '.join(sorted(names)), url)
+
+    for name in files:
+        if not name.endswith('.json') and name not in referenced:
+            issue('orphan_poster', name)
+
+    if catalog is not None:
+        by_key = {}
+        for key, url in catalog.keys():
+            by_key.setdefault(key, []).append(url)
+            if key + '.json' not in files:
+                issue('missing_json', key + '.json', url)
+        for key, urls in by_key.items():
+            if len(urls) > 1:
+                issue('duplicate_key', key + '.json', ', '.join(urls))
+    return issues
+
+def requeue_urls(issues):
+    """
+    Returns the movie URLs to scrape again to fix the issues, each once
+    """
+    urls = []
+    for item in issues:
+        if item['kind'] in REQUEUED and item['url'] and item['url'] not in urls:
+            urls.append(item['url'])
+    return urls
+
+def print_report(issues, verbose=False, examples=5):
+    """
+    Prints the number of issues of every kind, with a few examples unless verbose
+    """
+    kinds = {}
+    for item in issues:
+        kinds.setdefault(item['kind'], []).append(item)
+    if not kinds:
+        print("No issues found.")
+    for kind, items in kinds.items():
+        action = "re-queued" if kind in REQUEUED else "reported"
+        print(f"{kind} ({len(items)}, {action}): {REQUEUED.get(kind) or REPORTED[kind]}")
+        for item in items if verbose else items[:examples]:
+            details = ', '.join(str(value) for value in (item['url'], item['detail']) if value)
+            print(f"  {item['file'] or ''}{'  ' + details if details else ''}")
+        if not verbose and len(items) > examples:
+            print(f"  ... and {len(items) - examples} more")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the movie collection folder and re-queue the broken movies.")
+    parser.add_argument('folder', nargs='?', default=DOWNLOAD_FOLDER, help="The collection folder.")
+    parser.add_argument('--workers', type=int, default=16,
+                        help="Number of threads reading records and hashing posters.")
+    parser.add_argument('--full', action='store_true',
+                        help="Read every file again instead of only the ones changed since the last scan.")
+    parser.add_argument('--catalog', metavar='DB',
+                        help="SQLite catalog to find movies without a file and title keys shared by several movies.")
+    parser.add_argument('--verbose', action='store_true',
+                        help="List every issue instead of a few of each kind.")
+    parser.add_argument('--requeue', metavar='FILE',
+                        help="Write the URLs of the movies to scrape again to FILE, for tmdb_scraper.py --batch.")
+    parser.add_argument('--repair', action='store_true',
+                        help="Delete the corrupt posters and scrape the affected movies again.")
+    parser.add_argument('--delete-orphans', action='store_true',
+                        help="Delete the posters no record points to.")
+    args = parser.parse_args()
+
+    catalog = MovieCatalog(args.catalog) if args.catalog else None
+    try:
+        start = time.perf_counter()
+        files, read = scan_collection(args.folder, args.workers, args.full)
+        issues = find_issues(args.folder, files, catalog)
+        print(f"Scanned {len(files)} files ({read} read, {len(files) - read} unchanged) "
+              f"in {time.perf_counter() - start:.2f}s")
+        print_report(issues, args.verbose)
+
+        urls = requeue_urls(issues)
+        if args.requeue:
+            with open(args.requeue, 'w', encoding='utf-8') as f:
+                f.write(''.join(url + '\n' for url in urls))
+            print(f"{len(urls)} URLs to scrape again saved to {args.requeue}")
+        if args.delete_orphans or args.repair:
+            kinds = (('orphan_poster',) if args.delete_orphans else ()) + (('corrupt_poster',) if args.repair else ())
+            for item in issues:
+                if item['kind'] in kinds:
+                    try:
+                        os.remove(os.path.join(args.folder, item['file']))
+                    except OSError as e:
+                        print(f"Error deleting {item['file']}: {e}")
+        if args.repair and urls:
+            print(f"Scraping {len(urls)} movies again...")
+            session = make_session()
+            try:
+                run_batch(urls, args.folder, session=session, catalog=catalog, refresh=True, quiet=True)
+            finally:
+                session.close()
+    finally:
+        if catalog is not None:
+            catalog.close()
+
+if __name__ == "__main__":
+    main()
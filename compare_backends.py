@@ -0,0 +1,122 @@
+import argparse
+import os
+import sys
+import tempfile
+
+import requests
+
+from http_cache import HttpCache
+from mirror_server import MirrorSession
+from response_archive import ArchivingSession, ResponseArchive
+from tmdb_api import TmdbApi, api_from_env
+from tmdb_extract import parse_movie_page
+from tmdb_scraper import HEADERS, english_url
+
+def _same(field, html_value, api_value):
+    # Poster sizes and CDN hosts differ between the page and the API: compare the image file
+    if field == 'poster_url' and html_value and api_value:
+        return html_value.rsplit('/', 1)[-1] == api_value.rsplit('/', 1)[-1]
+    # The page shows 87, 87.0 or 87.5 percent depending on the movie
+    if field == 'user_score' and html_value and api_value:
+        return float(html_value.rstrip('%')) == float(api_value.rstrip('%'))
+    return html_value == api_value
+
+def compare_backends(url, api, session=None, backend=None):
+    """
+    Scrapes one movie through the HTML page and through the API and compares the fields
+
+    Returns:
+        list: (field, HTML value, API value, equal) tuples
+    """
+    http = session if session is not None else requests
+    response = http.get(english_url(url), headers=HEADERS)
+    response.raise_for_status()
+    html_data = parse_movie_page(response.content, backend)
+    api_data = api.movie_data(url)
+    return [(field, html_data.get(field), api_data[field], _same(field, html_data.get(field), api_data[field]))
+            for field in api_data]
+
+def check_key_hidden(urls, base_url, api_key):
+    """
+    Runs the API client through the HTTP cache and the archive against a mirror and looks for the key in their files
+
+    A movie missing from the mirror is also requested, for the error message.
+
+    Args:
+        urls (list): TMDb movie page URLs served by the mirror
+        base_url (str): Base URL of a running mirror_server.py
+        api_key (str): The v3 API key to look for
+
+    Returns:
+        list: The places where the key was found, empty when it never was
+    """
+    leaks = []
+    with tempfile.TemporaryDirectory() as folder:
+        archive = ResponseArchive(os.path.join(folder, 'archive'))
+        cache = HttpCache(os.path.join(folder, 'cache'), ArchivingSession(MirrorSession(base_url), archive))
+        api = TmdbApi(api_key=api_key, session=cache)
+        for url in list(urls) + ['https://www.themoviedb.org/movie/0-missing']:
+            try:
+                api.movie_data(url)
+            except requests.RequestException as e:
+                if api_key in str(e):
+                    leaks.append(f"error message: {e}")
+        cache.close()
+        archive.close()
+        for root, _, files in os.walk(folder):
+            for name in files:
+                with open(os.path.join(root, name), 'rb') as f:
+                    if api_key.encode('utf-8') in f.read():
+                        leaks.append(os.path.relpath(os.path.join(root, name), folder))
+    return leaks
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the HTML scraper with the TMDb API backend field by field.")
+    parser.add_argument('urls', nargs='+', help="TMDb movie page URLs.")
+    parser.add_argument('--api-key', help="TMDb v3 API key. Defaults to TMDB_API_KEY, or TMDB_ACCESS_TOKEN as bearer token.")
+    parser.add_argument('--mirror', metavar='BASE_URL',
+                        help="Send every request, API included, to a local mirror_server.py serving stub responses.")
+    parser.add_argument('--check-key', action='store_true',
+                        help="With --mirror, also check that the API key is not written to the HTTP cache, "
+                             "the archive or error messages.")
+    args = parser.parse_args()
+    if args.check_key and not args.mirror:
+        parser.error("--check-key needs --mirror")
+
+    if args.mirror:
+        session = MirrorSession(args.mirror)
+        api = TmdbApi(api_key=args.api_key or 'stub', session=session)
+    else:
+        session = requests.Session()
+        try:
+            api = api_from_env(args.api_key, session)
+        except ValueError as e:
+            parser.error(str(e))
+
+    mismatches = 0
+    for url in args.urls:
+        print(f"\n{url}")
+        try:
+            rows = compare_backends(url, api, session)
+        except (requests.RequestException, ValueError) as e:
+            print(f"  Error: {e}")
+            mismatches += 1
+            continue
+        for field, html_value, api_value, equal in rows:
+            if equal:
+                print(f"  ok    {field:<14} {api_value!r}")
+            else:
+                mismatches += 1
+                print(f"  DIFF  {field:<14} html={html_value!r} api={api_value!r}")
+    session.close()
+    print(f"\n{mismatches} differing fields")
+    leaks = []
+    if args.check_key:
+        leaks = check_key_hidden(args.urls, args.mirror, args.api_key or 'stub')
+        for leak in leaks:
+            print(f"  LEAK  api_key in {leak}")
+        print(f"{len(leaks)} places holding the API key")
+    sys.exit(1 if mismatches or leaks else 0)
+
+if __name__ == "__main__":
+    main()
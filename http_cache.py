@@ -0,0 +1,246 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Response headers kept with a cached body
+KEPT_HEADERS = ['Content-Type', 'ETag', 'Last-Modified']
+
+# Query parameters carrying credentials, e.g. the TMDb v3 API key: left out
+# of cache keys and of every URL written to disk
+SECRET_PARAMS = {'api_key'}
+
+def redact_url(url):
+    """
+    Removes the SECRET_PARAMS query parameters from a URL, leaving the rest as is
+    """
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+             if name not in SECRET_PARAMS]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+def normalize_url(url):
+    """
+    Normalizes a URL so that equivalent spellings share one cache entry
+
+    Lowercases scheme and host, drops default ports and the fragment, removes
+    repeated identical query parameters (e.g. the language=en-US appended by
+    scrape_movie_data to URLs that already carry it) and the SECRET_PARAMS,
+    and sorts the query.
+
+    Args:
+        url (str): The URL to normalize
+
+    Returns:
+        str: The normalized URL
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted({(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                    if name not in SECRET_PARAMS})
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+class CachedResponse:
+    """
+    Minimal stand-in for requests.Response served from the cache
+    """
+
+    def __init__(self, url, status_code, headers, content, from_cache, revalidated=False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.from_cache = from_cache
+        self.revalidated = revalidated
+        self.encoding = get_encoding_from_headers(self.headers)
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=8192):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+class HttpCache:
+    """
+    On-disk HTTP cache for pages and images with conditional revalidation
+
+    Entries are keyed by normalized URL. Bodies are stored gzip-compressed
+    (images, already compressed, are stored as is) next to a small JSON
+    metadata file. Entries younger than max_age are served without touching
+    the network; older ones are revalidated with If-None-Match /
+    If-Modified-Since, so an unchanged resource only costs a 304. When the
+    stored bodies exceed max_bytes the least recently used entries are evicted.
+
+    The cache exposes get() like a requests.Session, so it can be passed
+    wherever the scrapers accept a session.
+    """
+
+    def __init__(self, cache_dir, session=None, max_age=86400, max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.session = session if session is not None else requests.Session()
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()  # key -> body size, least recently used first
+        self._total = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+        self._evict()
+
+    def _load(self):
+        # Rebuild the LRU order from the body files' modification times
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.body'):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._lru[key] = size
+            self._total += size
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.json', base + '.body'
+
+    def _read(self, key):
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        if meta.get('encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return meta, body
+
+    def _write_meta(self, key, meta):
+        meta_path, _ = self._paths(key)
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def _store(self, key, meta, content):
+        _, body_path = self._paths(key)
+        if meta['headers'].get('Content-Type', '').startswith('image/'):
+            meta['encoding'] = 'identity'
+            stored = content
+        else:
+            meta['encoding'] = 'gzip'
+            stored = gzip.compress(content, compresslevel=6)
+        tmp_path = body_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(stored)
+        os.replace(tmp_path, body_path)
+        self._write_meta(key, meta)
+        with self._lock:
+            self._total += len(stored) - self._lru.pop(key, 0)
+            self._lru[key] = len(stored)
+        self._evict()
+
+    def _touch(self, key):
+        _, body_path = self._paths(key)
+        try:
+            os.utime(body_path)
+        except OSError:
+            pass
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+
+    def _evict(self):
+        while True:
+            with self._lock:
+                if self._total <= self.max_bytes or len(self._lru) <= 1:
+                    return
+                key, size = self._lru.popitem(last=False)
+                self._total -= size
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def get(self, url, headers=None, **kwargs):
+        """
+        Fetches url through the cache
+
+        Args:
+            url (str): The URL to fetch
+            headers (dict): Request headers
+            **kwargs: Ignored requests options (e.g. stream), for Session compatibility
+
+        Returns:
+            CachedResponse: The response body and kept headers
+
+        Raises:
+            requests.HTTPError: When the server answers with an error status
+        """
+        key = hashlib.sha1(normalize_url(url).encode('utf-8')).hexdigest()
+        meta, body = self._read(key)
+        now = time.time()
+
+        if meta is not None and now - meta['fetched_at'] < self.max_age:
+            self.hits += 1
+            self._touch(key)
+            return CachedResponse(url, meta['status'], meta['headers'], body, from_cache=True)
+
+        request_headers = dict(headers or {})
+        if meta is not None:
+            if meta['headers'].get('ETag'):
+                request_headers['If-None-Match'] = meta['headers']['ETag']
+            if meta['headers'].get('Last-Modified'):
+                request_headers['If-Modified-Since'] = meta['headers']['Last-Modified']
+
+        response = self.session.get(url, headers=request_headers)
+
+        if response.status_code == 304 and meta is not None:
+            self.revalidated += 1
+            meta['fetched_at'] = now
+            self._write_meta(key, meta)
+            self._touch(key)
+            return CachedResponse(url, meta['status'], meta['headers'], body, from_cache=True, revalidated=True)
+
+        response.raise_for_status()
+        self.misses += 1
+        kept = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+        meta = {'url': normalize_url(url), 'status': response.status_code, 'headers': kept, 'fetched_at': now}
+        self._store(key, meta, response.content)
+        return CachedResponse(url, response.status_code, kept, response.content, from_cache=False)
+
+    def stats(self):
+        """
+        Returns a one-line summary of hits, 304 revalidations and misses
+        """
+        return (f"cache: {self.hits} fresh hits, {self.revalidated} revalidated (304), "
+                f"{self.misses} downloaded, {self._total / 1048576:.1f} MB on disk")
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,368 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from collection_scan import CHUNK, hash_file
+
+CACHE_DIR = '.thumbs'
+INDEX_NAME = 'index.json'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif', '.bmp')
+
+# Images decoded per task: decoding costs far more than a task
+DECODE_CHUNK = 16
+
+# Bits of the difference hash: 8 rows of 8 comparisons
+HASH_BITS = 64
+
+def sniff_format(head):
+    """
+    Returns (format, extension) of an image from its first 32 bytes, (None, None) when not recognized
+    """
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg', '.jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png', '.png'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif', '.gif'
+    if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+        return 'webp', '.webp'
+    if head[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'avif', '.avif'
+    if head.startswith(b'BM'):
+        return 'bmp', '.bmp'
+    return None, None
+
+def read_format(path):
+    """
+    Returns (format, extension) of an image file from its magic number
+    """
+    with open(path, 'rb') as f:
+        return sniff_format(f.read(32))
+
+def with_real_extension(path):
+    """
+    Renames an image file to the extension of its actual format
+
+    Returns:
+        str: The new path, or path when the format is unknown or already matches
+    """
+    _, extension = read_format(path)
+    root, current = os.path.splitext(path)
+    if extension is None or current.lower() in (extension, '.jpeg' if extension == '.jpg' else extension):
+        return path
+    os.replace(path, root + extension)
+    return root + extension
+
+def load_pillow():
+    """
+    Returns the PIL.Image module, None when Pillow is not installed
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+def dhash(image):
+    """
+    Returns the 64-bit difference hash of a PIL image as 16 hex digits
+
+    The image is shrunk to 9x8 gray pixels and each bit tells whether a
+    pixel is brighter than its right neighbour: resizing, recompression and
+    small edits flip few bits, so near-duplicates have close hashes.
+    """
+    pixels = list(image.convert('L').resize((9, 8)).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = value << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{value:016x}"
+
+def _decode_chunk(jobs, size, quality):
+    # Worker process: decodes each image once, writes its thumbnail and hashes it
+    Image = load_pillow()
+    results = {}
+    for path, sha256, thumb_path in jobs:
+        try:
+            with Image.open(path) as image:
+                width, height = image.size
+                # JPEG decodes straight at 1/2 to 1/8 scale, never at full size
+                image.draft('RGB', (size, size))
+                thumb = image.convert('RGB')
+            thumb.thumbnail((size, size))
+            os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+            thumb.save(thumb_path + '.tmp', 'JPEG', quality=quality)
+            os.replace(thumb_path + '.tmp', thumb_path)
+            results[sha256] = {'width': width, 'height': height, 'dhash': dhash(thumb)}
+        except Exception as e:
+            results[sha256] = {'error': str(e)}
+    return results
+
+def _hash_chunk(folder, names):
+    # Worker thread: content hash and sniffed format of a chunk of files
+    results = {}
+    for name in names:
+        path = os.path.join(folder, name)
+        try:
+            results[name] = {'sha256': hash_file(path), 'format': read_format(path)[0]}
+        except OSError as e:
+            results[name] = {'error': str(e)}
+    return results
+
+class ImageCache:
+    """
+    Thumbnails, real formats and perceptual hashes of the images of a folder
+
+    Everything is keyed by the SHA-256 of the image, so an image is decoded
+    once whatever its name and however many files hold it. Files whose size
+    and modification time are unchanged are not even read again. Thumbnails
+    are JPEGs of at most size pixels a side, in .thumbs/<2 hex>/<sha256>.jpg
+    under the folder, next to the index.json holding the rest: a gallery or
+    a duplicate search never decodes an original.
+
+    Decoding needs Pillow, imported only when images are to be decoded.
+    Without it the formats are still detected and the images are decoded
+    by the first update run with Pillow installed.
+    """
+
+    def __init__(self, folder, size=256, quality=85):
+        self.folder = folder
+        self.size = size
+        self.quality = quality
+        self.root = os.path.join(folder, CACHE_DIR)
+        self.path = os.path.join(self.root, INDEX_NAME)
+        self.files = {}   # file name -> {'size', 'mtime_ns', 'sha256'}
+        self.images = {}  # sha256 -> {'format', 'width', 'height', 'dhash'} or {'format', 'error'}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                self.files = index['files']
+                # Thumbnails of another size are made again
+                self.images = index['images'] if index['size'] == size else {}
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring image cache index {self.path}: {e}")
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'size': self.size, 'updated_at': time.time(),
+                                'files': self.files, 'images': self.images}))
+        os.replace(tmp_path, self.path)
+
+    def thumb_path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256 + '.jpg')
+
+    def update(self, workers=None, threads=16):
+        """
+        Brings the cache up to date with the folder
+
+        Changed files are hashed in a thread pool (memory maps, no GIL);
+        images never seen before are decoded in a process pool. Images no
+        file holds any more are dropped with their thumbnails.
+
+        Args:
+            workers (int): Number of decoding processes, None for one per core
+            threads (int): Number of hashing threads
+
+        Returns:
+            tuple: (number of files hashed, number of images decoded)
+        """
+        listed = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                if entry.is_file():
+                    stat = entry.stat()
+                    listed[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        changed = [name for name, (size, mtime_ns) in listed.items()
+                   if name not in self.files or self.files[name]['size'] != size
+                   or self.files[name]['mtime_ns'] != mtime_ns]
+        self.files = {name: info for name, info in self.files.items() if name in listed}
+
+        chunks = [changed[start:start + CHUNK] for start in range(0, len(changed), CHUNK)]
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for results in executor.map(lambda names: _hash_chunk(self.folder, names), chunks):
+                for name, info in results.items():
+                    if 'error' in info:
+                        print(f"Error reading {name}: {info['error']}")
+                        self.files.pop(name, None)
+                        continue
+                    size, mtime_ns = listed[name]
+                    self.files[name] = {'size': size, 'mtime_ns': mtime_ns, 'sha256': info['sha256']}
+                    self.images.setdefault(info['sha256'], {'format': info['format']})
+
+        held = {info['sha256']: name for name, info in self.files.items()}
+        for sha256 in [sha256 for sha256 in self.images if sha256 not in held]:
+            del self.images[sha256]
+            try:
+                os.remove(self.thumb_path(sha256))
+            except OSError:
+                pass
+
+        pending = [sha256 for sha256, image in self.images.items() if 'dhash' not in image and 'error' not in image]
+        decoded = 0
+        if pending and load_pillow() is None:
+            print(f"{len(pending)} images left without thumbnail: Pillow is not installed (pip install Pillow)")
+        elif pending:
+            jobs = [(os.path.join(self.folder, held[sha256]), sha256, self.thumb_path(sha256)) for sha256 in pending]
+            chunks = [jobs[start:start + DECODE_CHUNK] for start in range(0, len(jobs), DECODE_CHUNK)]
+            workers = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                for results in pool.map(_decode_chunk, chunks, [self.size] * len(chunks),
+                                        [self.quality] * len(chunks)):
+                    for sha256, info in results.items():
+                        self.images[sha256].update(info)
+                        decoded += 1
+        if changed or decoded or len(held) != len(self.images):
+            self.save()
+        return len(changed), decoded
+
+    def lookup(self, name):
+        """
+        Returns what is known of an image file without opening it
+
+        Returns:
+            dict: sha256, format, width, height, dhash and thumb path (when decoded), or None
+        """
+        info = self.files.get(name)
+        if info is None:
+            return None
+        image = dict(self.images.get(info['sha256'], {}), sha256=info['sha256'])
+        if 'dhash' in image:
+            image['thumb'] = self.thumb_path(info['sha256'])
+        return image
+
+    def hashes(self):
+        """
+        Returns (file path, dhash) of every decoded image file
+        """
+        return [(os.path.join(self.folder, name), self.images[info['sha256']]['dhash'])
+                for name, info in sorted(self.files.items()) if 'dhash' in self.images.get(info['sha256'], {})]
+
+    def summary(self):
+        formats = {}
+        mislabeled = 0
+        for name, info in self.files.items():
+            image_format = self.images.get(info['sha256'], {}).get('format') or 'unknown'
+            formats[image_format] = formats.get(image_format, 0) + 1
+            if image_format != 'unknown' and not name.lower().endswith(
+                    ('.jpg', '.jpeg') if image_format == 'jpeg' else '.' + image_format):
+                mislabeled += 1
+        decoded = sum(1 for image in self.images.values() if 'dhash' in image)
+        errors = sum(1 for image in self.images.values() if 'error' in image)
+        return (f"images: {len(self.files)} files, {len(self.images)} distinct, {decoded} with thumbnail, "
+                f"{errors} undecodable, {mislabeled} with the wrong extension ("
+                + ", ".join(f"{image_format} {count}" for image_format, count in sorted(formats.items())) + ")")
+
+def near_duplicates(hashes, threshold=4):
+    """
+    Groups images whose difference hashes differ in at most threshold bits
+
+    The 64 bits are cut into threshold + 1 bands: two hashes that close
+    agree on at least one whole band, so only images sharing a band are
+    compared, instead of every pair.
+
+    Args:
+        hashes (list): (label, dhash hex) pairs, e.g. from ImageCache.hashes
+        threshold (int): Largest Hamming distance counted as a near-duplicate
+
+    Returns:
+        list: Groups of two or more labels, largest first
+    """
+    values = [int(value, 16) for _, value in hashes]
+    parent = list(range(len(values)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    bands = threshold + 1
+    width = HASH_BITS // bands
+    for band in range(bands):
+        shift = band * width
+        mask = (1 << (width if band < bands - 1 else HASH_BITS - shift)) - 1
+        buckets = {}
+        for i, value in enumerate(values):
+            buckets.setdefault(value >> shift & mask, []).append(i)
+        for members in buckets.values():
+            for position, i in enumerate(members):
+                for j in members[position + 1:]:
+                    if bin(values[i] ^ values[j]).count('1') <= threshold:
+                        parent[find(i)] = find(j)
+
+    groups = {}
+    for i in range(len(values)):
+        groups.setdefault(find(i), []).append(hashes[i][0])
+    return sorted((group for group in groups.values() if len(group) > 1), key=len, reverse=True)
+
+def site_of(path):
+    """
+    Returns the site an image comes from: the domain of ai_tool_scraper2 files, else the folder
+    """
+    name = os.path.basename(path)
+    if name.startswith('site-'):
+        return name[5:].split('|')[0]
+    return os.path.dirname(path)
+
+def fix_extensions(folder):
+    """
+    Renames the ai_tool_scraper2 images saved as .webp whatever their format
+
+    Returns:
+        int: Number of files renamed
+    """
+    renamed = 0
+    for name in os.listdir(folder):
+        if name.startswith('site-') and '-AI-TOOL-large.' in name and not name.endswith('.txt'):
+            path = os.path.join(folder, name)
+            if with_real_extension(path) != path:
+                renamed += 1
+    return renamed
+
+def main():
+    parser = argparse.ArgumentParser(description="Build thumbnails and perceptual hashes of downloaded images "
+                                                 "and find near-duplicates.")
+    parser.add_argument('folders', nargs='+', help="Folders of posters or AI tool images.")
+    parser.add_argument('--size', type=int, default=256,
+                        help="Thumbnail size in pixels (longest side).")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of decoding processes. Defaults to one per core.")
+    parser.add_argument('--fix-extensions', action='store_true',
+                        help="First rename the AI tool images whose extension is not their real format.")
+    parser.add_argument('--duplicates', action='store_true',
+                        help="List the groups of near-duplicate images across all the folders.")
+    parser.add_argument('--threshold', type=int, default=4,
+                        help="Largest number of differing hash bits counted as a near-duplicate.")
+    args = parser.parse_args()
+
+    hashes = []
+    for folder in args.folders:
+        if args.fix_extensions:
+            print(f"{folder}: {fix_extensions(folder)} images renamed to their real extension")
+        cache = ImageCache(folder, size=args.size)
+        start = time.perf_counter()
+        hashed, decoded = cache.update(workers=args.workers)
+        print(f"{folder}: {hashed} files hashed, {decoded} images decoded in {time.perf_counter() - start:.2f}s")
+        print(cache.summary())
+        hashes.extend(cache.hashes())
+
+    if args.duplicates:
+        groups = near_duplicates(hashes, args.threshold)
+        across = sum(1 for group in groups if len({site_of(path) for path in group}) > 1)
+        print(f"{len(groups)} groups of near-duplicate images, {across} across sites")
+        for group in groups:
+            print(f"  {len(group)} images:")
+            for path in group:
+                print(f"    {path}")
+
+if __name__ == "__main__":
+    main()
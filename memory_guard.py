@@ -0,0 +1,140 @@
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from scrape_metrics import metrics
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def rss_bytes():
+    """
+    Returns the current resident set size of this process
+
+    Read from /proc/self/statm on Linux, else with psutil when it is
+    installed. Without either only the peak RSS (ru_maxrss) is known; it
+    never goes down, so once over budget pages are taken one at a time.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Bytes on macOS, kilobytes on Linux and the BSDs
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return 0
+
+class MemoryGuard:
+    """
+    Holds back the intake of new pages while the process is over its RSS budget
+
+    Workers call wait() before taking a page. Over budget, the guard first
+    collects garbage; if the process is still over, the caller sleeps until
+    the pages in flight have been finished and memory is back under the
+    budget. With nothing in flight there is nothing left to wait for, and
+    the page is let through, so the run never stalls.
+
+    With trace_top set, tracemalloc records allocations from the start and
+    the top allocating lines are reported the first time the budget is
+    exceeded and at the end of the run.
+    """
+
+    def __init__(self, budget_mb, trace_top=0, poll=0.05):
+        self.budget = budget_mb * 1024 * 1024
+        self.trace_top = trace_top
+        self.poll = poll
+        self.peak = 0
+        self.throttled = 0
+        self.collections = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._reported = False
+        if trace_top and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _sample(self):
+        rss = rss_bytes()
+        metrics.observe('rss_megabytes', rss / 1048576)
+        with self._lock:
+            self.peak = max(self.peak, rss)
+        return rss
+
+    def wait(self):
+        """
+        Blocks while the process is over budget and pages are in flight, then counts one more page in flight
+        """
+        rss = self._sample()
+        if rss > self.budget:
+            gc.collect()
+            with self._lock:
+                self.collections += 1
+            rss = self._sample()
+        if rss > self.budget:
+            with self._lock:
+                self.throttled += 1
+                report = self.trace_top and not self._reported
+                self._reported = True
+            if report:
+                print(f"RSS {rss / 1048576:.0f} MB over the {self.budget / 1048576:.0f} MB budget")
+                print(self.top_allocators())
+            start = time.perf_counter()
+            while rss > self.budget:
+                with self._lock:
+                    if not self._in_flight:
+                        break
+                time.sleep(self.poll)
+                gc.collect()
+                rss = self._sample()
+            waited = time.perf_counter() - start
+            metrics.observe('stage_seconds', waited, stage='memory_wait')
+            with self._lock:
+                self.waited += waited
+        with self._lock:
+            self._in_flight += 1
+
+    def done(self):
+        """
+        Counts a page taken with wait() as finished
+        """
+        with self._lock:
+            self._in_flight -= 1
+
+    def top_allocators(self):
+        """
+        Returns the source lines holding the most traced memory, one per line
+        """
+        if not tracemalloc.is_tracing():
+            return "tracemalloc is not tracing"
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        lines = [f"top {self.trace_top} allocators:"]
+        for stat in snapshot.statistics('lineno')[:self.trace_top]:
+            frame = stat.traceback[0]
+            lines.append(f"  {stat.size / 1048576:>8.2f} MB {stat.count:>8} blocks  {frame.filename}:{frame.lineno}")
+        return '\n'.join(lines)
+
+    def summary(self):
+        lines = [f"memory: peak RSS {self.peak / 1048576:.0f} MB of {self.budget / 1048576:.0f} MB budget, "
+                 f"{self.throttled} pages held back ({self.waited:.1f}s), {self.collections} forced collections"]
+        if self.trace_top:
+            lines.append(self.top_allocators())
+        return '\n'.join(lines)
@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+
+from scrape_metrics import metrics
+
+STATS_NAME = '.fallback_stats.json'
+
+# Pages between two consistency checks of a field
+CHECK_EVERY = 50
+
+# Attempts after which the counts of a method are halved, so old pages weigh less
+WINDOW = 200
+
+# Attempts without any success after which a method is skipped
+SKIP_AFTER = 50
+
+class MethodStats:
+    """
+    Success rates of the fallback methods of each field, skipping the dead ones
+
+    The cascades are first-success: methods always run in their fixed
+    priority order, since a catch-all method tried early would win over the
+    precise ones. When adaptive, a method that has not matched once in
+    skip_after attempts is skipped, so a markup change that breaks the
+    first methods stops costing a failed scan per page. Every CHECK_EVERY
+    pages a field runs all of its methods instead: when a skipped method
+    would have won, the field's rates are reset and every method runs again
+    until they rebuild. Adaptive skipping is off unless enabled.
+    """
+
+    def __init__(self, check_every=CHECK_EVERY, window=WINDOW, skip_after=SKIP_AFTER):
+        self.check_every = check_every
+        self.window = window
+        self.skip_after = skip_after
+        self.adaptive = False
+        self.path = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.rates = {}  # field -> {method: [attempts, successes]}
+            self.pages = {}  # field -> pages seen
+
+    def skipped(self, field, number):
+        """
+        Tells whether a method has failed on every one of its last skip_after attempts or more
+        """
+        with self._lock:
+            attempts, successes = self.rates.get(field, {}).get(number, (0, 0))
+        return attempts >= self.skip_after and not successes
+
+    def order(self, field, numbers):
+        """
+        Returns the method numbers of a field to run, in their fixed order, without the skipped ones
+        """
+        numbers = sorted(numbers)
+        if not self.adaptive:
+            return numbers
+        return [number for number in numbers if not self.skipped(field, number)]
+
+    def should_check(self, field):
+        """
+        Counts a page of a field and tells whether it is due a consistency check
+        """
+        if not self.adaptive:
+            return False
+        with self._lock:
+            self.pages[field] = self.pages.get(field, 0) + 1
+            return self.pages[field] % self.check_every == 0
+
+    def record(self, field, number, success, attempts=None):
+        """
+        Records the outcome of one method on one page
+
+        Args:
+            field (str): 'directors' or 'cast'
+            number (int): Method number
+            success (bool): Whether the method found something
+            attempts (list): Optional list receiving (field, number, success),
+                             e.g. to send the outcomes back from a worker process
+        """
+        with self._lock:
+            counts = self.rates.setdefault(field, {}).setdefault(number, [0, 0])
+            counts[0] += 1
+            counts[1] += bool(success)
+            if counts[0] > self.window:
+                counts[0] /= 2
+                counts[1] /= 2
+        if attempts is not None:
+            attempts.append((field, number, bool(success)))
+
+    def merge(self, attempts):
+        """
+        Records the outcomes collected by record(attempts=...) in another process
+        """
+        for field, number, success in attempts:
+            self.record(field, number, success)
+
+    def mismatch(self, field):
+        """
+        Forgets the rates of a field whose skipped methods turned out to match
+        """
+        with self._lock:
+            self.rates.pop(field, None)
+
+    def load(self, path):
+        """
+        Loads the rates saved by a previous run; a missing or unreadable file starts from scratch
+        """
+        self.reset()
+        self.path = path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Ignoring fallback statistics {path}: {e}")
+            return
+        with self._lock:
+            for field, rates in saved.get('rates', {}).items():
+                self.rates[field] = {int(number): list(counts) for number, counts in rates.items()}
+            self.pages = dict(saved.get('pages', {}))
+
+    def save(self, path=None):
+        path = path or self.path
+        # Nothing scraped into a folder that does not exist
+        if path is None or not os.path.isdir(os.path.dirname(path) or '.'):
+            return
+        with self._lock:
+            saved = {'rates': {field: {str(number): counts for number, counts in rates.items()}
+                               for field, rates in self.rates.items()},
+                     'pages': self.pages}
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(saved, f, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error saving fallback statistics: {e}")
+
+    def summary(self):
+        lines = ["fallback methods:"]
+        for field in sorted(self.rates):
+            rates = self.rates[field]
+            ranked = ", ".join(f"{number} ({rates[number][1] / rates[number][0]:.0%} of {rates[number][0]:.0f}"
+                               f"{', skipped' if self.skipped(field, number) else ''})"
+                               for number in sorted(rates) if rates[number][0])
+            lines.append(f"  {field:<10} {ranked}")
+        return '\n'.join(lines)
+
+method_stats = MethodStats()
+
+def run_cascade(field, methods, candidates, attempts=None):
+    """
+    Runs the fallback methods of a field in priority order until one finds something
+
+    Args:
+        field (str): 'directors' or 'cast'
+        methods (dict): {method number: function(candidates) -> list}
+        candidates (dict): Nodes collected by tmdb_extract.collect_candidates
+        attempts (list): Optional list receiving the outcomes, see MethodStats.record
+
+    Returns:
+        tuple: (result, number of the method that produced it, 0 for none)
+    """
+    fixed = sorted(methods)
+    if not method_stats.should_check(field):
+        for number in method_stats.order(field, fixed):
+            result = methods[number](candidates)
+            method_stats.record(field, number, result, attempts)
+            if result:
+                return result, number
+        return [], 0
+
+    # Consistency check: run every method, skipped ones included
+    order = method_stats.order(field, fixed)
+    results = {}
+    for number in fixed:
+        results[number] = methods[number](candidates)
+        method_stats.record(field, number, results[number], attempts)
+    fixed_winner = next((number for number in fixed if results[number]), 0)
+    adaptive_winner = next((number for number in order if results[number]), 0)
+    if results.get(fixed_winner) != results.get(adaptive_winner):
+        metrics.count('fallback_checks_total', field=field, result='mismatch')
+        print(f"Skipped {field} method {fixed_winner} matches again: running every method")
+        method_stats.mismatch(field)
+    else:
+        metrics.count('fallback_checks_total', field=field, result='match')
+    return results.get(fixed_winner, []), fixed_winner
@@ -0,0 +1,204 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+
+class MirrorServer:
+    """
+    Local stand-in HTTP server replaying recorded pages and images
+
+    The fixtures folder holds a manifest.json mapping original URLs (without
+    query string) to a fixture file and its Content-Type. A request for
+    http://127.0.0.1:<port>/<host>/<path> is answered with the fixture
+    recorded for https://<host>/<path>. Responses carry an ETag and honor
+    If-None-Match, so the HTTP cache can be exercised as well.
+
+    To exercise rate control the server can throttle on purpose: requests
+    beyond max_in_flight concurrent ones for the same host are answered 429
+    at once, and a share error_rate of the others 503, both with
+    Retry-After when set.
+    """
+
+    def __init__(self, fixtures_dir, port=0, delay=0.0, max_in_flight=None, error_rate=0.0, retry_after=None):
+        self.fixtures_dir = fixtures_dir
+        self.delay = delay
+        self.max_in_flight = max_in_flight
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.requests_served = 0
+        self.throttled = 0
+        self.peak_in_flight = 0
+        self._in_flight = {}  # host -> requests being answered
+        self._lock = threading.Lock()
+        with open(os.path.join(fixtures_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add(self, url, body, content_type='text/html; charset=utf-8'):
+        """
+        Registers an in-memory response for url, e.g. a generated listing page
+        """
+        self.manifest[url.split('?')[0]] = {'body': body, 'content_type': content_type}
+
+    def lookup(self, url):
+        """
+        Returns (body bytes, content type) recorded for url, or (None, None)
+        """
+        entry = self.manifest.get(url.split('?')[0])
+        if entry is None:
+            return None, None
+        if 'body' in entry:
+            body = entry['body']
+            return (body.encode('utf-8') if isinstance(body, str) else body), entry['content_type']
+        with open(os.path.join(self.fixtures_dir, entry['file']), 'rb') as f:
+            return f.read(), entry['content_type']
+
+    def _make_handler(self):
+        mirror = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle(self):
+                # Streaming clients hang up once they have read what they need
+                try:
+                    super().handle()
+                except (ConnectionResetError, BrokenPipeError):
+                    pass
+
+            def do_GET(self):
+                host = self.path.lstrip('/').partition('/')[0]
+                with mirror._lock:
+                    in_flight = mirror._in_flight[host] = mirror._in_flight.get(host, 0) + 1
+                    over = mirror.max_in_flight is not None and in_flight > mirror.max_in_flight
+                    if not over:
+                        mirror.peak_in_flight = max(mirror.peak_in_flight, in_flight)
+                try:
+                    if over:
+                        self.refuse(429)
+                        return
+                    if mirror.delay:
+                        time.sleep(mirror.delay)
+                    if mirror.error_rate and random.random() < mirror.error_rate:
+                        self.refuse(503)
+                        return
+                    self.serve()
+                finally:
+                    with mirror._lock:
+                        mirror._in_flight[host] -= 1
+
+            def refuse(self, status):
+                with mirror._lock:
+                    mirror.throttled += 1
+                self.send_response(status)
+                if mirror.retry_after is not None:
+                    self.send_header('Retry-After', str(mirror.retry_after))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def serve(self):
+                mirror.requests_served += 1
+                host, _, rest = self.path.lstrip('/').partition('/')
+                body, content_type = mirror.lookup(f"https://{host}/{rest}")
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        Serves in a background thread and returns the base URL
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+def mirror_url(base_url, url):
+    """
+    Rewrites https://host/path?query into base_url/host/path?query
+    """
+    parts = urlsplit(url)
+    mirrored = f"{base_url}/{parts.hostname}{parts.path or '/'}"
+    if parts.query:
+        mirrored += '?' + parts.query
+    return mirrored
+
+class MirrorSession(requests.Session):
+    """
+    Session sending every request to a MirrorServer instead of the real site
+
+    Callers keep using the original URLs, so domain lookups, poster URLs and
+    the URL saved in each record are the same as against the live site.
+    """
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def request(self, method, url, *args, **kwargs):
+        return super().request(method, mirror_url(self.base_url, url), *args, **kwargs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded pages from a fixtures folder.")
+    parser.add_argument('fixtures', nargs='?', default='bench_fixtures', help="Folder holding manifest.json.")
+    parser.add_argument('--port', type=int, default=8000, help="Port to listen on.")
+    parser.add_argument('--delay', type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument('--max-in-flight', type=int, metavar='N',
+                        help="Answer 429 to the requests beyond N concurrent ones for the same host.")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Share of the other requests answered 503, from 0 to 1.")
+    parser.add_argument('--retry-after', type=int, metavar='SECONDS',
+                        help="Retry-After header sent with the 429 and 503 responses.")
+    args = parser.parse_args()
+
+    server = MirrorServer(args.fixtures, port=args.port, delay=args.delay, max_in_flight=args.max_in_flight,
+                          error_rate=args.error_rate, retry_after=args.retry_after)
+    print(f"Serving {len(server.manifest)} recorded URLs from {args.fixtures} on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
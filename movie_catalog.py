@@ -0,0 +1,246 @@
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from http_cache import normalize_url
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    number     INTEGER PRIMARY KEY AUTOINCREMENT,
+    url_key    TEXT NOT NULL UNIQUE,
+    title_key  TEXT NOT NULL,
+    name       TEXT,
+    year       TEXT,
+    record     TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS movies_title_key ON movies(title_key);
+CREATE INDEX IF NOT EXISTS movies_year ON movies(year);
+CREATE TABLE IF NOT EXISTS movie_genres (
+    number INTEGER NOT NULL REFERENCES movies(number) ON DELETE CASCADE,
+    genre  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS movie_genres_genre ON movie_genres(genre, number);
+CREATE INDEX IF NOT EXISTS movie_genres_number ON movie_genres(number);
+CREATE TABLE IF NOT EXISTS movie_directors (
+    number INTEGER NOT NULL REFERENCES movies(number) ON DELETE CASCADE,
+    name   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS movie_directors_name ON movie_directors(name, number);
+CREATE INDEX IF NOT EXISTS movie_directors_number ON movie_directors(number);
+CREATE TABLE IF NOT EXISTS movie_cast (
+    number   INTEGER NOT NULL REFERENCES movies(number) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS movie_cast_name ON movie_cast(name, number);
+CREATE INDEX IF NOT EXISTS movie_cast_number ON movie_cast(number);
+"""
+
+def url_key(url):
+    """
+    Returns the key identifying a movie page regardless of how its URL was spelled
+
+    The language parameter is dropped because scrape_movie_data appends
+    language=en-US to every URL it records.
+    """
+    parts = urlsplit(normalize_url(url))
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'language']
+    return urlunsplit((parts.scheme, parts.netloc, parts.path.rstrip('/') or '/', urlencode(query), ''))
+
+class MovieCatalog:
+    """
+    Indexed SQLite catalog of every scraped movie record
+
+    Each record is stored whole (as the JSON written to MediaCollection) plus
+    indexed columns and side tables for URL, title key, year, genre, director
+    and cast. Records are upserted by URL, so re-scraping a movie keeps its
+    auto-assigned number.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def has_url(self, url):
+        """
+        Tells whether the movie page at url is already in the catalog
+        """
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM movies WHERE url_key = ?", (url_key(url),)).fetchone()
+        return row is not None
+
+    def known_urls(self):
+        """
+        Returns the set of URL keys in the catalog, for O(1) membership checks in batch runs
+        """
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT url_key FROM movies")}
+
+    def keys(self):
+        """
+        Returns (title key, URL key) of every movie, in number order
+        """
+        with self._lock:
+            return self._db.execute("SELECT title_key, url_key FROM movies ORDER BY number").fetchall()
+
+    def upsert(self, movie_data):
+        """
+        Inserts or updates a scraped movie and assigns its number
+
+        Args:
+            movie_data (dict): {TitleYear: record} as returned by scrape_movie_data;
+                               record['number'] is set to the catalog number
+
+        Returns:
+            int: The movie number
+        """
+        title_key = list(movie_data.keys())[0]
+        record = movie_data[title_key]
+        key = url_key(record['url'])
+        with self._lock, self._db:
+            row = self._db.execute("SELECT number FROM movies WHERE url_key = ?", (key,)).fetchone()
+            if row:
+                number = row[0]
+            else:
+                number = self._db.execute(
+                    "INSERT INTO movies (url_key, title_key, record, updated_at) VALUES (?, ?, '{}', 0)",
+                    (key, title_key)).lastrowid
+            record['number'] = number
+            self._db.execute(
+                "UPDATE movies SET title_key = ?, name = ?, year = ?, record = ?, updated_at = ? WHERE number = ?",
+                (title_key, record.get('name'), record.get('year'), json.dumps(record, ensure_ascii=False),
+                 time.time(), number))
+            for table in ('movie_genres', 'movie_directors', 'movie_cast'):
+                self._db.execute(f"DELETE FROM {table} WHERE number = ?", (number,))
+            self._db.executemany("INSERT INTO movie_genres (number, genre) VALUES (?, ?)",
+                                 [(number, genre) for genre in record.get('theme') or []])
+            self._db.executemany("INSERT INTO movie_directors (number, name) VALUES (?, ?)",
+                                 [(number, name) for name in record.get('author') or []])
+            self._db.executemany("INSERT INTO movie_cast (number, position, name) VALUES (?, ?, ?)",
+                                 [(number, i, name) for i, name in enumerate(record.get('cast') or [])])
+        return number
+
+    def get(self, title_key):
+        """
+        Returns {title_key: record} for a title key, or None
+        """
+        with self._lock:
+            row = self._db.execute("SELECT title_key, record FROM movies WHERE title_key = ? ORDER BY number LIMIT 1",
+                                   (title_key,)).fetchone()
+        return {row[0]: json.loads(row[1])} if row else None
+
+    def find(self, genre=None, director=None, cast=None, year=None):
+        """
+        Finds movies matching every given criterion
+
+        Returns:
+            list: {title_key: record} dicts ordered by number
+        """
+        query = "SELECT m.title_key, m.record FROM movies m"
+        conditions = []
+        params = []
+        if genre:
+            conditions.append("m.number IN (SELECT number FROM movie_genres WHERE genre = ?)")
+            params.append(genre)
+        if director:
+            conditions.append("m.number IN (SELECT number FROM movie_directors WHERE name = ?)")
+            params.append(director)
+        if cast:
+            conditions.append("m.number IN (SELECT number FROM movie_cast WHERE name = ?)")
+            params.append(cast)
+        if year:
+            conditions.append("m.year = ?")
+            params.append(str(year))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY m.number"
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [{title_key: json.loads(record)} for title_key, record in rows]
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+
+    def export_json(self, folder):
+        """
+        Writes every movie as <TitleYear>.json in the per-movie format of MediaCollection
+
+        Returns:
+            int: Number of files written
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT title_key, record FROM movies ORDER BY number").fetchall()
+        os.makedirs(folder, exist_ok=True)
+        for title_key, record in rows:
+            with open(os.path.join(folder, title_key + ".json"), 'w', encoding='utf-8') as f:
+                json.dump({title_key: json.loads(record)}, f, indent=2, ensure_ascii=False)
+        return len(rows)
+
+    def import_json(self, folder):
+        """
+        Loads existing <TitleYear>.json files into the catalog
+
+        Returns:
+            int: Number of movies imported
+        """
+        imported = 0
+        for path in sorted(glob.glob(os.path.join(folder, '*.json'))):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    movie_data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Skipping {path}: {e}")
+                continue
+            if len(movie_data) != 1 or not isinstance(list(movie_data.values())[0], dict) \
+                    or 'url' not in list(movie_data.values())[0]:
+                continue
+            self.upsert(movie_data)
+            imported += 1
+        return imported
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the indexed movie catalog.")
+    parser.add_argument('catalog', help="Path of the SQLite catalog file.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="Import per-movie JSON files from a folder.")
+    import_parser.add_argument('folder')
+    export_parser = subparsers.add_parser('export', help="Export every movie as per-movie JSON files.")
+    export_parser.add_argument('folder')
+    find_parser = subparsers.add_parser('find', help="List movies by genre, director, cast member or year.")
+    find_parser.add_argument('--genre')
+    find_parser.add_argument('--director')
+    find_parser.add_argument('--cast')
+    find_parser.add_argument('--year')
+    args = parser.parse_args()
+
+    catalog = MovieCatalog(args.catalog)
+    try:
+        if args.command == 'import':
+            print(f"Imported {catalog.import_json(args.folder)} movies ({catalog.count()} in catalog)")
+        elif args.command == 'export':
+            print(f"Exported {catalog.export_json(args.folder)} movies to {args.folder}")
+        else:
+            for movie_data in catalog.find(args.genre, args.director, args.cast, args.year):
+                for title_key, record in movie_data.items():
+                    print(f"{record['number']:>6}  {title_key:<40} {record.get('name')} ({record.get('year')})")
+    finally:
+        catalog.close()
+
+if __name__ == "__main__":
+    main()
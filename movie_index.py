@@ -0,0 +1,585 @@
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+MAGIC = b'MOVIDX01'
+
+# Changes are written to a small delta segment next to the index, merged
+# into the index once it holds more than this share of the movies
+MERGE_RATIO = 0.1
+MERGE_MIN = 1000
+
+# Indexed record fields and the name they are queried by
+FIELDS = {
+    'genre': 'theme',
+    'director': 'author',
+    'cast': 'cast',
+}
+
+def read_movie_file(path):
+    """
+    Reads a <TitleYear>.json file of the collection
+
+    Returns:
+        tuple: (title key, record), None when the file is not a movie record
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            movie_data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Skipping {path}: {e}")
+        return None
+    if not isinstance(movie_data, dict) or len(movie_data) != 1:
+        return None
+    title_key, record = next(iter(movie_data.items()))
+    if not isinstance(record, dict):
+        return None
+    return title_key, record
+
+def parse_year(value):
+    """
+    Returns the year of a record as an int, 0 when unknown
+    """
+    try:
+        year = int(str(value)[:4])
+    except (TypeError, ValueError):
+        return 0
+    return year if 0 < year < 10000 else 0
+
+def parse_score(value):
+    """
+    Returns the score of a record ('87.0%') as a float, NaN when unknown
+    """
+    try:
+        return float(str(value).rstrip('%'))
+    except (TypeError, ValueError):
+        return math.nan
+
+def _collection_files(folder):
+    # {file name: DirEntry} of the movie JSON files; dot files are bookkeeping
+    return {entry.name: entry for entry in os.scandir(folder)
+            if entry.name.endswith('.json') and not entry.name.startswith('.') and entry.is_file()}
+
+class IndexBuilder:
+    """
+    In-memory form of the index, used to (re)write the index file
+
+    Every string goes through one intern table, so a name shared by many
+    movies is stored once. Movies are keyed by file name, which is what
+    incremental updates compare against the collection folder.
+    """
+
+    def __init__(self, folder):
+        self.folder = os.path.abspath(folder)
+        self.movies = {}  # file name -> movie tuple, see _movie
+        self._strings = {}
+
+    def intern(self, value):
+        return self._strings.setdefault(value, value)
+
+    def _movie(self, title_key, name, year, score, mtime, terms):
+        return (self.intern(title_key), self.intern(name or ''), year, score, mtime,
+                {field: tuple(self.intern(term) for term in values) for field, values in terms.items()})
+
+    def add_file(self, file_name, mtime):
+        """
+        Reads one JSON file of the folder into the index
+
+        Returns:
+            bool: True when the file held a movie record
+        """
+        movie = read_movie_file(os.path.join(self.folder, file_name))
+        if movie is None:
+            self.movies.pop(file_name, None)
+            return False
+        title_key, record = movie
+        terms = {}
+        for field, key in FIELDS.items():
+            values = record.get(key) or []
+            terms[field] = [value for value in values if isinstance(value, str) and value]
+        self.movies[self.intern(file_name)] = self._movie(title_key, record.get('name'), parse_year(record.get('year')),
+                                                          parse_score(record.get('score')), mtime, terms)
+        return True
+
+    def remove_file(self, file_name):
+        self.movies.pop(file_name, None)
+
+    @classmethod
+    def from_index(cls, index, exclude=()):
+        """
+        Rebuilds the in-memory form from an index segment, without reading the JSON files again
+
+        Args:
+            index (IndexSegment): The segment to load
+            exclude (set): Document numbers to leave out
+        """
+        builder = cls(index.folder)
+        terms = [{field: [] for field in FIELDS} for _ in range(index.count)]
+        for field in FIELDS:
+            term_ids, starts, postings = index.sections[f'{field}_terms'], index.sections[f'{field}_starts'], \
+                index.sections[f'{field}_postings']
+            for i, sid in enumerate(term_ids):
+                term = index.string(sid)
+                for doc in postings[starts[i]:starts[i + 1]]:
+                    terms[doc][field].append(term)
+        s = index.sections
+        for doc in range(index.count):
+            if doc in exclude:
+                continue
+            builder.movies[builder.intern(index.string(s['doc_file'][doc]))] = builder._movie(
+                index.string(s['doc_title'][doc]), index.string(s['doc_name'][doc]), s['doc_year'][doc],
+                s['doc_score'][doc], s['doc_mtime'][doc], terms[doc])
+        return builder
+
+    def write(self, path, folder_mtime=None, **extra):
+        """
+        Writes an index segment: a JSON table of contents followed by aligned arrays
+
+        Documents are numbered in file name order. Each field has its terms
+        sorted case-insensitively, an offsets array and one concatenated
+        array of posting lists; year and score have document arrays sorted
+        by value for range queries.
+
+        Args:
+            path (str): Segment file
+            folder_mtime (float): Modification time of the folder when it was
+                                  scanned, None to read it now
+            extra: Additional table of contents entries
+
+        Returns:
+            int: Number of movies written
+        """
+        files = sorted(self.movies)
+        string_ids = {}
+        offsets = array('I', [0])
+        blob = bytearray()
+
+        def sid(value):
+            if value not in string_ids:
+                string_ids[value] = len(string_ids)
+                blob.extend(value.encode('utf-8'))
+                offsets.append(len(blob))
+            return string_ids[value]
+
+        sections = {
+            'doc_title': array('I'), 'doc_name': array('I'), 'doc_file': array('I'),
+            'doc_year': array('h'), 'doc_score': array('f'), 'doc_mtime': array('d'),
+        }
+        postings = {field: {} for field in FIELDS}
+        for doc, file_name in enumerate(files):
+            title_key, name, year, score, mtime, terms = self.movies[file_name]
+            sections['doc_title'].append(sid(title_key))
+            sections['doc_name'].append(sid(name))
+            sections['doc_file'].append(sid(file_name))
+            sections['doc_year'].append(year)
+            sections['doc_score'].append(score)
+            sections['doc_mtime'].append(mtime)
+            for field, values in terms.items():
+                for term in values:
+                    # Spellings differing only in case share the posting list of the first one
+                    key = term.casefold()
+                    if key not in postings[field]:
+                        postings[field][key] = (sid(term), [])
+                    docs = postings[field][key][1]
+                    if not docs or docs[-1] != doc:
+                        docs.append(doc)
+
+        for field in FIELDS:
+            term_ids, starts, concatenated = array('I'), array('I', [0]), array('I')
+            for key in sorted(postings[field]):
+                term_id, docs = postings[field][key]
+                term_ids.append(term_id)
+                concatenated.extend(docs)
+                starts.append(len(concatenated))
+            sections[f'{field}_terms'] = term_ids
+            sections[f'{field}_starts'] = starts
+            sections[f'{field}_postings'] = concatenated
+
+        by_year = sorted((year, doc) for doc, year in enumerate(sections['doc_year']) if year)
+        sections['year_values'] = array('h', [year for year, _ in by_year])
+        sections['year_docs'] = array('I', [doc for _, doc in by_year])
+        by_score = sorted((score, doc) for doc, score in enumerate(sections['doc_score']) if not math.isnan(score))
+        sections['score_values'] = array('f', [score for score, _ in by_score])
+        sections['score_docs'] = array('I', [doc for _, doc in by_score])
+        sections['string_offsets'] = offsets
+        sections['string_blob'] = array('B', bytes(blob))
+
+        if folder_mtime is None:
+            try:
+                folder_mtime = os.stat(self.folder).st_mtime
+            except OSError:
+                folder_mtime = 0.0
+        toc = {'count': len(files), 'folder': self.folder, 'folder_mtime': folder_mtime,
+               'built_at': time.time(), 'byteorder': sys.byteorder, 'sections': {}}
+        toc.update(extra)
+        # Offsets are relative to the end of the table of contents, aligned to 8 bytes
+        position = 0
+        for name, values in sections.items():
+            toc['sections'][name] = [position, values.typecode, len(values)]
+            position += -(-len(values) * values.itemsize // 8) * 8
+        header = json.dumps(toc).encode('utf-8')
+        header += b' ' * (-(len(MAGIC) + 4 + len(header)) % 8)
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(header)) + header)
+            for values in sections.values():
+                data = values.tobytes()
+                f.write(data + b'\0' * (-len(data) % 8))
+        os.replace(tmp_path, path)
+        return len(files)
+
+class IndexSegment:
+    """
+    Read-only view of an index segment file through mmap
+
+    Nothing is decoded up front: arrays are memoryviews over the mapping,
+    terms are found by binary search and only the strings of the matching
+    movies are decoded, so opening and querying cost the same whatever the
+    size of the collection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a movie index")
+        (toc_length,) = struct.unpack_from('<I', self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.toc = json.loads(self._mmap[start:start + toc_length])
+        if self.toc['byteorder'] != sys.byteorder:
+            self.close()
+            raise ValueError(f"{path} was written on a machine with another byte order, rebuild it")
+        base = start + toc_length
+        self._view = memoryview(self._mmap)
+        self.sections = {}
+        for name, (offset, typecode, length) in self.toc['sections'].items():
+            size = array(typecode).itemsize
+            self.sections[name] = self._view[base + offset:base + offset + length * size].cast(typecode)
+        self.count = self.toc['count']
+        self.folder = self.toc['folder']
+
+    def close(self):
+        for view in getattr(self, 'sections', {}).values():
+            view.release()
+        if getattr(self, '_view', None) is not None:
+            self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def string(self, sid):
+        offsets = self.sections['string_offsets']
+        return self.sections['string_blob'][offsets[sid]:offsets[sid + 1]].tobytes().decode('utf-8')
+
+    def postings(self, field, term):
+        """
+        Returns the sorted document numbers of a genre, director or cast member (case-insensitive)
+        """
+        term_ids = self.sections[f'{field}_terms']
+        key = term.casefold()
+        low, high = 0, len(term_ids)
+        while low < high:
+            middle = (low + high) // 2
+            if self.string(term_ids[middle]).casefold() < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(term_ids) or self.string(term_ids[low]).casefold() != key:
+            return []
+        starts = self.sections[f'{field}_starts']
+        return self.sections[f'{field}_postings'][starts[low]:starts[low + 1]]
+
+    def _range(self, name, low, high):
+        # Documents whose year or score is within [low, high], None bounds being open
+        values = self.sections[f'{name}_values']
+        first = bisect_left(values, low) if low is not None else 0
+        last = bisect_right(values, high) if high is not None else len(values)
+        return sorted(self.sections[f'{name}_docs'][first:last])
+
+    def query(self, genre=(), director=(), cast=(), year_from=None, year_to=None, min_score=None, limit=None,
+              exclude=()):
+        """
+        Finds the movies matching every criterion
+
+        Posting lists are intersected smallest first, each candidate being
+        looked up in the longer lists by binary search; year and score
+        bounds are checked on the candidates, or read from the sorted
+        arrays when no term is given.
+
+        Args:
+            genre, director, cast (iterable): Terms that must all match
+            year_from, year_to (int): Inclusive year bounds
+            min_score (float): Lowest score, in percent
+            limit (int): Maximum number of results
+            exclude (set): Document numbers to leave out
+
+        Returns:
+            list: Document numbers in file name order
+        """
+        if min_score is not None:
+            # Scores are stored as float32: compare against the same rounding
+            (min_score,) = struct.unpack('f', struct.pack('f', min_score))
+        lists = [self.postings(field, term) for field, terms in
+                 (('genre', genre), ('director', director), ('cast', cast)) for term in terms]
+        if lists:
+            lists.sort(key=len)
+            candidates = lists[0]
+            for other in lists[1:]:
+                candidates = [doc for doc in candidates
+                              if (i := bisect_left(other, doc)) < len(other) and other[i] == doc]
+        elif year_from is not None or year_to is not None:
+            candidates = self._range('year', year_from, year_to)
+        elif min_score is not None:
+            candidates = self._range('score', min_score, None)
+        else:
+            candidates = range(self.count)
+
+        years, scores = self.sections['doc_year'], self.sections['doc_score']
+        results = []
+        for doc in candidates:
+            if doc in exclude:
+                continue
+            year = years[doc]
+            if year_from is not None and (not year or year < year_from):
+                continue
+            if year_to is not None and (not year or year > year_to):
+                continue
+            if min_score is not None and not scores[doc] >= min_score:
+                continue
+            results.append(doc)
+            if limit and len(results) >= limit:
+                break
+        return results
+
+    def movie(self, doc):
+        """
+        Returns (title key, name, year, score) of a document number
+        """
+        s = self.sections
+        return (self.string(s['doc_title'][doc]), self.string(s['doc_name'][doc]), s['doc_year'][doc],
+                s['doc_score'][doc])
+
+def delta_path(path):
+    return path + '.delta'
+
+class MovieIndex:
+    """
+    The index of a collection: the main segment plus the delta of later changes
+
+    The delta holds the movies added or rewritten since the main segment
+    was written and the numbers of the main documents they replace or that
+    were deleted. A delta left over from an older main segment is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.main = IndexSegment(path)
+        self.delta = None
+        self.removed = set()
+        if os.path.exists(delta_path(path)):
+            delta = IndexSegment(delta_path(path))
+            if delta.toc.get('base') == self.main.toc['built_at']:
+                self.delta = delta
+                self.removed = set(delta.toc['removed'])
+            else:
+                delta.close()
+        self.folder = self.main.folder
+        self.segments = [self.main] + ([self.delta] if self.delta else [])
+
+    @property
+    def count(self):
+        return self.main.count - len(self.removed) + (self.delta.count if self.delta else 0)
+
+    @property
+    def folder_mtime(self):
+        return (self.delta or self.main).toc['folder_mtime']
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def query(self, genre=(), director=(), cast=(), year_from=None, year_to=None, min_score=None, limit=None):
+        """
+        Finds the movies matching every criterion, see IndexSegment.query
+
+        Returns:
+            list: (segment, document number) pairs
+        """
+        hits = []
+        for segment in self.segments:
+            exclude = self.removed if segment is self.main else ()
+            docs = segment.query(genre, director, cast, year_from, year_to, min_score,
+                                 limit - len(hits) if limit else None, exclude)
+            hits.extend((segment, doc) for doc in docs)
+            if limit and len(hits) >= limit:
+                break
+        return hits
+
+    def files(self):
+        """
+        Returns {file name: (segment, document number, mtime)} of every indexed movie
+        """
+        files = {}
+        for segment in self.segments:
+            names, mtimes = segment.sections['doc_file'], segment.sections['doc_mtime']
+            for doc in range(segment.count):
+                if segment is self.main and doc in self.removed:
+                    continue
+                files[segment.string(names[doc])] = (segment, doc, mtimes[doc])
+        return files
+
+def build_index(path, folder):
+    """
+    Indexes every JSON file of a folder into a new main segment
+
+    Returns:
+        int: Number of movies indexed
+    """
+    builder = IndexBuilder(folder)
+    folder_mtime = os.stat(builder.folder).st_mtime
+    for name, entry in _collection_files(builder.folder).items():
+        builder.add_file(name, entry.stat().st_mtime)
+    count = builder.write(path, folder_mtime)
+    if os.path.exists(delta_path(path)):
+        os.remove(delta_path(path))
+    return count
+
+def update_index(path, folder=None, full=True):
+    """
+    Brings an index up to date with its collection folder, creating it if needed
+
+    Only new, changed and removed files are read, and they go to the delta
+    segment: the main segment is only rewritten when the delta grows past
+    MERGE_RATIO of it. A full update stats every file to find the ones
+    rewritten in place; a quick update only looks for new and removed file
+    names, and is skipped altogether when the folder has not been modified
+    since the last update.
+
+    Args:
+        path (str): Index file
+        folder (str): Collection folder, None for the one recorded in the index
+        full (bool): Also detect files rewritten in place
+
+    Returns:
+        tuple: (files added, updated, removed)
+    """
+    if not os.path.exists(path) or (folder is not None and not _same_folder(path, folder)):
+        if folder is None:
+            raise ValueError(f"{path} does not exist: give the collection folder to build it")
+        return build_index(path, folder), 0, 0
+
+    with MovieIndex(path) as index:
+        folder_mtime = os.stat(index.folder).st_mtime
+        if not full and folder_mtime == index.folder_mtime:
+            return 0, 0, 0
+        known = index.files()
+        delta = IndexBuilder.from_index(index.delta) if index.delta else IndexBuilder(index.folder)
+        removed = set(index.removed)
+        base = index.main.toc['built_at']
+        main_count = index.main.count
+
+        files = _collection_files(index.folder)
+        added = updated = deleted = 0
+        for name, (segment, doc, _) in known.items():
+            if name not in files:
+                deleted += 1
+                if segment is index.main:
+                    removed.add(doc)
+                else:
+                    delta.remove_file(name)
+        for name, entry in files.items():
+            if name in known and not full:
+                continue
+            mtime = entry.stat().st_mtime
+            if name in known:
+                segment, doc, indexed_mtime = known[name]
+                if indexed_mtime == mtime:
+                    continue
+                if segment is index.main:
+                    removed.add(doc)
+                updated += delta.add_file(name, mtime)
+            else:
+                added += delta.add_file(name, mtime)
+
+        if len(delta.movies) + len(removed) > max(MERGE_MIN, main_count * MERGE_RATIO):
+            merged = IndexBuilder.from_index(index.main, removed)
+            merged.movies.update(delta.movies)
+            merged.write(path, folder_mtime)
+            if os.path.exists(delta_path(path)):
+                os.remove(delta_path(path))
+        else:
+            # Written even without changes, to record the folder time
+            delta.write(delta_path(path), folder_mtime, base=base, removed=sorted(removed))
+    return added, updated, deleted
+
+def _same_folder(path, folder):
+    with IndexSegment(path) as segment:
+        return segment.folder == os.path.abspath(folder)
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the scraped movie collection and query it.")
+    parser.add_argument('index', help="Path of the index file.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    update_parser = subparsers.add_parser('update', help="Build the index, or add the new and changed JSON files to it.")
+    update_parser.add_argument('folder', nargs='?', help="Collection folder. Defaults to the one of the index.")
+    query_parser = subparsers.add_parser('query', help="List the movies matching every criterion.")
+    query_parser.add_argument('--genre', action='append', default=[])
+    query_parser.add_argument('--director', action='append', default=[])
+    query_parser.add_argument('--cast', action='append', default=[])
+    query_parser.add_argument('--after', type=int, metavar='YEAR', help="Released in or after YEAR.")
+    query_parser.add_argument('--before', type=int, metavar='YEAR', help="Released in or before YEAR.")
+    query_parser.add_argument('--min-score', type=float, metavar='PERCENT')
+    query_parser.add_argument('--limit', type=int, default=None)
+    query_parser.add_argument('--no-update', action='store_true',
+                              help="Do not look for JSON files added to the folder since the index was written.")
+    args = parser.parse_args()
+
+    if args.command == 'update':
+        start = time.perf_counter()
+        added, updated, removed = update_index(args.index, args.folder)
+        with MovieIndex(args.index) as index:
+            count = index.count
+        print(f"{added} added, {updated} updated, {removed} removed: {count} movies indexed "
+              f"in {time.perf_counter() - start:.2f}s")
+        return
+
+    start = time.perf_counter()
+    if not args.no_update:
+        try:
+            added, updated, removed = update_index(args.index, full=False)
+        except OSError as e:
+            print(f"Could not update the index: {e}")
+        else:
+            if added or removed:
+                print(f"Index updated: {added} added, {removed} removed")
+    with MovieIndex(args.index) as index:
+        docs = index.query(args.genre, args.director, args.cast, args.after, args.before, args.min_score, args.limit)
+        for segment, doc in docs:
+            title_key, name, year, score = segment.movie(doc)
+            score = f"{score:.1f}%" if not math.isnan(score) else ''
+            print(f"{title_key:<40} {name} ({year or '?'}) {score}")
+    print(f"{len(docs)} movies in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+from bs4 import BeautifulSoup
+
+# BeautifulSoup tree builders, fastest first
+BACKENDS = ['lxml', 'html.parser']
+
+def available_backends():
+    """
+    Lists the parser backends that can be used in this environment
+
+    Returns:
+        list: Backend names, fastest first
+    """
+    backends = []
+    for backend in BACKENDS:
+        if backend == 'lxml':
+            try:
+                import lxml  # noqa: F401
+            except ImportError:
+                continue
+        backends.append(backend)
+    return backends
+
+def default_backend():
+    """
+    Returns the fastest parser backend that is installed
+    """
+    return available_backends()[0]
+
+def make_soup(content, backend=None, parse_only=None):
+    """
+    Parses an HTML document with the selected backend
+
+    Args:
+        content (bytes or str): The HTML document
+        backend (str): One of BACKENDS, or None for the fastest installed one
+        parse_only (SoupStrainer): Optional strainer restricting the built tree
+
+    Returns:
+        BeautifulSoup: The parsed document
+
+    Raises:
+        ValueError: When the backend is unknown or not installed
+    """
+    if backend is None:
+        backend = default_backend()
+    elif backend not in available_backends():
+        raise ValueError(f"Parser backend '{backend}' is not available (choose from: {', '.join(available_backends())})")
+    return BeautifulSoup(content, backend, parse_only=parse_only)
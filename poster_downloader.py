@@ -0,0 +1,211 @@
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+
+import requests
+
+from scrape_metrics import metrics
+
+MANIFEST_NAME = '.downloads.json'
+
+class PosterDownloader:
+    """
+    Streaming, resumable and deduplicating image downloader
+
+    Every finished download is recorded in a manifest kept in the download
+    folder (URL -> file name, size, validators and SHA-256), which drives:
+
+    - skipping: a known URL is fetched with If-None-Match / If-Modified-Since
+      and a 304 leaves the local file untouched; an unknown URL, or a known
+      one recorded without ETag and Last-Modified, whose local file already
+      has the announced Content-Length is kept without reading the body (a
+      same-size change of such an image is not noticed)
+    - resuming: bytes are streamed to <name>.part and renamed atomically when
+      complete; an interrupted transfer is continued with a Range request
+      (guarded by If-Range) on the next run
+    - deduplication: a download whose content hash matches another file is
+      replaced by a hard link to that file
+    """
+
+    def __init__(self, folder, session=None, chunk_size=64 * 1024, save_every=50):
+        self.folder = folder
+        self.session = session if session is not None else requests.Session()
+        self.chunk_size = chunk_size
+        self.save_every = save_every
+        self.stats = {'downloaded': 0, 'skipped': 0, 'resumed': 0, 'deduplicated': 0, 'bytes': 0}
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._manifest_path = os.path.join(folder, MANIFEST_NAME)
+        self._manifest = {'files': {}, 'partial': {}}
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                self._manifest = json.load(f)
+        # Content hash -> file name, for deduplication
+        self._by_hash = {entry['sha256']: entry['file'] for entry in self._manifest['files'].values()}
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    def _hash_file(self, path, sha=None):
+        sha = sha if sha is not None else hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        return sha
+
+    def _record(self, url, entry):
+        with self._lock:
+            previous = self._manifest['files'].get(url)
+            self._manifest['files'][url] = entry
+            self._manifest['partial'].pop(url, None)
+            # The file of a changed image no longer holds its old content
+            if previous and previous['sha256'] != entry['sha256'] and \
+                    self._by_hash.get(previous['sha256']) == previous['file']:
+                del self._by_hash[previous['sha256']]
+            self._by_hash[entry['sha256']] = entry['file']
+            self._dirty += 1
+            if self._dirty >= self.save_every:
+                self._save_locked()
+
+    def _save_locked(self):
+        tmp_path = self._manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp_path, self._manifest_path)
+        self._dirty = 0
+
+    def save(self):
+        """
+        Writes the manifest to disk
+        """
+        with self._lock:
+            self._save_locked()
+
+    def _count(self, stat, amount=1):
+        with self._lock:
+            self.stats[stat] += amount
+
+    def known_file(self, url):
+        """
+        Returns the file name of a finished download of url, None when there is none on disk
+        """
+        known = self._manifest['files'].get(url)
+        if known and os.path.exists(self._path(known['file'])):
+            return known['file']
+        return None
+
+    def download(self, url, basename, headers=None):
+        """
+        Downloads url into the folder as basename plus the extension of its Content-Type
+
+        Args:
+            url (str): The image URL
+            basename (str): File name without extension
+            headers (dict): Extra request headers
+
+        Returns:
+            str: The file name, relative to the folder
+
+        Raises:
+            requests.RequestException: When the download fails; a partial
+                                       file is kept to be resumed later
+        """
+        request_headers = dict(headers or {})
+        known = self._manifest['files'].get(url)
+        if known and not os.path.exists(self._path(known['file'])):
+            known = None
+        partial = self._manifest['partial'].get(url)
+        part_path = self._path(basename + '.part')
+        offset = os.path.getsize(part_path) if partial and os.path.exists(part_path) else 0
+
+        if known:
+            if known.get('etag'):
+                request_headers['If-None-Match'] = known['etag']
+            if known.get('last_modified'):
+                request_headers['If-Modified-Since'] = known['last_modified']
+        elif offset:
+            request_headers['Range'] = f"bytes={offset}-"
+            if partial.get('etag') or partial.get('last_modified'):
+                request_headers['If-Range'] = partial.get('etag') or partial.get('last_modified')
+
+        response = self.session.get(url, headers=request_headers, stream=True)
+        try:
+            if response.status_code == 304 and known:
+                self._count('skipped')
+                return known['file']
+            response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
+
+            # Determine the file extension from the Content-Type header
+            content_type = response.headers.get('Content-Type')
+            extension = (mimetypes.guess_extension(content_type.split(';')[0].strip()) if content_type else None) or ''
+            name = basename + extension
+            validators = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+            # Unknown URL, or known one that cannot be revalidated, but the file is
+            # already on disk with the announced size
+            length = response.headers.get('Content-Length')
+            unvalidated = known and not (known.get('etag') or known.get('last_modified'))
+            if (response.status_code == 200 and length and (not known or unvalidated) and
+                os.path.exists(self._path(name)) and os.path.getsize(self._path(name)) == int(length)):
+                if known and known['file'] == name and known['size'] == int(length):
+                    digest = known['sha256']
+                else:
+                    digest = self._hash_file(self._path(name)).hexdigest()
+                self._record(url, dict(validators, file=name, size=int(length), sha256=digest))
+                self._count('skipped')
+                return name
+
+            sha = hashlib.sha256()
+            if response.status_code == 206 and offset:
+                self._hash_file(part_path, sha)
+                mode = 'ab'
+                self._count('resumed')
+            else:
+                offset = 0
+                mode = 'wb'
+
+            with self._lock:
+                self._manifest['partial'][url] = validators
+            received = 0
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+                    sha.update(chunk)
+                    received += len(chunk)
+                    self._count('bytes', len(chunk))
+            metrics.count('bytes_in_total', received, kind='poster')
+            metrics.count('bytes_out_total', received, kind='poster')
+        finally:
+            response.close()
+
+        digest = sha.hexdigest()
+        size = os.path.getsize(part_path)
+        os.replace(part_path, self._path(name))
+        self._count('downloaded')
+
+        # Identical image already stored under another name: keep one copy,
+        # unless that file was deleted or rewritten since it was recorded
+        with self._lock:
+            twin = self._by_hash.get(digest)
+        if (twin and twin != name and os.path.exists(self._path(twin)) and
+                os.path.getsize(self._path(twin)) == size):
+            link_path = self._path(name + '.link')
+            try:
+                os.link(self._path(twin), link_path)
+                os.replace(link_path, self._path(name))
+                self._count('deduplicated')
+            except OSError:
+                pass
+
+        self._record(url, dict(validators, file=name, size=size, sha256=digest))
+        return name
+
+    def summary(self):
+        """
+        Returns a one-line summary of the transfers
+        """
+        s = self.stats
+        return (f"posters: {s['downloaded']} downloaded ({s['resumed']} resumed, {s['deduplicated']} deduplicated), "
+                f"{s['skipped']} unchanged, {s['bytes'] / 1048576:.1f} MB transferred")
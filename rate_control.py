@@ -0,0 +1,231 @@
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from scrape_metrics import metrics
+
+# Statuses retried after a pause; they also mean the host is overloaded, so its limit is cut
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def parse_retry_after(value, now=None):
+    """
+    Returns the seconds to wait given by a Retry-After header (delay in seconds or HTTP date), None if absent or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    now = now if now is not None else time.time()
+    return max(when.timestamp() - now, 0.0)
+
+class HostState:
+    """
+    Concurrency limit and counters of one host
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.lowest = limit
+        self.highest = limit
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.last_cut = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.retries = 0
+        self.waited = 0.0
+
+class RequestController:
+    """
+    Paces the requests of every host: adaptive concurrency, Retry-After and retries
+
+    Each host has a concurrency limit that starts at initial requests in
+    flight. Every successful response raises it by 1/limit, i.e. by one
+    request per round of limit responses, up to max_per_host; a 429 or 5xx
+    response halves it, down to one. Only responses to requests sent after
+    the previous cut move it again: a burst of errors from one round counts
+    once, and the requests sent at the old rate do not raise it back. A
+    Retry-After header holds back every request to the host until it has
+    passed.
+
+    Throttled responses and connection errors are retried up to retries
+    times, after Retry-After or else a random pause of up to
+    backoff * 2^attempt seconds (capped at max_backoff). The limit is a
+    float; int(limit) requests are let through at a time.
+    """
+
+    def __init__(self, max_per_host=4, initial=1, retries=4, backoff=0.5, max_backoff=30.0, max_retry_after=300.0):
+        self.max_per_host = max_per_host
+        self.initial = min(initial, max_per_host)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self._cond = threading.Condition()
+        self._hosts = {}
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = HostState(float(self.initial))
+        return state
+
+    def acquire(self, host):
+        """
+        Blocks until the host takes one more request in flight
+
+        Returns:
+            float: The send time, to be passed to release
+        """
+        start = time.monotonic()
+        with self._cond:
+            state = self._host(host)
+            while True:
+                now = time.monotonic()
+                if now < state.blocked_until:
+                    self._cond.wait(state.blocked_until - now)
+                elif state.in_flight >= int(state.limit):
+                    self._cond.wait()
+                else:
+                    break
+            state.in_flight += 1
+            state.requests += 1
+            now = time.monotonic()
+            state.waited += now - start
+        if now - start > 0.001:
+            metrics.observe('stage_seconds', now - start, stage='rate_wait')
+        return now
+
+    def release(self, host, sent, result, retry_after=None):
+        """
+        Ends a request and adapts the limit of its host
+
+        Args:
+            host (str): The host name
+            sent (float): Send time returned by acquire
+            result (str): 'ok', 'throttled' (429 or 5xx response) or 'error' (no response)
+            retry_after (float): Seconds asked by the Retry-After header, if any
+        """
+        metrics.count('http_requests_total', result=result)
+        with self._cond:
+            state = self._host(host)
+            state.in_flight -= 1
+            now = time.monotonic()
+            if result == 'ok':
+                if sent >= state.last_cut:
+                    state.limit = min(state.limit + 1 / state.limit, float(self.max_per_host))
+            elif result == 'throttled':
+                state.throttled += 1
+                if sent >= state.last_cut:
+                    state.limit = max(state.limit / 2, 1.0)
+                    state.last_cut = now
+            else:
+                state.errors += 1
+            if retry_after:
+                state.blocked_until = max(state.blocked_until, now + min(retry_after, self.max_retry_after))
+            state.lowest = min(state.lowest, state.limit)
+            state.highest = max(state.highest, state.limit)
+            self._cond.notify_all()
+
+    def retry_delay(self, host, attempt, retry_after=None):
+        """
+        Returns the seconds to sleep before retry number attempt (from 0), or None to give up
+        """
+        if attempt >= self.retries or (retry_after or 0) > self.max_retry_after:
+            return None
+        with self._cond:
+            self._host(host).retries += 1
+        if retry_after is not None:
+            # acquire holds the request back until the host is unblocked
+            return 0.0
+        return random.uniform(0, min(self.backoff * 2 ** attempt, self.max_backoff))
+
+    def limit(self, host):
+        """
+        Returns the current concurrency limit of a host
+        """
+        with self._cond:
+            return self._host(host).limit
+
+    def summary(self):
+        with self._cond:
+            hosts = sorted(self._hosts.items())
+        lines = ["rate control:" if hosts else "rate control: no requests sent"]
+        for host, state in hosts:
+            lines.append(f"  {host}: limit {state.limit:.1f} (lowest {state.lowest:.1f}, highest {state.highest:.1f}), "
+                         f"{state.requests} requests, {state.throttled} throttled, {state.errors} errors, "
+                         f"{state.retries} retries, {state.waited:.1f}s held back")
+        return '\n'.join(lines)
+
+class ControlledSession:
+    """
+    Session wrapper sending every request through a RequestController
+
+    A request is in flight until its response headers arrive: the body of
+    a streamed response is read after the slot has been given back.
+    Responses still throttled after the last retry are returned as they
+    are, for the caller's raise_for_status; connection errors are raised.
+    Wrap the network session, below the archive and the HTTP cache.
+    """
+
+    def __init__(self, session, controller):
+        self.session = session
+        self.controller = controller
+
+    def get(self, url, headers=None, **kwargs):
+        host = urlsplit(url).hostname or ''
+        attempt = 0
+        while True:
+            sent = self.controller.acquire(host)
+            try:
+                response = self.session.get(url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.controller.release(host, sent, 'error')
+                delay = self.controller.retry_delay(host, attempt)
+                if delay is None:
+                    raise
+                reason = type(e).__name__
+            except BaseException:
+                # Any other failure (redirect loop, invalid URL, interrupt) is not
+                # retried, but the slot is given back so the host does not stall
+                self.controller.release(host, sent, 'error')
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.controller.release(host, sent, 'ok')
+                    return response
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                self.controller.release(host, sent, 'throttled', retry_after)
+                delay = self.controller.retry_delay(host, attempt, retry_after)
+                if delay is None:
+                    return response
+                response.close()
+                reason = str(response.status_code)
+            metrics.count('http_retries_total', reason=reason)
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+def find_controller(session):
+    """
+    Returns the RequestController under a chain of session wrappers (HTTP cache, archive), or None
+    """
+    while session is not None:
+        if isinstance(session, ControlledSession):
+            return session.controller
+        session = getattr(session, 'session', None)
+    return None
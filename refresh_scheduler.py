@@ -0,0 +1,285 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+from movie_catalog import MovieCatalog, url_key
+from movie_index import parse_year, read_movie_file
+from rate_control import RequestController
+from tmdb_scraper import DOWNLOAD_FOLDER, make_session, run_batch
+
+STATE_NAME = '.refresh.json'
+
+DAY = 86400
+
+# Refresh interval bounds in days, by age of the release in years:
+# (age below, shortest, longest); None is any age
+TIERS = [
+    (1, 1, 7),
+    (3, 3, 30),
+    (10, 7, 90),
+    (None, 30, 365),
+]
+
+# Record fields whose changes are tracked; img only while it holds the poster URL
+TRACKED = ('name', 'score', 'cast', 'author', 'theme', 'length', 'overview', 'tagline', 'img')
+
+# Interval buckets of the plan report, in days
+BUCKETS = (1, 7, 30, 90, 365)
+
+def tier_bounds(year, now=None):
+    """
+    Returns (shortest, longest) refresh interval in days of a movie released in year (0 for unknown)
+    """
+    if not year:
+        return TIERS[1][1:]
+    age = time.gmtime(now).tm_year - year
+    for below, shortest, longest in TIERS:
+        if below is None or age < below:
+            return shortest, longest
+
+def field_hashes(record):
+    """
+    Returns {field: short hash} of the tracked fields of a record
+    """
+    hashes = {}
+    for field in TRACKED:
+        value = record.get(field)
+        if field == 'img' and not (isinstance(value, str) and value.startswith(('http://', 'https://'))):
+            # A poster file name says nothing about the poster on TMDb
+            continue
+        hashes[field] = hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return hashes
+
+class RefreshScheduler:
+    """
+    Per-movie refresh intervals learned from the change history of each field
+
+    Every movie starts at the shortest interval of its age tier (recent
+    releases are checked daily, old ones monthly). Each refresh compares
+    the tracked fields with the previous version: a change halves the
+    interval, no change doubles it, within the bounds of the tier. Movies
+    whose score or cast keep moving are therefore checked often, stable old
+    titles rarely. Due movies are refreshed most overdue first, within a
+    request budget per run.
+
+    The state is kept in .refresh.json in the collection folder. JSON files
+    written since the last run (e.g. by tmdb_scraper.py) count as a refresh
+    of their movie.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, STATE_NAME)
+        self.movies = {}  # url key -> state
+        self.synced_at = 0.0
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.movies = state['movies']
+            self.synced_at = state['synced_at']
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'synced_at': self.synced_at, 'movies': self.movies}, f)
+        os.replace(tmp_path, self.path)
+
+    def observe(self, record, fetched_at):
+        """
+        Records a fetch of a movie and adapts its interval to what changed
+
+        Args:
+            record (dict): The record of a saved JSON file or of scrape_movie_data
+            fetched_at (float): Time of the fetch
+
+        Returns:
+            list: The tracked fields that changed since the previous fetch
+        """
+        key = url_key(record['url'])
+        year = parse_year(record.get('year'))
+        hashes = field_hashes(record)
+        shortest, longest = tier_bounds(year, fetched_at)
+        with self._lock:
+            movie = self.movies.get(key)
+            if movie is None:
+                self.movies[key] = {'url': record['url'], 'year': year, 'fetched_at': fetched_at,
+                                    'interval': shortest, 'checks': 1, 'failures': 0, 'hashes': hashes,
+                                    'changes': {}}
+                return []
+            old = movie['hashes']
+            changed = [field for field in hashes if field in old and old[field] != hashes[field]]
+            for field in changed:
+                count, _ = movie['changes'].get(field, (0, None))
+                movie['changes'][field] = [count + 1, fetched_at]
+            interval = movie['interval'] / 2 if changed else movie['interval'] * 2
+            movie.update(year=year, fetched_at=fetched_at, interval=min(max(interval, shortest), longest),
+                         checks=movie['checks'] + 1, failures=0, hashes=dict(old, **hashes))
+            return changed
+
+    def failed(self, key, now):
+        """
+        Records a failed refresh: the movie backs off like an unchanged one
+        """
+        with self._lock:
+            movie = self.movies[key]
+            _, longest = tier_bounds(movie['year'], now)
+            movie.update(fetched_at=now, interval=min(movie['interval'] * 2, longest),
+                         failures=movie['failures'] + 1)
+
+    def sync(self):
+        """
+        Reads the JSON files written since the last sync, adding new movies and counting rewrites as fetches
+
+        Returns:
+            int: Number of files read
+        """
+        read = 0
+        newest = self.synced_at
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.name.endswith('.json') or not entry.is_file():
+                    continue
+                mtime = entry.stat().st_mtime
+                if mtime <= self.synced_at:
+                    continue
+                newest = max(newest, mtime)
+                movie = read_movie_file(entry.path)
+                if movie is None or not movie[1].get('url'):
+                    continue
+                self.observe(movie[1], mtime)
+                read += 1
+        self.synced_at = newest
+        return read
+
+    def due(self, now=None):
+        """
+        Returns the states of the movies due for a refresh, most overdue (relative to their interval) first
+        """
+        now = now if now is not None else time.time()
+        due = [movie for movie in self.movies.values() if now >= movie['fetched_at'] + movie['interval'] * DAY]
+        return sorted(due, key=lambda movie: (movie['fetched_at'] - now) / movie['interval'])
+
+    def plan(self, now=None):
+        """
+        Returns the report of the intervals, the due movies and the daily cost of keeping the collection fresh
+        """
+        now = now if now is not None else time.time()
+        buckets = [0] * (len(BUCKETS) + 1)
+        per_day = 0.0
+        for movie in self.movies.values():
+            position = next((i for i, days in enumerate(BUCKETS) if movie['interval'] <= days), len(BUCKETS))
+            buckets[position] += 1
+            per_day += 1 / movie['interval']
+        total = len(self.movies)
+        lines = [f"{total} movies, {len(self.due(now))} due now"]
+        for i, count in enumerate(buckets):
+            label = f"<= {BUCKETS[i]:>3} days" if i < len(BUCKETS) else f" > {BUCKETS[-1]:>3} days"
+            lines.append(f"  {label}  {count:>8}")
+        changes = {}
+        for movie in self.movies.values():
+            for field, (count, _) in movie['changes'].items():
+                changes[field] = changes.get(field, 0) + count
+        if changes:
+            lines.append("changes seen: " + ", ".join(f"{field} {count}"
+                                                      for field, count in sorted(changes.items(), key=lambda c: -c[1])))
+        if total:
+            lines.append(f"about {per_day:.1f} requests per day, {per_day * 100 / total:.1f}% of re-scraping every movie daily")
+        return '\n'.join(lines)
+
+def run_refresh(folder, budget=500, workers=8, per_host=4, session=None, catalog=None, dry_run=False):
+    """
+    Refreshes the due movies of a collection, at most budget page requests
+
+    Args:
+        folder (str): The collection folder
+        budget (int): Maximum number of movies refreshed
+        workers (int): Size of the worker pool
+        per_host (int): Maximum concurrent requests against a single host
+        session (requests.Session or HttpCache): Shared session, None for a new pooled one
+        catalog (MovieCatalog): Optional catalog receiving every record
+        dry_run (bool): Only list the movies that would be refreshed
+
+    Returns:
+        tuple: (number of movies refreshed, number changed, number failed)
+    """
+    scheduler = RefreshScheduler(folder)
+    read = scheduler.sync()
+    if read:
+        print(f"{read} new or rewritten JSON files read")
+    now = time.time()
+    due = scheduler.due(now)
+    batch = due[:budget]
+    print(f"{len(due)} of {len(scheduler.movies)} movies due, refreshing {len(batch)}")
+    if dry_run:
+        for movie in batch:
+            print(f"  {movie['interval']:>6.1f} days  {movie['url']}")
+        scheduler.save()
+        return 0, 0, 0
+
+    changed = {}
+
+    def on_record(url, movie_data):
+        record = next(iter(movie_data.values()))
+        changed[url] = scheduler.observe(record, time.time())
+
+    urls = [movie['url'] for movie in batch]
+    saved, failed = run_batch(urls, folder, workers=workers, per_host=per_host, session=session,
+                              catalog=catalog, refresh=True, quiet=True, on_record=on_record)
+    for url in failed:
+        if url not in changed:
+            scheduler.failed(url_key(url), time.time())
+    # The files just written were observed from the records already
+    scheduler.synced_at = time.time()
+    scheduler.save()
+
+    fields = {}
+    for url, fields_changed in changed.items():
+        for field in fields_changed:
+            fields[field] = fields.get(field, 0) + 1
+    count = sum(1 for fields_changed in changed.values() if fields_changed)
+    print(f"Refreshed {len(changed)} movies: {count} changed"
+          + (" (" + ", ".join(f"{field} {n}" for field, n in sorted(fields.items())) + ")" if fields else ""))
+    return len(changed), count, len(urls) - len(changed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the movie collection fresh by refreshing the movies that change.")
+    parser.add_argument('folder', nargs='?', default=DOWNLOAD_FOLDER, help="The collection folder.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('plan', help="Show the refresh intervals and what keeping the collection fresh costs.")
+    run_parser = subparsers.add_parser('run', help="Refresh the due movies within the request budget.")
+    run_parser.add_argument('--budget', type=int, default=500,
+                            help="Maximum number of movie pages requested in this run.")
+    run_parser.add_argument('--workers', type=int, default=8,
+                            help="Number of concurrent workers.")
+    run_parser.add_argument('--per-host', type=int, default=4,
+                            help="Maximum concurrent requests against a single host.")
+    run_parser.add_argument('--catalog', metavar='DB',
+                            help="SQLite catalog receiving the refreshed records.")
+    run_parser.add_argument('--dry-run', action='store_true',
+                            help="Only list the movies that would be refreshed.")
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        scheduler = RefreshScheduler(args.folder)
+        read = scheduler.sync()
+        scheduler.save()
+        if read:
+            print(f"{read} new or rewritten JSON files read")
+        print(scheduler.plan())
+        return
+
+    catalog = MovieCatalog(args.catalog) if args.catalog else None
+    session = make_session(pool_size=args.workers, controller=RequestController(args.per_host))
+    try:
+        run_refresh(args.folder, args.budget, args.workers, args.per_host, session, catalog, args.dry_run)
+    finally:
+        session.close()
+        if catalog is not None:
+            catalog.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import gzip
+import json
+import os
+import struct
+import threading
+import time
+
+import requests
+
+from http_cache import KEPT_HEADERS, CachedResponse, normalize_url, redact_url
+
+INDEX_NAME = 'index.jsonl'
+
+# Record header in a segment: metadata length, stored body length
+RECORD_HEADER = struct.Struct('<IQ')
+
+class ResponseArchive:
+    """
+    Append-only, compressed store of every fetched response
+
+    Responses are appended gzip-compressed to numbered segment files, each
+    record holding its metadata (URL, status, kept headers, fetch time)
+    ahead of the body, and are indexed by one line of index.jsonl. A
+    record is never rewritten: fetching a URL again appends a new version
+    and the index keeps the fetch time of each, so replays can pick the
+    latest. When the segments exceed max_bytes the oldest segments are
+    deleted whole. A lost index is rebuilt by scanning the segments.
+    """
+
+    def __init__(self, folder, max_bytes=4096 * 1024 * 1024, segment_bytes=64 * 1024 * 1024):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.appended = 0
+        self.appended_bytes = 0
+        self._lock = threading.Lock()
+        self._entries = []
+        self._sizes = {}  # segment number -> bytes
+        self._segment = None
+        self._index = None
+        os.makedirs(folder, exist_ok=True)
+        self._load()
+
+    def _segment_path(self, number):
+        return os.path.join(self.folder, f"{number:06d}.seg")
+
+    def _load(self):
+        for name in os.listdir(self.folder):
+            if name.endswith('.seg') and name[:-4].isdigit():
+                self._sizes[int(name[:-4])] = os.path.getsize(os.path.join(self.folder, name))
+        index_path = os.path.join(self.folder, INDEX_NAME)
+        if not os.path.exists(index_path):
+            for number in sorted(self._sizes):
+                self._entries.extend(scan_segment(self.folder, number))
+            self._rewrite_index()
+            return
+        with open(index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Line cut short by an interrupted run
+                    continue
+                if entry['segment'] in self._sizes:
+                    self._entries.append(entry)
+
+    def _rewrite_index(self):
+        index_path = os.path.join(self.folder, INDEX_NAME)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self._entries:
+                f.write(json.dumps(entry) + '\n')
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        os.replace(tmp_path, index_path)
+
+    def _open_segment(self):
+        # Current segment, a new one once it is full
+        number = max(self._sizes) if self._sizes else 1
+        if self._sizes.get(number, 0) >= self.segment_bytes:
+            number += 1
+        if self._segment is None or self._segment[0] != number:
+            if self._segment is not None:
+                self._segment[1].close()
+            self._segment = (number, open(self._segment_path(number), 'ab'))
+            self._sizes.setdefault(number, 0)
+        return self._segment
+
+    def _evict(self):
+        dropped = []
+        while sum(self._sizes.values()) > self.max_bytes and len(self._sizes) > 1:
+            number = min(self._sizes)
+            del self._sizes[number]
+            dropped.append(number)
+            try:
+                os.remove(self._segment_path(number))
+            except OSError:
+                pass
+        if dropped:
+            self._entries = [entry for entry in self._entries if entry['segment'] in self._sizes]
+            self._rewrite_index()
+
+    def append(self, url, response):
+        """
+        Archives a response
+
+        Args:
+            url (str): The requested URL, stored without its SECRET_PARAMS
+            response (requests.Response): The response, read in full
+        """
+        meta = {'url': redact_url(url), 'status': response.status_code,
+                'headers': {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+                'fetched_at': time.time()}
+        body = gzip.compress(response.content, compresslevel=6)
+        meta_bytes = json.dumps(meta).encode('utf-8')
+        with self._lock:
+            number, f = self._open_segment()
+            offset = self._sizes[number] + RECORD_HEADER.size + len(meta_bytes)
+            f.write(RECORD_HEADER.pack(len(meta_bytes), len(body)) + meta_bytes + body)
+            f.flush()
+            self._sizes[number] = offset + len(body)
+            entry = dict(meta, segment=number, offset=offset, length=len(body))
+            self._entries.append(entry)
+            # The index line goes after the record, so it never points to missing bytes
+            if self._index is None:
+                self._index = open(os.path.join(self.folder, INDEX_NAME), 'a', encoding='utf-8')
+            self._index.write(json.dumps(entry) + '\n')
+            self._index.flush()
+            self.appended += 1
+            self.appended_bytes += RECORD_HEADER.size + len(meta_bytes) + len(body)
+            self._evict()
+
+    def latest(self):
+        """
+        Returns the index entry of the latest fetch of every archived URL, oldest first
+        """
+        with self._lock:
+            entries = list(self._entries)
+        by_url = {}
+        for entry in entries:
+            key = normalize_url(entry['url'])
+            if key not in by_url or entry['fetched_at'] >= by_url[key]['fetched_at']:
+                by_url[key] = entry
+        return sorted(by_url.values(), key=lambda entry: entry['fetched_at'])
+
+    def stats(self):
+        """
+        Returns a one-line summary of the archive
+        """
+        with self._lock:
+            total = sum(self._sizes.values())
+            return (f"archive: {self.appended} responses appended ({self.appended_bytes / 1048576:.1f} MB), "
+                    f"{len(self._entries)} archived in {len(self._sizes)} segments, {total / 1048576:.1f} MB on disk")
+
+    def close(self):
+        with self._lock:
+            if self._segment is not None:
+                self._segment[1].close()
+                self._segment = None
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+
+def scan_segment(folder, number):
+    """
+    Reads the index entries back from the records of a segment
+
+    Args:
+        folder (str): The archive folder
+        number (int): Segment number
+
+    Returns:
+        list: Index entries of the complete records, a truncated last one is skipped
+    """
+    entries = []
+    with open(os.path.join(folder, f"{number:06d}.seg"), 'rb') as f:
+        data = f.read()
+    position = 0
+    while position + RECORD_HEADER.size <= len(data):
+        meta_length, body_length = RECORD_HEADER.unpack_from(data, position)
+        offset = position + RECORD_HEADER.size + meta_length
+        if offset + body_length > len(data):
+            break
+        meta = json.loads(data[position + RECORD_HEADER.size:offset])
+        entries.append(dict(meta, segment=number, offset=offset, length=body_length))
+        position = offset + body_length
+    return entries
+
+def read_entry(folder, entry):
+    """
+    Returns the decompressed body of an archived response
+
+    Args:
+        folder (str): The archive folder
+        entry (dict): Index entry, as returned by ResponseArchive.latest
+    """
+    with open(os.path.join(folder, f"{entry['segment']:06d}.seg"), 'rb') as f:
+        f.seek(entry['offset'])
+        return gzip.decompress(f.read(entry['length']))
+
+class ArchivingSession:
+    """
+    Session wrapper appending every complete successful response to the archive
+
+    Streamed responses (images, --stream pages) are passed through without
+    being archived, since their body is read by the caller. Wrap the network
+    session, not the HTTP cache, so cache hits are not archived again.
+    """
+
+    def __init__(self, session, archive):
+        self.session = session
+        self.archive = archive
+
+    def get(self, url, headers=None, **kwargs):
+        response = self.session.get(url, headers=headers, **kwargs)
+        if not kwargs.get('stream') and 200 <= response.status_code < 300:
+            self.archive.append(url, response)
+        return response
+
+    def close(self):
+        self.session.close()
+
+class ReplaySession:
+    """
+    Session serving archived responses only, for re-extraction without the network
+
+    Args:
+        folder (str): The archive folder
+        entries (list): Index entries that can be served
+    """
+
+    def __init__(self, folder, entries):
+        self.folder = folder
+        self.entries = {normalize_url(entry['url']): entry for entry in entries}
+
+    def get(self, url, headers=None, **kwargs):
+        entry = self.entries.get(normalize_url(url))
+        if entry is None:
+            raise requests.ConnectionError(f"{url} is not in the archive")
+        return CachedResponse(url, entry['status'], entry['headers'], read_entry(self.folder, entry), from_cache=True)
+
+    def close(self):
+        pass
@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = 'scraper'
+
+HELP = {
+    'stage_seconds': "Time spent per scraping stage",
+    'field_seconds': "Time spent extracting each movie field",
+    'fallback_method_total': "Movies whose directors or cast came from each fallback method (0 for none)",
+    'fallback_checks_total': "Consistency checks of the skipped fallback methods, by result",
+    'bytes_in_total': "Bytes received, by kind",
+    'bytes_out_total': "Bytes written to disk, by kind",
+    'movies_total': "Movies processed, by result",
+    'queue_depth': "Sampled number of items waiting in each pipeline queue",
+    'rss_megabytes': "Resident set size sampled before taking each page in memory-bounded runs",
+    'http_requests_total': "Requests sent through the rate controller, by result",
+    'http_retries_total': "Requests retried, by status code or connection error",
+}
+
+class Laps:
+    """
+    Records the time elapsed since the previous lap under a label value
+    """
+
+    def __init__(self, metrics, name, label):
+        self.metrics = metrics
+        self.name = name
+        self.label = label
+        self.last = time.perf_counter()
+
+    def __call__(self, value):
+        now = time.perf_counter()
+        self.metrics.observe(self.name, now - self.last, **{self.label: value})
+        self.last = now
+
+class Metrics:
+    """
+    Thread-safe timers and counters of a scraping run
+
+    Timers keep count, sum and max of their observations, counters a total;
+    both are keyed by name plus labels. The run can be written as JSON or in
+    the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+
+    def reset(self):
+        with self._lock:
+            self.timers = {}
+            self.counters = {}
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            timer = self.timers.get(key)
+            if timer is None:
+                self.timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def laps(self, name, label):
+        return Laps(self, name, label)
+
+    def count(self, name, amount=1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def merge(self, data):
+        """
+        Adds metrics collected elsewhere, e.g. in a worker process, given as to_dict() output
+        """
+        with self._lock:
+            for timer in data['timers']:
+                key = (timer['name'], tuple(sorted(timer['labels'].items())))
+                mine = self.timers.get(key)
+                if mine is None:
+                    self.timers[key] = [timer['count'], timer['sum'], timer['max']]
+                else:
+                    mine[0] += timer['count']
+                    mine[1] += timer['sum']
+                    mine[2] = max(mine[2], timer['max'])
+            for counter in data['counters']:
+                key = (counter['name'], tuple(sorted(counter['labels'].items())))
+                self.counters[key] = self.counters.get(key, 0) + counter['value']
+
+    def to_dict(self):
+        """
+        Returns {'timers': [...], 'counters': [...]} with one entry per name and label set
+        """
+        with self._lock:
+            timers = [{'name': name, 'labels': dict(labels), 'count': count, 'sum': round(total, 6),
+                       'max': round(peak, 6)} for (name, labels), (count, total, peak) in sorted(self.timers.items())]
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+        return {'timers': timers, 'counters': counters}
+
+    def to_prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format
+        """
+        data = self.to_dict()
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {PREFIX}_{name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+        def labels(values):
+            if not values:
+                return ''
+            return '{' + ','.join(f'{k}="{str(v)}"' for k, v in values.items()) + '}'
+
+        for timer in data['timers']:
+            describe(timer['name'], 'summary')
+            lines.append(f"{PREFIX}_{timer['name']}_sum{labels(timer['labels'])} {timer['sum']}")
+            lines.append(f"{PREFIX}_{timer['name']}_count{labels(timer['labels'])} {timer['count']}")
+        for counter in data['counters']:
+            describe(counter['name'], 'counter')
+            lines.append(f"{PREFIX}_{counter['name']}{labels(counter['labels'])} {counter['value']}")
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_prometheus(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+
+    def summary(self):
+        """
+        Returns a short human readable report of the stage timers
+        """
+        lines = ["stage timings:"]
+        for timer in self.to_dict()['timers']:
+            if timer['name'] == 'stage_seconds':
+                lines.append(f"  {timer['labels']['stage']:<10} {timer['count']:>6} x "
+                             f"{timer['sum'] * 1000 / timer['count']:>9.2f} ms (max {timer['max'] * 1000:.2f} ms)")
+        return '\n'.join(lines)
+
+# Metrics of the current process, shared by every scraper module
+metrics = Metrics()
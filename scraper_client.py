@@ -0,0 +1,107 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+import tempfile
+
+# Standard library only: the client has to start faster than the scrapers it stands in for
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"scraper-daemon-{os.getuid()}.sock")
+
+# Written by the daemon at start, readable by its user only; every request must carry it
+DEFAULT_TOKEN_FILE = os.path.join(os.path.expanduser('~'), '.scraper-daemon-token')
+TOKEN_HEADER = 'X-Scraper-Token'
+
+# Scripts run in-process when no daemon is listening
+SCRIPTS = {
+    'tmdb': 'tmdb_scraper.py',
+    'ai': 'ai_tool_scraper2.py',
+}
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over a Unix domain socket
+    """
+
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+def connect(socket_path=None, port=None):
+    if port:
+        return http.client.HTTPConnection('127.0.0.1', port)
+    return UnixHTTPConnection(socket_path or DEFAULT_SOCKET)
+
+def read_token(path=None):
+    """
+    Returns the token of the running daemon, None when it has not written one
+    """
+    try:
+        with open(path or DEFAULT_TOKEN_FILE, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def request(connection, method, path, payload=None, token=None):
+    """
+    Sends a JSON request to the daemon and returns the decoded JSON answer
+    """
+    body = json.dumps(payload).encode('utf-8') if payload is not None else None
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    if token:
+        headers[TOKEN_HEADER] = token
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    answer = json.loads(response.read().decode('utf-8'))
+    if response.status != 200:
+        sys.exit(f"Scraper daemon: {answer.get('error', response.status)}")
+    return answer
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run tmdb_scraper.py or ai_tool_scraper2.py through a running scraper_daemon.py.",
+        epilog="Arguments after the tool name are the usual ones of that script. "
+               "Without a daemon listening the script is run directly.")
+    endpoint = parser.add_mutually_exclusive_group()
+    endpoint.add_argument('--socket', default=None, help=f"Unix socket of the daemon (default {DEFAULT_SOCKET}).")
+    endpoint.add_argument('--port', type=int, default=None, help="Localhost port of a daemon started with --port.")
+    parser.add_argument('--token-file', default=None,
+                        help=f"Token file written by the daemon (default {DEFAULT_TOKEN_FILE}).")
+    parser.add_argument('tool', choices=list(SCRIPTS) + ['ping', 'shutdown'])
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    connection = connect(args.socket, args.port)
+    try:
+        # No token file: no daemon has been started
+        token = read_token(args.token_file)
+        if token is None:
+            raise FileNotFoundError(args.token_file or DEFAULT_TOKEN_FILE)
+        if args.tool == 'ping':
+            print(json.dumps(request(connection, 'GET', '/ping', token=token)))
+            return
+        if args.tool == 'shutdown':
+            request(connection, 'POST', '/shutdown', {}, token)
+            print("Daemon stopped")
+            return
+        result = request(connection, 'POST', '/run', {'tool': args.tool, 'argv': args.args, 'cwd': os.getcwd()}, token)
+    except (ConnectionRefusedError, FileNotFoundError):
+        if args.tool not in SCRIPTS:
+            sys.exit("No scraper daemon listening")
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), SCRIPTS[args.tool])
+        sys.stdout.flush()
+        os.execv(sys.executable, [sys.executable, script] + args.args)
+    finally:
+        connection.close()
+
+    sys.stdout.write(result['output'])
+    sys.exit(result['status'])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import argparse
+import contextlib
+import hmac
+import io
+import json
+import os
+import secrets
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import ai_tool_scraper2
+import tmdb_scraper
+from mirror_server import MirrorSession
+from parser_backend import make_soup
+from scrape_metrics import metrics
+from scraper_client import DEFAULT_SOCKET, DEFAULT_TOKEN_FILE, SCRIPTS, TOKEN_HEADER
+from selector_engine import get_engine
+from streaming_fetch import stream_stats
+
+TOOLS = {
+    'tmdb': tmdb_scraper.main,
+    'ai': ai_tool_scraper2.main,
+}
+
+class ScraperDaemon:
+    """
+    Runs scraper command lines inside one long-lived process
+
+    requests, bs4 and the parser backend are imported once, the selector
+    config is compiled once and every job reuses one keep-alive session, so
+    a job costs its fetch and parse only. Jobs run one at a time: each one
+    switches to the client's working directory and captures stdout and
+    stderr, which are process-wide. A batch job still uses its own workers.
+    """
+
+    def __init__(self, pool_size=10, session=None):
+        self.session = session if session is not None else tmdb_scraper.make_session(pool_size=pool_size)
+        self.jobs = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+        # Warm up the lazily built parts: the selector engine and the parser backend
+        get_engine()
+        make_soup('<p></p>')
+
+    def run(self, tool, argv, cwd):
+        """
+        Runs the main() of a tool with the given arguments
+
+        Returns:
+            tuple: (exit status, captured output)
+        """
+        output = io.StringIO()
+        status = 0
+        with self._lock:
+            self.jobs += 1
+            metrics.reset()
+            stream_stats.reset()
+            previous = os.getcwd()
+            program = sys.argv[0]
+            try:
+                os.chdir(cwd)
+                sys.argv[0] = SCRIPTS[tool]  # argparse names the program after it
+                with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                    TOOLS[tool](argv, session=self.session)
+            except SystemExit as e:
+                # argparse errors and explicit exits
+                if isinstance(e.code, str):
+                    output.write(e.code + '\n')
+                    status = 1
+                else:
+                    status = e.code or 0
+            except Exception:
+                output.write(traceback.format_exc())
+                status = 1
+            finally:
+                sys.argv[0] = program
+                os.chdir(previous)
+        return status, output.getvalue()
+
+    def close(self):
+        self.session.close()
+
+def write_token(path):
+    """
+    Writes a new random token to path, readable and writable by the current user only
+
+    Returns:
+        str: The token
+    """
+    token = secrets.token_hex(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        # An older file keeps its mode through O_CREAT
+        os.fchmod(f.fileno(), 0o600)
+        f.write(token)
+    return token
+
+def check_cwd(cwd):
+    """
+    Returns the reason a job directory is refused, None when it is an absolute directory of the daemon's user
+    """
+    if not isinstance(cwd, str) or not os.path.isabs(cwd):
+        return "cwd must be an absolute path"
+    try:
+        stat = os.stat(cwd)
+    except OSError:
+        return "cwd does not exist"
+    if not os.path.isdir(cwd):
+        return "cwd is not a directory"
+    if stat.st_uid != os.getuid():
+        return "cwd belongs to another user"
+    return None
+
+def make_handler(daemon, token):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, code, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _authorized(self):
+            # Every request carries the token of the token file: other local users and
+            # pages of a browser, which can reach 127.0.0.1 too, cannot read it
+            if not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), token):
+                self._reply(401, {'error': 'missing or wrong token'})
+                return False
+            return True
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            if self.path != '/ping':
+                self._reply(404, {'error': 'not found'})
+                return
+            self._reply(200, {'pid': os.getpid(), 'jobs': daemon.jobs, 'uptime': round(time.time() - daemon.started, 1)})
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            # Forms cannot send JSON: a cross-site form POST is refused whatever its body
+            if (self.headers.get('Content-Type') or '').split(';')[0].strip() != 'application/json':
+                self._reply(415, {'error': 'Content-Type must be application/json'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                # A negative length would read until the client closes the connection
+                self._reply(400, {'error': 'invalid Content-Length'})
+                return
+            try:
+                job = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._reply(400, {'error': 'invalid JSON'})
+                return
+            if self.path == '/shutdown':
+                self._reply(200, {'stopping': True})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+            if self.path != '/run':
+                self._reply(404, {'error': 'not found'})
+                return
+            if job.get('tool') not in TOOLS or not isinstance(job.get('argv', []), list):
+                self._reply(400, {'error': f"tool must be one of {', '.join(TOOLS)}"})
+                return
+            refused = check_cwd(job.get('cwd'))
+            if refused:
+                self._reply(400, {'error': refused})
+                return
+            status, output = daemon.run(job['tool'], job.get('argv', []), job['cwd'])
+            self._reply(200, {'status': status, 'output': output})
+
+    return Handler
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class LocalHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the scrapers loaded and run their jobs for scraper_client.py.")
+    endpoint = parser.add_mutually_exclusive_group()
+    endpoint.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket to listen on.")
+    endpoint.add_argument('--port', type=int, default=None, help="Listen on this localhost port instead of a Unix socket.")
+    parser.add_argument('--pool-size', type=int, default=10, help="Connections kept open per host.")
+    parser.add_argument('--token-file', default=DEFAULT_TOKEN_FILE,
+                        help="File receiving the token clients must send, readable by this user only.")
+    parser.add_argument('--mirror', metavar='BASE_URL',
+                        help="Send every request to a local mirror_server.py instead of the real sites.")
+    args = parser.parse_args()
+
+    daemon = ScraperDaemon(pool_size=args.pool_size, session=MirrorSession(args.mirror) if args.mirror else None)
+    token = write_token(args.token_file)
+    if args.port:
+        server = LocalHTTPServer(('127.0.0.1', args.port), make_handler(daemon, token))
+        where = f"http://127.0.0.1:{args.port}"
+    else:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        # The socket is created 0600, never reachable by other users even briefly
+        umask = os.umask(0o177)
+        try:
+            server = UnixHTTPServer(args.socket, make_handler(daemon, token))
+        finally:
+            os.umask(umask)
+        where = args.socket
+    print(f"Scraper daemon {os.getpid()} listening on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+        if not args.port and os.path.exists(args.socket):
+            os.remove(args.socket)
+        if os.path.exists(args.token_file):
+            os.remove(args.token_file)
+
+if __name__ == "__main__":
+    main()
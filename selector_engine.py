@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+
+import soupsieve
+
+CONFIG_NAME = 'ai-tool-scraper-config.json'
+
+# Selectors every domain must define
+REQUIRED_FIELDS = ['image_dom', 'prompt_dom']
+
+# Selectors a "more" block must define, as read by tmdb_extract.select_movie_fields
+# and tmdb_page.extract_details
+REQUIRED_MORE_FIELDS = ['title_dom', 'year_dom', 'score_dom', 'genre_dom', 'tagline_dom', 'runtime_dom',
+                        'overview_dom', 'crew_dom', 'crew_name_dom', 'crew_job_dom', 'cast_dom',
+                        'cast_name_dom', 'cast_character_dom', 'facts_dom', 'fact_label_dom']
+
+class SelectorEngine:
+    """
+    Validated ai-tool-scraper-config.json with every CSS selector precompiled
+
+    Selectors are compiled once with soupsieve and reused for every page, so
+    a long-running or batch process never parses a selector string twice.
+    Fields are addressed by their config name; the ones of the "more" block
+    are flattened next to image_dom and prompt_dom. A domain may also set
+    "concurrency", the number of pages fetched at once in batch mode.
+    """
+
+    def __init__(self, config, source=CONFIG_NAME):
+        self.source = source
+        self.config = config
+        self._compiled = {}
+        self._more = {}
+        self._concurrency = {}
+        self._validate_and_compile()
+
+    def _validate_and_compile(self):
+        if not isinstance(self.config, dict):
+            raise ValueError(f"{self.source}: top level must be an object mapping domains to selectors")
+        for domain, fields in self.config.items():
+            if not isinstance(fields, dict):
+                raise ValueError(f"{self.source}: '{domain}' must be an object")
+            for field in REQUIRED_FIELDS:
+                if field not in fields:
+                    raise ValueError(f"{self.source}: '{domain}' is missing '{field}'")
+            more = fields.get('more', {})
+            if not isinstance(more, dict):
+                raise ValueError(f"{self.source}: '{domain}.more' must be an object")
+            for field in REQUIRED_MORE_FIELDS if more else []:
+                if field not in more:
+                    raise ValueError(f"{self.source}: '{domain}.more' is missing '{field}'")
+            compiled = {}
+            concurrency = fields.get('concurrency')
+            if concurrency is not None:
+                if not isinstance(concurrency, int) or isinstance(concurrency, bool) or concurrency < 1:
+                    raise ValueError(f"{self.source}: '{domain}.concurrency' must be a positive integer")
+                self._concurrency[domain] = concurrency
+            for field, selector in list(fields.items()) + list(more.items()):
+                if field in ('more', 'concurrency'):
+                    continue
+                if not isinstance(selector, str):
+                    raise ValueError(f"{self.source}: '{domain}.{field}' must be a CSS selector string")
+                try:
+                    compiled[field] = soupsieve.compile(selector)
+                except soupsieve.SelectorSyntaxError as e:
+                    raise ValueError(f"{self.source}: invalid selector for '{domain}.{field}': {e}") from e
+            self._compiled[domain] = compiled
+            self._more[domain] = list(more.keys())
+
+    def supports(self, domain):
+        return domain in self._compiled
+
+    def more_fields(self, domain):
+        """
+        Returns the field names of the domain's "more" block, in config order
+        """
+        return self._more.get(domain, [])
+
+    def concurrency(self, domain, default):
+        """
+        Returns the batch concurrency configured for a domain, or default
+        """
+        return self._concurrency.get(domain, default)
+
+    def has(self, domain, field):
+        return field in self._compiled.get(domain, {})
+
+    def selectors(self, domain):
+        """
+        Returns {field: compiled selector} for a domain
+        """
+        return self._compiled[domain]
+
+    def select_one(self, domain, field, tag):
+        """
+        Returns the first element under tag matching the domain's field selector, or None
+        """
+        return self._compiled[domain][field].select_one(tag)
+
+    def select(self, domain, field, tag):
+        """
+        Returns every element under tag matching the domain's field selector
+        """
+        return self._compiled[domain][field].select(tag)
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def find_config(path=None):
+    """
+    Locates the config: an explicit path, the working directory, then next to this module
+    """
+    if path:
+        return path
+    if os.path.exists(CONFIG_NAME):
+        return CONFIG_NAME
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), CONFIG_NAME)
+
+def get_engine(path=None):
+    """
+    Returns the compiled SelectorEngine for a config file
+
+    The engine is built once per file and rebuilt only when the file changes
+    on disk, so repeated calls in one process cost a stat().
+
+    Raises:
+        ValueError: When the config is malformed or a selector does not compile
+    """
+    path = os.path.abspath(find_config(path))
+    mtime = os.path.getmtime(path)
+    with _engines_lock:
+        cached = _engines.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'r', encoding='utf-8') as f:
+            engine = SelectorEngine(json.load(f), source=path)
+        _engines[path] = (mtime, engine)
+        return engine
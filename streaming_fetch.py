@@ -0,0 +1,199 @@
+import codecs
+import threading
+from html.parser import HTMLParser
+
+from parser_backend import make_soup
+from scrape_metrics import metrics
+from structured_data import head_end, head_movie_data
+from tmdb_extract import (FIELDS, HEADER_SECTION, TMDB_SECTIONS, extract_movie_data, field_strainer,
+                          parse_movie_page)
+
+class SectionWatcher(HTMLParser):
+    """
+    Incremental parser telling when a set of sections has been fully received
+
+    Only start and end tags are tracked: a watched section is complete once
+    the end tag balancing its start tag has been fed, and is then in closed.
+    """
+
+    def __init__(self, sections=TMDB_SECTIONS):
+        super().__init__(convert_charrefs=False)
+        self.pending = set(sections)
+        self.closed = set()
+        self._open = []  # [tag, class, depth] of watched sections being received
+
+    @property
+    def done(self):
+        return not self.pending and not self._open
+
+    def handle_starttag(self, tag, attrs):
+        for watch in self._open:
+            if watch[0] == tag:
+                watch[2] += 1
+        classes = (dict(attrs).get('class') or '').split()
+        for section in list(self.pending):
+            if section[0] == tag and section[1] in classes:
+                self.pending.discard(section)
+                self._open.append([tag, section[1], 1])
+
+    def handle_endtag(self, tag):
+        for watch in list(self._open):
+            if watch[0] == tag:
+                watch[2] -= 1
+                if watch[2] == 0:
+                    self._open.remove(watch)
+                    self.closed.add((watch[0], watch[1]))
+
+class StreamStats:
+    """
+    Counts pages cut short and bytes read by streaming fetches
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pages = 0
+        self.early = 0
+        self.bytes_read = 0
+        self.bytes_announced = 0
+
+    def add(self, early, bytes_read, announced):
+        with self._lock:
+            self.pages += 1
+            self.early += early
+            self.bytes_read += bytes_read
+            self.bytes_announced += announced or bytes_read
+
+    def summary(self):
+        saved = self.bytes_announced - self.bytes_read
+        return (f"streaming: {self.early}/{self.pages} pages stopped early, "
+                f"{self.bytes_read / 1048576:.1f} MB read, {saved / 1048576:.1f} MB skipped")
+
+stream_stats = StreamStats()
+
+def _prefix_is_complete(movie_data, methods, closed):
+    # Every field found, and directors and cast only read from sections received in full
+    for field in ('release_date', 'poster_url', 'runtime', 'user_score', 'overview', 'tagline'):
+        if movie_data.get(field) is None:
+            return False
+    return (movie_data['original_title'] != "N/A" and movie_data['genres'] and
+            methods['sections']['directors'] <= closed and methods['sections']['cast'] <= closed)
+
+def stream_movie_page(response, backend=None, restricted=False, chunk_size=16 * 1024, methods=None):
+    """
+    Reads a TMDb movie page only until every field has been received
+
+    Once the document head is received its structured data is read. Chunks
+    are fed to a SectionWatcher; once the header, top billed cast and facts
+    sections are complete the received prefix is extracted, the DOM only
+    for the fields the head lacks. The head never holds the tagline: when it
+    holds every other field only the header section, where the tagline is,
+    is waited for and only the tagline node is built. When the prefix yields
+    every field, and the fallback methods up to the ones that found the
+    directors and cast only read sections received in full, the connection
+    is closed without reading the rest of the page. Otherwise the same response is read to the end and parsed in
+    full, so no second request is made.
+
+    Args:
+        response (requests.Response): Response opened with stream=True
+        backend (str): Parser backend, None for the fastest one installed
+        restricted (bool): Only build the page subtrees the extractors read
+        chunk_size (int): Bytes read per chunk
+        methods (dict): Optional dict receiving the fallback methods, see extract_movie_data
+
+    Returns:
+        dict: movie_data as returned by extract_movie_data
+    """
+    methods = methods if methods is not None else {}
+    methods['sections'] = {}
+    watcher = SectionWatcher()
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    announced = int(response.headers.get('Content-Length') or 0)
+    buffer = bytearray()
+    known = None
+    parse_only = None
+    chunks = response.iter_content(chunk_size=chunk_size)
+    try:
+        for chunk in chunks:
+            buffer += chunk
+            if known is None and head_end(buffer) is not None:
+                with metrics.timer('stage_seconds', stage='head'):
+                    known = head_movie_data(buffer)
+                missing = [field for field in FIELDS if field not in known]
+                if missing == ['tagline']:
+                    # No section has started yet: only wait for the header
+                    watcher.pending &= {HEADER_SECTION}
+                if 'directors' in known and 'cast' in known:
+                    parse_only = field_strainer(missing)
+            watcher.feed(decoder.decode(chunk))
+            if watcher.done:
+                with metrics.timer('stage_seconds', stage='parse'):
+                    soup = make_soup(bytes(buffer), backend, parse_only=parse_only)
+                with metrics.timer('stage_seconds', stage='extract'):
+                    movie_data = extract_movie_data(soup, methods, known)
+                soup.decompose()
+                if _prefix_is_complete(movie_data, methods, watcher.closed):
+                    stream_stats.add(True, len(buffer), announced)
+                    metrics.count('bytes_in_total', len(buffer), kind='page')
+                    return movie_data
+                break
+
+        # Something is missing from the prefix: read the remainder of the page
+        for chunk in chunks:
+            buffer += chunk
+    finally:
+        response.close()
+
+    stream_stats.add(False, len(buffer), announced)
+    metrics.count('bytes_in_total', len(buffer), kind='page')
+    return parse_movie_page(bytes(buffer), backend, restricted, methods)
+
+def stream_movie_tree(response, parse, methods, chunk_size=16 * 1024):
+    """
+    Reads a TMDb movie page until its sections are complete and parses the received prefix
+
+    Unlike stream_movie_page a tree is always built, for selectors reading
+    more than movie_data. The header, top billed cast and facts sections
+    hold every such field, so once the SectionWatcher has seen them the
+    prefix is parsed and the connection closed. When the prefix record is
+    not complete the rest of the same response is read and parsed instead.
+
+    Args:
+        response (requests.Response): Response opened with stream=True
+        parse (callable): Takes the page bytes, returns (record, parsed page)
+        methods (dict): The dict parse fills with the fallback methods
+        chunk_size (int): Bytes read per chunk
+
+    Returns:
+        tuple: (record, parsed page), as returned by parse
+    """
+    methods['sections'] = {}
+    watcher = SectionWatcher()
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    announced = int(response.headers.get('Content-Length') or 0)
+    buffer = bytearray()
+    chunks = response.iter_content(chunk_size=chunk_size)
+    try:
+        for chunk in chunks:
+            buffer += chunk
+            watcher.feed(decoder.decode(chunk))
+            if watcher.done:
+                record, soup = parse(bytes(buffer))
+                if _prefix_is_complete(record, methods, watcher.closed):
+                    stream_stats.add(True, len(buffer), announced)
+                    metrics.count('bytes_in_total', len(buffer), kind='page')
+                    return record, soup
+                soup.decompose()
+                break
+
+        # Something is missing from the prefix: read the remainder of the page
+        for chunk in chunks:
+            buffer += chunk
+    finally:
+        response.close()
+
+    stream_stats.add(False, len(buffer), announced)
+    metrics.count('bytes_in_total', len(buffer), kind='page')
+    return parse(bytes(buffer))
@@ -0,0 +1,198 @@
+import json
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from tmdb_api import TOP_BILLED, format_runtime
+
+# End of the document head: the head tier never looks past it
+HEAD_END = re.compile(r'</head\s*>|<body[\s>]', re.IGNORECASE)
+HEAD_END_BYTES = re.compile(rb'</head\s*>|<body[\s>]', re.IGNORECASE)
+
+# ISO 8601 duration of schema.org Movie, e.g. PT2H22M
+ISO_DURATION = re.compile(r'^P(?:\d+D)?T?(?:(\d+)H)?(?:(\d+)M)?', re.IGNORECASE)
+
+# Year in the page title, e.g. "Alien (1979) — The Movie Database (TMDB)"
+TITLE_YEAR = re.compile(r'\((\d{4})\)')
+
+class HeadReader(HTMLParser):
+    """
+    Collects the <title>, the meta tags and the JSON-LD blocks of a document head
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.meta = {}
+        self.json_ld = []
+        self.title = ''
+        self._capture = None  # 'title' or 'json_ld' while inside one
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'meta':
+            key = attrs.get('property') or attrs.get('name')
+            if key and attrs.get('content') is not None:
+                # Repeated tags (several og:image) keep their first value
+                self.meta.setdefault(key.lower(), attrs['content'])
+        elif tag == 'title':
+            self._capture = 'title'
+        elif tag == 'script' and (attrs.get('type') or '').lower() == 'application/ld+json':
+            self._capture = 'json_ld'
+
+    def handle_data(self, data):
+        if self._capture:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if self._capture == 'title' and tag == 'title':
+            self.title = ''.join(self._text).strip()
+        elif self._capture == 'json_ld' and tag == 'script':
+            self.json_ld.append(''.join(self._text))
+        else:
+            return
+        self._capture = None
+        self._text = []
+
+def head_end(content):
+    """
+    Returns the offset where the document head ends, None when it has not been received yet
+    """
+    pattern = HEAD_END_BYTES if isinstance(content, (bytes, bytearray)) else HEAD_END
+    match = pattern.search(content)
+    return match.start() if match else None
+
+def read_head(content):
+    """
+    Parses the head of an HTML document, without reading the body
+
+    Args:
+        content (bytes or str): The HTML document, or a prefix of it
+
+    Returns:
+        HeadReader: The title, meta tags and JSON-LD blocks found
+    """
+    end = head_end(content)
+    head = content[:end] if end is not None else content
+    if isinstance(head, (bytes, bytearray)):
+        head = bytes(head).decode('utf-8', errors='replace')
+    reader = HeadReader()
+    reader.feed(head)
+    reader.close()
+    return reader
+
+def _movie_object(blocks):
+    # The first schema.org Movie of the JSON-LD blocks, None when there is none
+    for block in blocks:
+        try:
+            data = json.loads(block)
+        except ValueError:
+            continue
+        items = data if isinstance(data, list) else data.get('@graph', [data]) if isinstance(data, dict) else []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            types = item.get('@type')
+            if types == 'Movie' or (isinstance(types, list) and 'Movie' in types):
+                return item
+    return None
+
+def _names(value):
+    # Names of a person, a list of persons or a list of strings
+    if value is None:
+        return []
+    names = []
+    for item in value if isinstance(value, list) else [value]:
+        name = item.get('name') if isinstance(item, dict) else item
+        if isinstance(name, str) and name.strip() and name.strip() not in names:
+            names.append(name.strip())
+    return names
+
+def _image(value):
+    # schema.org image: a URL, an ImageObject or a list of either
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get('url') or value.get('contentUrl')
+    return value if isinstance(value, str) and value else None
+
+def _runtime(duration):
+    match = ISO_DURATION.match(duration or '')
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes = (int(group or 0) for group in match.groups())
+    return format_runtime(hours * 60 + minutes)
+
+def _score(rating):
+    # aggregateRating as a percentage, like the user score chart of the page
+    if not isinstance(rating, dict):
+        return None
+    try:
+        value = float(rating['ratingValue'])
+        best = float(rating.get('bestRating') or 10)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return f"{value * 100 / best:.1f}%" if best > 0 else None
+
+def head_movie_data(content):
+    """
+    Extracts the movie fields available in the document head
+
+    JSON-LD (schema.org Movie) is read first, then the OpenGraph meta tags
+    and, for the year only, the <title>. Values are formatted like
+    extract_movie_data returns them. A field is missing from the result
+    when the head does not have it, so the caller knows what is left for
+    the DOM extractors. The head never holds the tagline.
+
+    Args:
+        content (bytes or str): The HTML document, or a prefix holding the head
+
+    Returns:
+        dict: The subset of the movie_data fields found in the head
+    """
+    reader = read_head(content)
+    movie = _movie_object(reader.json_ld) or {}
+    meta = reader.meta
+    movie_data = {}
+
+    date = movie.get('datePublished') or movie.get('dateCreated') or meta.get('video:release_date') or ''
+    year = date[:4] if re.match(r'\d{4}', date) else None
+    if not year:
+        match = TITLE_YEAR.search(reader.title)
+        year = match.group(1) if match else None
+    if year:
+        movie_data['release_date'] = year
+
+    title = movie.get('name') or meta.get('og:title')
+    if isinstance(title, str) and title.strip():
+        movie_data['original_title'] = title.strip()
+
+    poster = _image(movie.get('image')) or meta.get('og:image')
+    if poster:
+        movie_data['poster_url'] = urljoin('https://www.themoviedb.org', poster)
+
+    genres = _names(movie.get('genre'))
+    if genres:
+        movie_data['genres'] = genres
+
+    directors = _names(movie.get('director'))
+    if directors:
+        movie_data['directors'] = directors
+
+    cast = _names(movie.get('actor'))
+    if cast:
+        movie_data['cast'] = cast[:TOP_BILLED]
+
+    runtime = _runtime(movie.get('duration'))
+    if runtime:
+        movie_data['runtime'] = runtime
+
+    score = _score(movie.get('aggregateRating'))
+    if score:
+        movie_data['user_score'] = score
+
+    overview = movie.get('description') or meta.get('og:description')
+    if isinstance(overview, str) and overview.strip():
+        movie_data['overview'] = overview.strip()
+
+    return movie_data
@@ -0,0 +1,156 @@
+import json
+import os
+import re
+import threading
+from urllib.parse import urlencode, urlsplit
+
+import requests
+
+API_BASE = 'https://api.themoviedb.org/3'
+
+# Number of cast members the movie page shows as "Top Billed Cast"
+TOP_BILLED = 9
+
+MOVIE_ID = re.compile(r'/movie/(\d+)')
+
+def movie_id(url):
+    """
+    Returns the TMDb id of a movie page URL, e.g. '278' for /movie/278-the-shawshank-redemption
+
+    Raises:
+        ValueError: When the URL is not a movie page
+    """
+    match = MOVIE_ID.search(urlsplit(url).path)
+    if not match:
+        raise ValueError(f"Not a TMDb movie URL: {url}")
+    return match.group(1)
+
+def format_runtime(minutes):
+    """
+    Formats a runtime in minutes the way the movie page does, e.g. 142 -> '2h 22m'
+    """
+    if not minutes:
+        return None
+    hours, minutes = divmod(minutes, 60)
+    parts = []
+    if hours:
+        parts.append(f"{hours}h")
+    if minutes:
+        parts.append(f"{minutes}m")
+    return ' '.join(parts)
+
+class TmdbApi:
+    """
+    Client of the TMDb v3 JSON API
+
+    Authenticates with a read access token (Authorization: Bearer) or a v3
+    API key. The API only takes the v3 key as the api_key query parameter:
+    the HTTP cache and the archive leave it out of what they store, and it
+    is masked in the messages of the errors raised here. The image
+    configuration is fetched once and reused to build poster URLs.
+    """
+
+    def __init__(self, api_key=None, access_token=None, session=None, base_url=API_BASE, poster_size='w500'):
+        self.api_key = api_key
+        self.access_token = access_token
+        self.session = session if session is not None else requests.Session()
+        self.base_url = base_url.rstrip('/')
+        self.poster_size = poster_size
+        self._poster_base = None
+        self._lock = threading.Lock()
+
+    def get(self, path, **params):
+        """
+        GETs an API path and returns the decoded JSON
+
+        Raises:
+            requests.RequestException: When the request fails or the API answers with an error status
+        """
+        headers = {'Accept': 'application/json'}
+        if self.access_token:
+            headers['Authorization'] = f"Bearer {self.access_token}"
+        elif self.api_key:
+            params['api_key'] = self.api_key
+        # Query string built here rather than with params=, which HttpCache does not take
+        try:
+            response = self.session.get(f"{self.base_url}{path}?{urlencode(params)}", headers=headers)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            if not self.api_key or self.access_token:
+                raise
+            # The message holds the request URL, key included
+            raise type(e)(str(e).replace(self.api_key, '***'), response=e.response) from None
+        return json.loads(response.content)
+
+    def poster_base(self):
+        """
+        Returns the poster URL prefix, e.g. https://image.tmdb.org/t/p/w500, from /configuration
+        """
+        with self._lock:
+            if self._poster_base is None:
+                images = self.get('/configuration')['images']
+                sizes = images.get('poster_sizes') or ['original']
+                size = self.poster_size if self.poster_size in sizes else sizes[-1]
+                self._poster_base = images['secure_base_url'].rstrip('/') + '/' + size
+            return self._poster_base
+
+    def movie(self, movie_id):
+        """
+        Returns the details of a movie with its credits, in one request
+        """
+        return self.get(f'/movie/{movie_id}', append_to_response='credits', language='en-US')
+
+    def movie_data(self, url):
+        """
+        Fetches a movie and returns the same fields as tmdb_extract.extract_movie_data
+        """
+        return api_movie_data(self.movie(movie_id(url)), self.poster_base())
+
+def api_movie_data(details, poster_base):
+    """
+    Maps an API movie (with credits appended) to the movie_data of the HTML extractor
+
+    Values are formatted like the movie page shows them: year only, runtime
+    as '2h 22m', score as a percentage, None for an empty tagline.
+
+    Args:
+        details (dict): /movie/{id}?append_to_response=credits response
+        poster_base (str): Poster URL prefix from TmdbApi.poster_base
+
+    Returns:
+        dict: movie_data with release_date, original_title, poster_url, genres,
+              directors, cast, runtime, user_score, overview and tagline
+    """
+    credits = details.get('credits') or {}
+    directors = []
+    for member in credits.get('crew') or []:
+        if member.get('job') == 'Director' and member['name'] not in directors:
+            directors.append(member['name'])
+    cast = sorted(credits.get('cast') or [], key=lambda member: member.get('order', 0))
+
+    movie_data = {}
+    movie_data['release_date'] = (details.get('release_date') or '')[:4] or None
+    movie_data['original_title'] = details.get('title') or "N/A"
+    movie_data['poster_url'] = poster_base + details['poster_path'] if details.get('poster_path') else None
+    movie_data['genres'] = [genre['name'] for genre in details.get('genres') or []]
+    movie_data['directors'] = directors
+    movie_data['cast'] = [member['name'] for member in cast[:TOP_BILLED]]
+    movie_data['runtime'] = format_runtime(details.get('runtime'))
+    vote = details.get('vote_average')
+    movie_data['user_score'] = f"{vote * 10:.1f}%" if vote else None
+    movie_data['overview'] = details.get('overview') or None
+    movie_data['tagline'] = details.get('tagline') or None
+    return movie_data
+
+def api_from_env(api_key=None, session=None):
+    """
+    Creates a TmdbApi from an explicit key or the TMDB_API_KEY / TMDB_ACCESS_TOKEN environment variables
+
+    Raises:
+        ValueError: When no credentials are available
+    """
+    api_key = api_key or os.environ.get('TMDB_API_KEY')
+    access_token = os.environ.get('TMDB_ACCESS_TOKEN')
+    if not api_key and not access_token:
+        raise ValueError("The API backend needs --api-key, TMDB_API_KEY or TMDB_ACCESS_TOKEN")
+    return TmdbApi(api_key=api_key, access_token=access_token, session=session)
@@ -0,0 +1,375 @@
+import argparse
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from bs4 import SoupStrainer
+
+from http_cache import HttpCache
+from method_stats import STATS_NAME, method_stats
+from mirror_server import MirrorSession
+from movie_catalog import MovieCatalog, url_key
+from parser_backend import available_backends, make_soup
+from rate_control import ControlledSession, RequestController, find_controller
+from scrape_metrics import metrics
+from tmdb_scraper import (DOWNLOAD_FOLDER, HostLimiter, make_downloader, make_session, save_movie,
+                          scrape_movie_data, write_metrics)
+
+FRONTIER_NAME = '.crawl_frontier.json'
+
+# Movie pages, e.g. /movie/278-the-shawshank-redemption (sub-pages such as /movie/278/cast excluded)
+MOVIE_PATH = re.compile(r'^/movie/(\d+)(-[^/]*)?/?$')
+
+# Pages listing movies: listings, search results, people, genres, keywords, collections and lists
+LISTING_PATH = re.compile(r'^/(movie(/(top-rated|now-playing|upcoming))?|search(/movie)?|discover/movie|'
+                          r'person|person/\d+[^/]*|genre/[^/]+/movie|keyword/[^/]+/movie|'
+                          r'collection/\d+[^/]*|list/\d+[^/]*)/?$')
+
+LINKS_ONLY = SoupStrainer('a', href=True)
+
+class Frontier:
+    """
+    Deduplicating crawl frontier persisted in a JSON file
+
+    Listing pages and movie pages are kept apart, each keyed so that two
+    spellings of the same page are only visited once (movies by TMDb id).
+    Every entry is 'pending', 'done' or 'failed'; reloading the file resumes
+    the crawl with the pending entries, failed ones are retried.
+
+    Pending keys are also queued, listing pages in one deque per depth, so
+    picking the next entries does not scan and sort the whole frontier.
+    Keys are queued when added and dropped once finished; the queues are
+    only rebuilt from the state when the file is loaded.
+    """
+
+    def __init__(self, path, save_every=20):
+        self.path = path
+        self.save_every = save_every
+        self._dirty = 0
+        self.state = {'pages': {}, 'movies': {}}
+        self._pages = {}  # depth -> deque of pending page keys, in discovery order
+        self._movies = deque()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+            for entries in self.state.values():
+                for entry in entries.values():
+                    if entry['state'] == 'failed':
+                        entry['state'] = 'pending'
+            for key, entry in self.state['pages'].items():
+                if entry['state'] == 'pending':
+                    self._pages.setdefault(entry['depth'], deque()).append(key)
+            self._movies.extend(key for key, entry in self.state['movies'].items() if entry['state'] == 'pending')
+
+    def _changed(self):
+        self._dirty += 1
+        if self._dirty >= self.save_every:
+            self.save()
+
+    def save(self):
+        """
+        Writes the frontier to disk
+        """
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = 0
+
+    def add_page(self, url, depth):
+        key = url_key(url)
+        entry = self.state['pages'].get(key)
+        if entry is None:
+            self.state['pages'][key] = {'url': url, 'depth': depth, 'state': 'pending'}
+            self._pages.setdefault(depth, deque()).append(key)
+            self._changed()
+        elif depth < entry['depth'] and entry['state'] == 'pending':
+            # The key left in the deeper queue no longer matches the entry and is skipped
+            entry['depth'] = depth
+            self._pages.setdefault(depth, deque()).append(key)
+
+    def add_movie(self, movie_id, url):
+        if movie_id not in self.state['movies']:
+            self.state['movies'][movie_id] = {'url': url, 'state': 'pending'}
+            self._movies.append(movie_id)
+            self._changed()
+
+    def _queued(self, queue, kind, depth=None):
+        # Finished keys (and keys moved to a shallower queue) are dropped from
+        # the front; the ones behind it are skipped and dropped on a later call
+        def live(key):
+            entry = self.state[kind][key]
+            return entry['state'] == 'pending' and (depth is None or entry['depth'] == depth)
+        while queue and not live(queue[0]):
+            queue.popleft()
+        for key in queue:
+            if live(key):
+                yield key, self.state[kind][key]
+
+    def pending_pages(self):
+        """
+        Yields (key, entry) of the pending listing pages, shallowest first
+
+        Marking entries while iterating is fine; stop iterating before adding any.
+        """
+        for depth in sorted(self._pages):
+            yield from self._queued(self._pages[depth], 'pages', depth)
+
+    def pending_movies(self):
+        """
+        Yields (key, entry) of the pending movies, in discovery order
+        """
+        return self._queued(self._movies, 'movies')
+
+    def has_pending(self):
+        """
+        Returns True when listing pages or movies are left to visit
+        """
+        return next(self.pending_pages(), None) is not None or next(self.pending_movies(), None) is not None
+
+    def mark(self, kind, key, state):
+        self.state[kind][key]['state'] = state
+        self._changed()
+
+    def count(self, kind, state):
+        return sum(1 for entry in self.state[kind].values() if entry['state'] == state)
+
+def extract_links(content, page_url, backend=None):
+    """
+    Splits the links of a TMDb page into movie pages and listing pages
+
+    Args:
+        content (bytes): The page HTML
+        page_url (str): URL of the page, to resolve relative links
+        backend (str): Parser backend, None for the fastest one installed
+
+    Returns:
+        tuple: ({movie id: canonical movie URL}, [listing page URLs])
+    """
+    host = urlsplit(page_url).hostname
+    movies = {}
+    listings = []
+    soup = make_soup(content, backend, parse_only=LINKS_ONLY)
+    for a in soup.find_all('a', href=True):
+        parts = urlsplit(urljoin(page_url, a['href']))
+        if parts.hostname != host:
+            continue
+        match = MOVIE_PATH.match(parts.path)
+        if match:
+            movies.setdefault(match.group(1), urlunsplit((parts.scheme, parts.netloc, parts.path.rstrip('/'), '', '')))
+        elif LISTING_PATH.match(parts.path):
+            listings.append(urlunsplit((parts.scheme, parts.netloc, parts.path, parts.query, '')))
+    soup.decompose()
+    return movies, listings
+
+def crawl(seeds, download_folder, frontier, max_depth=2, max_pages=100, max_movies=None, workers=8, per_host=4,
+          backend=None, restricted=False, stream=False, session=None, chunk_size=64 * 1024, catalog=None,
+          quiet=False):
+    """
+    Discovers movie pages from listing, search and person pages and scrapes them
+
+    Listing pages and movie pages share one bounded worker pool: movie links
+    are scraped and saved (poster included) as soon as they are discovered,
+    while listing links are followed breadth first up to max_depth.
+
+    Args:
+        seeds (list): Listing, search or person page URLs to start from (depth 0)
+        download_folder (str): Destination folder for JSON files and posters
+        frontier (Frontier): Crawl state, resumed when it already holds entries
+        max_depth (int): Link distance from the seeds beyond which listings are not followed
+        max_pages (int): Maximum number of listing pages fetched in this run
+        max_movies (int): Maximum number of movies scraped in this run, None for no limit
+        workers (int): Size of the worker pool
+        per_host (int): Maximum concurrent requests against a single host
+        backend (str): Parser backend, None for the fastest one installed
+        restricted (bool): Only build the page subtrees the extractors read
+        stream (bool): Stop reading each movie page once every field has been received
+        session (requests.Session or HttpCache): Shared session, None for a new pooled one
+        chunk_size (int): Poster download chunk size in bytes
+        catalog (MovieCatalog): Optional catalog; movies already in it are not scraped again
+        quiet (bool): Only print errors and the final summary
+
+    Returns:
+        tuple: (listing pages fetched, movies saved, movies failed)
+    """
+    for seed in seeds:
+        frontier.add_page(seed, 0)
+    known = catalog.known_urls() if catalog is not None else set()
+
+    own_session = session is None
+    if own_session:
+        session = make_session(pool_size=workers, controller=RequestController(per_host))
+    limiter = HostLimiter(per_host)
+    downloader = make_downloader(download_folder, session, chunk_size)
+
+    def fetch_listing(url):
+        with limiter.slot(url), metrics.timer('stage_seconds', stage='listing'):
+            response = session.get(url, headers={'Accept-Language': 'en-US,en;q=0.9'})
+            response.raise_for_status()
+        metrics.count('bytes_in_total', len(response.content), kind='listing')
+        with metrics.timer('stage_seconds', stage='links'):
+            return extract_links(response.content, url, backend)
+
+    def process_movie(url):
+        with limiter.slot(url):
+            movie_data = scrape_movie_data(url, session, backend, restricted, stream, quiet)
+        if not movie_data:
+            return False
+        firstkey = list(movie_data.keys())
+        with limiter.slot(movie_data[firstkey[0]]['img'] or ''):
+            save_movie(movie_data, download_folder, session, downloader, catalog, quiet)
+        return True
+
+    pages = saved = failed = 0
+    pages_started = movies_started = 0
+    inflight = {}
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                # Keep at most two jobs per worker queued, movies before listings
+                # so that discovered movies are saved while the crawl goes on
+                queued = set(inflight.values())
+                for key, entry in frontier.pending_movies():
+                    if len(inflight) >= workers * 2 or (max_movies is not None and movies_started >= max_movies):
+                        break
+                    if ('movies', key) in queued:
+                        continue
+                    if url_key(entry['url']) in known:
+                        frontier.mark('movies', key, 'done')
+                        continue
+                    movies_started += 1
+                    inflight[executor.submit(process_movie, entry['url'])] = ('movies', key)
+                for key, entry in frontier.pending_pages():
+                    if len(inflight) >= workers * 2 or pages_started >= max_pages:
+                        break
+                    if ('pages', key) not in queued:
+                        pages_started += 1
+                        inflight[executor.submit(fetch_listing, entry['url'])] = ('pages', key)
+                if not inflight:
+                    break
+
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, key = inflight.pop(future)
+                    entry = frontier.state[kind][key]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Error processing {entry['url']}: {e}")
+                        result = None
+                    if kind == 'pages':
+                        pages += 1
+                        if result is None:
+                            frontier.mark('pages', key, 'failed')
+                            continue
+                        movies, listings = result
+                        for movie_id, url in movies.items():
+                            frontier.add_movie(movie_id, url)
+                        if entry['depth'] < max_depth:
+                            for url in listings:
+                                frontier.add_page(url, entry['depth'] + 1)
+                        frontier.mark('pages', key, 'done')
+                    elif result:
+                        saved += 1
+                        frontier.mark('movies', key, 'done')
+                        metrics.count('movies_total', result='saved')
+                    else:
+                        failed += 1
+                        frontier.mark('movies', key, 'failed')
+                        metrics.count('movies_total', result='failed')
+    finally:
+        frontier.save()
+        downloader.save()
+    if own_session:
+        session.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"\nCrawl completed: {pages} listing pages, {saved} movies saved, {failed} failed, {elapsed:.1f}s")
+    print(f"Frontier: {frontier.count('pages', 'pending')} listing pages and "
+          f"{frontier.count('movies', 'pending')} movies left pending")
+    print(downloader.summary())
+    if isinstance(session, HttpCache):
+        print(session.stats())
+    controller = find_controller(session)
+    if controller is not None:
+        print(controller.summary())
+    print(metrics.summary())
+    if method_stats.adaptive:
+        print(method_stats.summary())
+    return pages, saved, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl TMDb listing, search and person pages and scrape every movie found.")
+    parser.add_argument('seeds', nargs='*',
+                        help="Listing, search or person page URLs to start from; none to resume the saved frontier.")
+    parser.add_argument('--output', default=DOWNLOAD_FOLDER,
+                        help="Folder where JSON files and posters are saved.")
+    parser.add_argument('--frontier', metavar='FILE',
+                        help=f"Crawl state file, by default {FRONTIER_NAME} in the output folder.")
+    parser.add_argument('--max-depth', type=int, default=2,
+                        help="Follow listing links up to this many hops from the seeds.")
+    parser.add_argument('--max-pages', type=int, default=100,
+                        help="Maximum number of listing pages fetched in this run.")
+    parser.add_argument('--max-movies', type=int, default=None,
+                        help="Maximum number of movies scraped in this run.")
+    parser.add_argument('--workers', type=int, default=8,
+                        help="Number of concurrent workers.")
+    parser.add_argument('--per-host', type=int, default=4,
+                        help="Maximum concurrent requests against a single host.")
+    parser.add_argument('--parser', choices=available_backends(), default=None,
+                        help="HTML parser backend. Defaults to the fastest one installed.")
+    parser.add_argument('--restricted', action='store_true',
+                        help="Only build the page subtrees the extractors read.")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stop downloading a movie page as soon as every field has been received.")
+    parser.add_argument('--adaptive-fallback', action='store_true',
+                        help="Skip the director and cast fallback methods that have not matched in the last "
+                             "pages (rates kept in .fallback_stats.json).")
+    parser.add_argument('--quiet', action='store_true',
+                        help="Do not print every scraped movie, only errors and the summary.")
+    parser.add_argument('--metrics-json', metavar='FILE',
+                        help="Write stage and field timings, fallback method counts and byte counts as JSON.")
+    parser.add_argument('--metrics-prom', metavar='FILE',
+                        help="Write the same metrics in the Prometheus text format.")
+    parser.add_argument('--catalog', metavar='DB',
+                        help="SQLite catalog assigning movie numbers; movies already in it are skipped.")
+    parser.add_argument('--chunk-size', type=int, default=64,
+                        help="Poster download chunk size in KB.")
+    parser.add_argument('--cache', metavar='DIR',
+                        help="Cache pages in DIR and revalidate them with ETag / If-Modified-Since.")
+    parser.add_argument('--mirror', metavar='BASE_URL',
+                        help="Send every request to a local mirror_server.py instead of the real site.")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    method_stats.adaptive = args.adaptive_fallback
+    method_stats.load(os.path.join(args.output, STATS_NAME))
+    frontier = Frontier(args.frontier or os.path.join(args.output, FRONTIER_NAME))
+    if not args.seeds and not frontier.has_pending():
+        parser.error("no seed URLs given and nothing pending in the frontier")
+
+    if args.mirror:
+        session = ControlledSession(MirrorSession(args.mirror), RequestController(args.per_host))
+    else:
+        session = make_session(pool_size=args.workers, cache_dir=args.cache,
+                               controller=RequestController(args.per_host))
+    catalog = MovieCatalog(args.catalog) if args.catalog else None
+    try:
+        crawl(args.seeds, args.output, frontier, max_depth=args.max_depth, max_pages=args.max_pages,
+              max_movies=args.max_movies, workers=args.workers, per_host=args.per_host, backend=args.parser,
+              restricted=args.restricted, stream=args.stream, session=session,
+              chunk_size=args.chunk_size * 1024, catalog=catalog, quiet=args.quiet)
+    finally:
+        session.close()
+        if catalog is not None:
+            catalog.close()
+        method_stats.save()
+    write_metrics(args.metrics_json, args.metrics_prom)
+
+if __name__ == "__main__":
+    main()
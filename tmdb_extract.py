@@ -0,0 +1,820 @@
+import re
+import sys
+from urllib.parse import urljoin
+from bs4 import NavigableString, SoupStrainer, Tag
+from parser_backend import make_soup
+from method_stats import run_cascade
+from scrape_metrics import metrics
+from selector_engine import get_engine
+from structured_data import head_movie_data
+
+TMDB_DOMAIN = 'www.themoviedb.org'
+
+# Text patterns used by the fallback heuristics
+DIRECTOR_PATTERN = re.compile(r'Director', re.IGNORECASE)
+CAST_PATTERN = re.compile(r'Cast', re.IGNORECASE)
+
+# Link texts that are navigation rather than actor names
+CAST_NAV_TEXTS = ['view more', 'more', 'see all', 'view all', 'cast', 'crew']
+PEOPLE_NAV_WORDS = ['view', 'more', 'see all', 'cast', 'crew', 'show all']
+CAST_NAV_WORDS = ['view', 'more', 'see', 'all', 'cast', 'crew', 'show']
+
+# Sections of a TMDb movie page holding every field scrape_movie_data reads:
+# header (title, poster, genres, runtime, score, overview, tagline, crew),
+# top billed cast and facts
+HEADER_SECTION = ('section', 'header_poster_wrapper')
+TMDB_SECTIONS = [HEADER_SECTION, ('section', 'top_billed'), ('section', 'facts')]
+
+# Restricted parse: only the subtrees holding the header, poster, facts,
+# people lists and cast scroller are built. The top billed section, cast
+# list and facts are also matched among other classes, as in
+# class="facts left_column", which the strainer sees as one string.
+RESTRICTED_NAMES = ['section', 'div', 'ol', 'span', 'img', 'h3']
+RESTRICTED_CLASSES = (r'^(header_poster_wrapper|title|poster|genres|release_date|runtime|'
+                      r'user_score_chart|overview|tagline|people|scroller|facts)$|'
+                      r'(^|\s)(top_billed|cast_list|facts)(\s|$)')
+
+# Method reported for directors and cast taken from the document head
+HEAD_METHOD = 'head'
+
+# Fallback methods whose candidates are all kept by restricted_strainer
+RESTRICTED_DIRECTOR_METHODS = (HEAD_METHOD, 1, 2, 3)
+RESTRICTED_CAST_METHODS = (HEAD_METHOD, 1, 2)
+
+# Nodes holding each field that has a single candidate, see collect_candidates
+FIELD_NODES = {
+    'release_date': ('span', 'release_date'),
+    'original_title': ('div', 'title'),
+    'poster_url': ('img', 'poster'),
+    'genres': ('span', 'genres'),
+    'runtime': ('span', 'runtime'),
+    'user_score': ('div', 'user_score_chart'),
+    'overview': ('div', 'overview'),
+    'tagline': ('h3', 'tagline'),
+}
+
+# .class and [class...] parts of a compound selector
+COMPOUND_PART = re.compile(r"""\.([\w-]+)|\[class([*~^]?)=['"]?([^'"\]]+)['"]?\]""")
+
+def _word(name):
+    return rf'(^|\s){re.escape(name)}(\s|$)'
+
+def selector_root(pattern):
+    """
+    Returns (tag, class regex) of the first compound of a CSS selector, the regex None for any class
+
+    Every match of the selector lies inside a node matching its first
+    compound, as long as it only uses descendant and child combinators, so
+    a strainer keeping those nodes keeps the matches. None is returned for
+    selectors this does not hold for or that cannot be reduced to a tag
+    and a class (ids, pseudo-classes, sibling combinators, no tag).
+    """
+    outside = re.sub(r'\[[^\]]*\]', '[]', pattern)
+    if any(char in outside for char in '+~,:#'):
+        return None
+    first = re.split(r'\s*>\s*|\s+', pattern.strip())[0]
+    match = re.match(r'[a-zA-Z][\w-]*', first)
+    if not match:
+        return None
+    rest = first[match.end():]
+    parts = list(COMPOUND_PART.finditer(rest))
+    if ''.join(part.group(0) for part in parts) != rest:
+        return None
+    if not parts:
+        return match.group(0), None
+    name, operator, value = parts[0].groups()
+    if name:
+        return match.group(0), _word(name)
+    return match.group(0), {'*': re.escape(value), '^': '^' + re.escape(value),
+                            '~': _word(value), '': f'^{re.escape(value)}$'}[operator]
+
+def _roots_strainer(names, classes):
+    # Strainer keeping every tag of names whose class matches one of the
+    # classes; None in classes lets any class through
+    if None in classes:
+        return SoupStrainer(sorted(set(names)))
+    return SoupStrainer(sorted(set(names)), class_=re.compile('|'.join(sorted(set(classes)))))
+
+def _config_roots(config_fields, engine, domain):
+    # [(tag, class regex)] of the config selectors, None when one has no usable root
+    roots = []
+    for config_field in config_fields:
+        if not engine.has(domain, config_field):
+            continue
+        root = selector_root(engine.selectors(domain)[config_field].pattern)
+        if root is None:
+            return None
+        roots.append(root)
+    return roots
+
+def field_strainer(fields, engine=None, domain=TMDB_DOMAIN):
+    """
+    Returns a SoupStrainer building only the nodes the given fields are read from
+
+    Those are the FIELD_NODES of the built-in extractors plus the subtrees
+    the fields' config selectors start from, see selector_root; None (parse
+    everything) when a selector has no such subtree.
+    """
+    engine = engine if engine is not None else get_engine()
+    roots = _config_roots([config_field for field, config_field, _ in SELECTOR_FIELDS if field in fields],
+                          engine, domain)
+    if roots is None:
+        return None
+    roots += [(FIELD_NODES[field][0], _word(FIELD_NODES[field][1])) for field in fields]
+    return _roots_strainer([tag for tag, _ in roots], [classes for _, classes in roots])
+
+def restricted_strainer(engine=None, domain=TMDB_DOMAIN):
+    """
+    Returns the SoupStrainer of restricted parses
+
+    It builds the subtrees the built-in extractors read and the ones the
+    ROOT_MORE_FIELDS selectors of the domain start from; None (parse
+    everything) when a selector has no such subtree, see selector_root.
+    """
+    engine = engine if engine is not None else get_engine()
+    roots = _config_roots(ROOT_MORE_FIELDS, engine, domain)
+    if roots is None:
+        return None
+    return _roots_strainer(RESTRICTED_NAMES + [tag for tag, _ in roots],
+                           [RESTRICTED_CLASSES] + [classes for _, classes in roots])
+
+def _has_class(tag, name):
+    """
+    Mirrors BeautifulSoup's class_ matching for a single class name
+    """
+    classes = tag.get('class')
+    return bool(classes) and name in classes
+
+def _first(candidates, key, node):
+    if candidates[key] is None:
+        candidates[key] = node
+
+def collect_candidates(soup):
+    """
+    Walks the parsed page once and collects every node any extractor may read
+
+    The result holds, in document order, the same nodes the individual
+    soup.find / find_all calls of the extractors would return, so the
+    fallback methods only search inside small subtrees afterwards.
+
+    Args:
+        soup (BeautifulSoup): The parsed TMDb movie page
+
+    Returns:
+        dict: Candidate nodes keyed by what they are used for
+    """
+    candidates = {
+        'release_date': None,      # first span.release_date
+        'title_divs': [],          # div.title.ott_true
+        'poster': None,            # first img.poster
+        'genres': [],              # span.genres
+        'header_section': None,    # first section.header_poster_wrapper
+        'people_lists': [],        # ol.people
+        'facts_section': None,     # first section.facts
+        'director_strings': [],    # strings matching "Director"
+        'cast_headings': [],       # h3 whose string matches "Cast"
+        'profile_cards': [],       # div.profile
+        'cast_by_class': [],       # div/section with a class matching "cast"
+        'cast_by_id': [],          # div/section with an id matching "cast"
+        'scroller': None,          # first div.scroller
+        'runtime': None,           # first span.runtime
+        'score': None,             # first div.user_score_chart
+        'overview': None,          # first div.overview
+        'tagline': None,           # first h3.tagline
+    }
+
+    for node in soup.descendants:
+        if not isinstance(node, Tag):
+            if isinstance(node, NavigableString) and DIRECTOR_PATTERN.search(node):
+                candidates['director_strings'].append(node)
+            continue
+
+        name = node.name
+        if name == 'span':
+            if _has_class(node, 'release_date'):
+                _first(candidates, 'release_date', node)
+            if _has_class(node, 'genres'):
+                candidates['genres'].append(node)
+            if _has_class(node, 'runtime'):
+                _first(candidates, 'runtime', node)
+        elif name == 'div' or name == 'section':
+            classes = node.get('class') or []
+            if any(CAST_PATTERN.search(c) for c in classes):
+                candidates['cast_by_class'].append(node)
+            node_id = node.get('id')
+            if node_id and CAST_PATTERN.search(node_id):
+                candidates['cast_by_id'].append(node)
+            if name == 'div':
+                if 'title' in classes and 'ott_true' in classes:
+                    candidates['title_divs'].append(node)
+                if 'profile' in classes:
+                    candidates['profile_cards'].append(node)
+                if 'scroller' in classes:
+                    _first(candidates, 'scroller', node)
+                if 'user_score_chart' in classes:
+                    _first(candidates, 'score', node)
+                if 'overview' in classes:
+                    _first(candidates, 'overview', node)
+            else:
+                if 'header_poster_wrapper' in classes:
+                    _first(candidates, 'header_section', node)
+                if 'facts' in classes:
+                    _first(candidates, 'facts_section', node)
+        elif name == 'img':
+            if _has_class(node, 'poster'):
+                _first(candidates, 'poster', node)
+        elif name == 'ol':
+            if _has_class(node, 'people'):
+                candidates['people_lists'].append(node)
+        elif name == 'h3':
+            if _has_class(node, 'tagline'):
+                _first(candidates, 'tagline', node)
+            if node.string is not None and CAST_PATTERN.search(node.string):
+                candidates['cast_headings'].append(node)
+
+    return candidates
+
+def _section_of(node):
+    # The innermost of the TMDB_SECTIONS holding node (node included), None outside them
+    while node is not None:
+        if isinstance(node, Tag):
+            classes = node.get('class') or []
+            for section in TMDB_SECTIONS:
+                if node.name == section[0] and section[1] in classes:
+                    return section
+        node = node.parent
+    return None
+
+def candidate_sections(candidates, keys):
+    """
+    Returns the TMDB_SECTIONS holding the candidates under the given keys
+
+    None stands for a candidate outside them, and for a single-node
+    candidate (e.g. the first div.scroller) that was not found, since a
+    later part of the page may still hold it.
+    """
+    sections = set()
+    for key in keys:
+        nodes = candidates[key]
+        if isinstance(nodes, list):
+            sections.update(_section_of(node) for node in nodes)
+        else:
+            sections.add(_section_of(nodes))
+    return sections
+
+def _extract_title(candidates):
+    # Equivalent of soup.select_one("div.title.ott_true h2 a"): title divs
+    # are in document order, so the first one holding a match wins
+    for title_div in candidates['title_divs']:
+        link = title_div.select_one("h2 a")
+        if link:
+            return link
+    return None
+
+def _directors_from_header(candidates):
+    # Method 1: Look in the main content area for crew info
+    directors = []
+    crew_section = candidates['header_section']
+    if crew_section:
+        # Look for all paragraph elements that might contain director info
+        for p in crew_section.find_all('p'):
+            text = p.get_text(strip=True)
+            if 'Director' in text:
+                # Try to find the name in an anchor tag within this paragraph
+                director_link = p.find('a')
+                if director_link:
+                    directors.append(director_link.get_text(strip=True))
+    return directors
+
+def _directors_from_people_lists(candidates):
+    # Method 2: Look for crew information in lists
+    directors = []
+    for crew_list in candidates['people_lists']:
+        for item in crew_list.find_all('li'):
+            # Check if this item contains director information
+            paragraphs = item.find_all('p')
+            for p in paragraphs:
+                if 'Director' in p.get_text():
+                    # Look for the name in the same item
+                    name_link = item.find('a')
+                    if name_link:
+                        directors.append(name_link.get_text(strip=True))
+    return directors
+
+def _directors_from_facts(candidates):
+    # Method 3: Look for director in facts section
+    directors = []
+    facts_section = candidates['facts_section']
+    if facts_section:
+        for p in facts_section.find_all('p'):
+            text = p.get_text(strip=True)
+            if 'Director' in text:
+                # Extract everything after "Director"
+                director_name = text.split('Director')[-1].strip()
+                if director_name:
+                    directors.append(director_name)
+    return directors
+
+def _directors_from_strings(candidates):
+    # Method 4: Look for any element with director information
+    directors = []
+    for elem in candidates['director_strings']:
+        parent = elem.parent
+        if parent:
+            # Look for links in the parent or siblings
+            links = parent.find_all('a')
+            for link in links:
+                link_text = link.get_text(strip=True)
+                if link_text and link_text not in directors:
+                    directors.append(link_text)
+                    break
+    return directors
+
+DIRECTOR_METHODS = {
+    1: _directors_from_header,
+    2: _directors_from_people_lists,
+    3: _directors_from_facts,
+    4: _directors_from_strings,
+}
+
+# Candidates read by each method, see candidate_sections
+DIRECTOR_CANDIDATES = {
+    1: ('header_section',),
+    2: ('people_lists',),
+    3: ('facts_section',),
+    4: ('director_strings',),
+}
+
+def _extract_directors(candidates, attempts=None):
+    # Returns the directors and the number of the method that found them (0 for none)
+    return run_cascade('directors', DIRECTOR_METHODS, candidates, attempts)
+
+def _cast_from_scroller(candidates):
+    # Method 1: Look for cast in scroller sections with better filtering
+    cast_members = []
+    cast_scroller = candidates['scroller']
+    if cast_scroller:
+        cast_items = cast_scroller.find_all('div', class_='card')
+        for item in cast_items:
+            # Find actor name in the link
+            name_link = item.find('a')
+            if name_link:
+                actor_name = name_link.get_text(strip=True)
+                # Filter out navigation text and non-actor content
+                if (actor_name and
+                    len(actor_name) > 2 and
+                    actor_name.lower() not in CAST_NAV_TEXTS):
+                    cast_members.append(actor_name)
+    return cast_members
+
+def _cast_from_people_lists(candidates):
+    # Method 2: Look for cast in people lists with better filtering
+    cast_members = []
+    for people_list in candidates['people_lists']:
+        # Skip if this looks like crew (contains "Director" text)
+        list_text = people_list.get_text()
+        if 'Director' not in list_text:
+            for item in people_list.find_all('li'):
+                name_link = item.find('a')
+                if name_link:
+                    actor_name = name_link.get_text(strip=True)
+                    # Better filtering for actor names
+                    if (actor_name and
+                        len(actor_name) > 2 and
+                        not any(word in actor_name.lower() for word in PEOPLE_NAV_WORDS)):
+                        cast_members.append(actor_name)
+    return cast_members
+
+def _cast_from_headings(candidates):
+    # Method 3: Look for specific cast section with h3 "Cast" heading
+    cast_members = []
+    for heading in candidates['cast_headings']:
+        # Look for the next sibling that contains cast information
+        next_section = heading.find_next_sibling()
+        if next_section:
+            links = next_section.find_all('a')
+            for link in links:
+                actor_name = link.get_text(strip=True)
+                # Filter out non-actor content
+                if (actor_name and
+                    len(actor_name) > 2 and
+                    not any(word in actor_name.lower() for word in CAST_NAV_WORDS)):
+                    cast_members.append(actor_name)
+    return cast_members
+
+def _cast_from_profile_cards(candidates):
+    # Method 4: Look for profile cards specifically
+    cast_members = []
+    for card in candidates['profile_cards']:
+        name_link = card.find('a')
+        if name_link:
+            actor_name = name_link.get_text(strip=True)
+            # Check if this is in a cast context (not crew)
+            card_text = card.get_text().lower()
+            if ('director' not in card_text and
+                'producer' not in card_text and
+                actor_name and
+                len(actor_name) > 2 and
+                not any(word in actor_name.lower() for word in CAST_NAV_WORDS)):
+                cast_members.append(actor_name)
+    return cast_members
+
+def _cast_from_cast_sections(candidates):
+    # Method 5: Look for cast member names in any section with "cast" in the class or id
+    cast_members = []
+    cast_sections = candidates['cast_by_class'] + candidates['cast_by_id']
+
+    for section in cast_sections:
+        # Look for person names (typically in <a> tags)
+        links = section.find_all('a')
+        for link in links:
+            # Check if the link has an href that looks like a person URL
+            href = link.get('href', '')
+            if '/person/' in href:
+                actor_name = link.get_text(strip=True)
+                if (actor_name and
+                    len(actor_name) > 2 and
+                    not any(word in actor_name.lower() for word in CAST_NAV_WORDS)):
+                    cast_members.append(actor_name)
+    return cast_members
+
+CAST_METHODS = {
+    1: _cast_from_scroller,
+    2: _cast_from_people_lists,
+    3: _cast_from_headings,
+    4: _cast_from_profile_cards,
+    5: _cast_from_cast_sections,
+}
+
+# Candidates read by each method, see candidate_sections
+CAST_CANDIDATES = {
+    1: ('scroller',),
+    2: ('people_lists',),
+    3: ('cast_headings',),
+    4: ('profile_cards',),
+    5: ('cast_by_class', 'cast_by_id'),
+}
+
+def _extract_cast(candidates, attempts=None):
+    # Returns the cast and the number of the method that found it (0 for none)
+    return run_cascade('cast', CAST_METHODS, candidates, attempts)
+
+def _release_date(candidates, movie_data, methods):
+    release_date_element = candidates['release_date']
+    if release_date_element:
+        movie_data['release_date'] = re.sub(r'[()]', '', release_date_element.get_text(strip=True))
+    else:
+        movie_data['release_date'] = None
+
+def _title(candidates, movie_data, methods):
+    movie_title_element = _extract_title(candidates)
+    movie_data['original_title'] = movie_title_element.get_text(strip=True) if movie_title_element else "N/A"
+
+def _poster(candidates, movie_data, methods):
+    poster_element = candidates['poster']
+    if poster_element and poster_element.get('src'):
+        # Convert relative URL to absolute URL
+        movie_data['poster_url'] = urljoin('https://www.themoviedb.org', poster_element['src'])
+    else:
+        movie_data['poster_url'] = None
+
+def _genres(candidates, movie_data, methods):
+    genres = []
+    for genre_span in candidates['genres']:
+        for link in genre_span.find_all('a'):
+            genre_name = link.get_text(strip=True)
+            if genre_name: # Ensure the text is not empty
+                genres.append(genre_name)
+    movie_data['genres'] = genres
+
+def _record_sections(candidates, methods, field, method_candidates):
+    # Sections read by every method up to the winner, in fixed priority order:
+    # the ones that failed before it decide the result as much as the winner
+    if 'sections' not in methods:
+        return
+    winner = methods[field] or max(method_candidates)
+    keys = [key for number in sorted(method_candidates) if number <= winner for key in method_candidates[number]]
+    methods['sections'][field] = candidate_sections(candidates, keys)
+
+def _directors(candidates, movie_data, methods):
+    movie_data['directors'], methods['directors'] = _extract_directors(candidates, methods.get('attempts'))
+    _record_sections(candidates, methods, 'directors', DIRECTOR_CANDIDATES)
+
+def _cast(candidates, movie_data, methods):
+    movie_data['cast'], methods['cast'] = _extract_cast(candidates, methods.get('attempts'))
+    _record_sections(candidates, methods, 'cast', CAST_CANDIDATES)
+
+def _runtime(candidates, movie_data, methods):
+    runtime_element = candidates['runtime']
+    movie_data['runtime'] = runtime_element.get_text(strip=True) if runtime_element else None
+
+def _score(candidates, movie_data, methods):
+    # Left unset when the chart has no percentage
+    score_element = candidates['score']
+    if score_element:
+        score_text = score_element.get('data-percent')
+        if score_text:
+            movie_data['user_score'] = f"{score_text}%"
+    else:
+        movie_data['user_score'] = None
+
+def _overview(candidates, movie_data, methods):
+    # Left unset when the block has no paragraph
+    overview_element = candidates['overview']
+    if overview_element:
+        overview_text = overview_element.find('p')
+        if overview_text:
+            movie_data['overview'] = overview_text.get_text(strip=True)
+    else:
+        movie_data['overview'] = None
+
+def _tagline(candidates, movie_data, methods):
+    tagline_element = candidates['tagline']
+    movie_data['tagline'] = tagline_element.get_text(strip=True) if tagline_element else None
+
+# (movie_data field, field_seconds label, extractor), in extraction order
+FIELD_EXTRACTORS = [
+    ('release_date', 'release_date', _release_date),
+    ('original_title', 'title', _title),
+    ('poster_url', 'poster', _poster),
+    ('genres', 'genres', _genres),
+    ('directors', 'directors', _directors),
+    ('cast', 'cast', _cast),
+    ('runtime', 'runtime', _runtime),
+    ('user_score', 'score', _score),
+    ('overview', 'overview', _overview),
+    ('tagline', 'tagline', _tagline),
+]
+FIELDS = [field for field, _, _ in FIELD_EXTRACTORS]
+
+def _selected_text(element):
+    return element.get_text(strip=True) or None
+
+def _selected_year(element):
+    return re.sub(r'[()]', '', element.get_text(strip=True)) or None
+
+def _selected_score(element):
+    score_text = element.get('data-percent')
+    return f"{score_text}%" if score_text else None
+
+# Movie fields read with the "more" selectors of ai-tool-scraper-config.json:
+# (movie_data field, config field, value of the first match); genres take every match
+SELECTOR_FIELDS = [
+    ('original_title', 'title_dom', _selected_text),
+    ('release_date', 'year_dom', _selected_year),
+    ('genres', 'genre_dom', None),
+    ('runtime', 'runtime_dom', _selected_text),
+    ('user_score', 'score_dom', _selected_score),
+    ('overview', 'overview_dom', _selected_text),
+    ('tagline', 'tagline_dom', _selected_text),
+]
+
+# "more" selectors applied to the whole page; the other ones (crew_name_dom,
+# fact_label_dom, ...) are applied inside the matches of crew_dom, cast_dom and facts_dom
+ROOT_MORE_FIELDS = [config_field for _, config_field, _ in SELECTOR_FIELDS] + ['crew_dom', 'cast_dom', 'facts_dom']
+
+def select_movie_fields(soup, skip=(), engine=None, domain=TMDB_DOMAIN):
+    """
+    Reads movie fields with the domain's "more" selectors
+
+    Args:
+        soup (BeautifulSoup): The parsed TMDb movie page
+        skip (iterable): Fields not to look up, e.g. the ones found in the head
+        engine (SelectorEngine): Selector engine, None for the shared one
+        domain (str): Config domain whose "more" block holds the selectors
+
+    Returns:
+        dict: The fields whose selector matched, formatted like extract_movie_data's;
+              the others are left to the built-in extractors
+    """
+    engine = engine if engine is not None else get_engine()
+    selected = {}
+    for field, config_field, value in SELECTOR_FIELDS:
+        if field in skip or not engine.has(domain, config_field):
+            continue
+        if value is None:
+            names = [link.get_text(strip=True) for link in engine.select(domain, config_field, soup)]
+            names = [name for name in names if name]
+            if names:
+                selected[field] = names
+            continue
+        element = engine.select_one(domain, config_field, soup)
+        found = value(element) if element is not None else None
+        if found is not None:
+            selected[field] = found
+    return selected
+
+def extract_movie_data(soup, methods=None, known=None):
+    """
+    Extracts every movie field from a parsed TMDb page in a single traversal
+
+    Args:
+        soup (BeautifulSoup): The parsed TMDb movie page
+        methods (dict): Optional dict receiving the number of the fallback
+                        method that produced 'directors' and 'cast' (0 for none,
+                        HEAD_METHOD when they came from the document head);
+                        a list under 'attempts' receives every method tried,
+                        see method_stats.MethodStats.record; a dict under
+                        'sections' receives the TMDB_SECTIONS the methods up
+                        to the winner read, see candidate_sections
+        known (dict): Fields already found, e.g. by head_movie_data; their
+                      extractors are skipped
+
+    The fields of SELECTOR_FIELDS missing from known are then read with the
+    config's "more" selectors; the built-in extractors below only fill in
+    the fields the selectors do not match.
+
+    Returns:
+        dict: movie_data with release_date, original_title, poster_url, genres,
+              directors, cast, runtime, user_score, overview and tagline
+    """
+    methods = methods if methods is not None else {}
+    known = dict(known or {})
+    lap = metrics.laps('field_seconds', 'field')
+    known.update(select_movie_fields(soup, skip=known))
+    lap('selectors')
+    candidates = collect_candidates(soup)
+    lap('candidates')
+    movie_data = {}
+
+    for field, label, extract in FIELD_EXTRACTORS:
+        if field in known:
+            movie_data[field] = known[field]
+            if field in ('directors', 'cast'):
+                methods[field] = HEAD_METHOD
+                if 'sections' in methods:
+                    methods['sections'][field] = set()
+            continue
+        extract(candidates, movie_data, methods)
+        lap(label)
+
+    return movie_data
+
+class MovieRecord:
+    """
+    Compact form of the per-movie record saved in MediaCollection
+
+    One slotted object instead of the movie_data dict plus the nested
+    {TitleYear: record} dict: lists are stored as tuples and names are
+    interned, so genres and people shared by many movies are stored once.
+    Records waiting between pipeline stages are kept in this form and only
+    turned into JSON data when written.
+    """
+
+    __slots__ = ('key', 'number', 'name', 'year', 'img', 'theme', 'author', 'cast', 'length', 'score',
+                 'overview', 'tagline', 'url')
+
+    # Record fields, in the order of the saved JSON
+    FIELDS = __slots__[1:]
+
+    def __init__(self, key, **fields):
+        self.key = key
+        for field in self.FIELDS:
+            setattr(self, field, fields.get(field))
+
+    @classmethod
+    def from_movie_data(cls, movie_data, url, number=None):
+        """
+        Builds the record of a movie from movie_data
+
+        Args:
+            movie_data (dict): Fields as returned by extract_movie_data
+            url (str): The scraped page URL
+            number (int): Movie number assigned by the catalog, None without a catalog
+
+        Raises:
+            TypeError: When the page has no release date
+            KeyError: When the score or overview block is present but empty
+        """
+        movie_title = movie_data['original_title']
+        json_title = re.sub(r'[^a-zA-Z0-9]', '', movie_title) + re.sub(r'[()]', '', movie_data['release_date'])
+        return cls(json_title,
+                   number=number,
+                   name=movie_title,
+                   year=movie_data['release_date'],
+                   img=movie_data['poster_url'],
+                   theme=tuple(sys.intern(genre) for genre in movie_data['genres']),
+                   author=tuple(sys.intern(name) for name in movie_data['directors']),
+                   cast=tuple(sys.intern(name) for name in movie_data['cast']),
+                   length=movie_data['runtime'],
+                   score=movie_data['user_score'],
+                   overview=movie_data['overview'],
+                   tagline=movie_data['tagline'],
+                   url=url)
+
+    def to_json_data(self):
+        """
+        Returns {TitleYear: record}, as returned by scrape_movie_data
+        """
+        record = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            record[field] = list(value) if isinstance(value, tuple) else value
+        return {self.key: record}
+
+def build_json_data(movie_data, url, number=None):
+    """
+    Builds the per-movie record saved in MediaCollection from movie_data
+
+    Args:
+        movie_data (dict): Fields as returned by extract_movie_data
+        url (str): The scraped page URL
+        number (int): Movie number assigned by the catalog, None without a catalog
+
+    Returns:
+        dict: {TitleYear: record}, as returned by scrape_movie_data
+
+    Raises:
+        TypeError: When the page has no release date
+        KeyError: When the score or overview block is present but empty
+    """
+    return MovieRecord.from_movie_data(movie_data, url, number).to_json_data()
+
+def _parse_and_extract(content, backend, parse_only, methods, known):
+    # The tree is decomposed as soon as the fields are out: that breaks its
+    # parent/child reference cycles, so it is freed right away instead of
+    # waiting for a full garbage collection. Extracted values are plain str.
+    with metrics.timer('stage_seconds', stage='parse'):
+        soup = make_soup(content, backend, parse_only=parse_only)
+    try:
+        with metrics.timer('stage_seconds', stage='extract'):
+            return extract_movie_data(soup, methods, known)
+    finally:
+        soup.decompose()
+
+def parse_movie_tree(content, backend=None, restricted=False, methods=None, known=None):
+    """
+    Parses a TMDb movie page and extracts movie_data, keeping the tree for further selectors
+
+    In restricted mode only the subtrees matched by restricted_strainer are
+    built; the page is parsed again in full when the directors or cast came
+    from a fallback method reading outside them, as in parse_movie_page.
+
+    Args:
+        content (bytes or str): The HTML document
+        backend (str): Parser backend, see parser_backend.BACKENDS
+        restricted (bool): Build only the subtrees the extractors read
+        methods (dict): Optional dict receiving the fallback methods, see extract_movie_data
+        known (dict): Fields already read from the document head
+
+    Returns:
+        tuple: (movie_data, parsed page); call decompose() on the page once done
+    """
+    methods = methods if methods is not None else {}
+    if restricted:
+        with metrics.timer('stage_seconds', stage='parse'):
+            soup = make_soup(content, backend, parse_only=restricted_strainer())
+        with metrics.timer('stage_seconds', stage='extract'):
+            movie_data = extract_movie_data(soup, methods, known)
+        if (methods['directors'] in RESTRICTED_DIRECTOR_METHODS and
+            methods['cast'] in RESTRICTED_CAST_METHODS):
+            return movie_data, soup
+        soup.decompose()
+
+    with metrics.timer('stage_seconds', stage='parse'):
+        soup = make_soup(content, backend)
+    with metrics.timer('stage_seconds', stage='extract'):
+        movie_data = extract_movie_data(soup, methods, known)
+    return movie_data, soup
+
+def parse_movie_page(content, backend=None, restricted=False, methods=None, structured=True):
+    """
+    Parses a TMDb movie page and extracts movie_data
+
+    The document head is read first: fields found in its JSON-LD and
+    OpenGraph tags are taken from there and the DOM is only searched for the
+    rest. When directors and cast are among the fields found, only the nodes
+    of the missing fields are built, at least the tagline, which the head
+    never holds.
+
+    In restricted mode only the subtrees matched by restricted_strainer are
+    built. When the directors or cast could only come from a fallback method
+    that reads outside those subtrees, the page is parsed again in full, so
+    the result is the same as an unrestricted parse.
+
+    Args:
+        content (bytes or str): The HTML document
+        backend (str): Parser backend, see parser_backend.BACKENDS
+        restricted (bool): Build only the subtrees the extractors read
+        methods (dict): Optional dict receiving the fallback methods, see extract_movie_data
+        structured (bool): Read the fields of the document head before the DOM
+
+    Returns:
+        dict: movie_data as returned by extract_movie_data
+    """
+    methods = methods if methods is not None else {}
+    known = {}
+    if structured:
+        with metrics.timer('stage_seconds', stage='head'):
+            known = head_movie_data(content)
+        if 'directors' in known and 'cast' in known:
+            missing = [field for field in FIELDS if field not in known]
+            return _parse_and_extract(content, backend, field_strainer(missing), methods, known)
+
+    if restricted:
+        movie_data = _parse_and_extract(content, backend, restricted_strainer(), methods, known)
+        if (methods['directors'] in RESTRICTED_DIRECTOR_METHODS and
+            methods['cast'] in RESTRICTED_CAST_METHODS):
+            return movie_data
+
+    return _parse_and_extract(content, backend, None, methods, known)
@@ -0,0 +1,176 @@
+import requests
+
+from scrape_metrics import metrics
+from selector_engine import get_engine
+from streaming_fetch import stream_movie_tree
+from structured_data import head_movie_data
+from tmdb_extract import TMDB_DOMAIN, parse_movie_tree
+
+# Set up headers to mimic a real browser request and force English language
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9'
+}
+
+# Fact labels of the page and the record field holding them
+FACT_FIELDS = {
+    'Status': 'status',
+    'Original Language': 'original_language',
+    'Budget': 'budget',
+    'Revenue': 'revenue',
+}
+
+# Crew jobs counted as writers
+WRITER_JOBS = ('Writer', 'Screenplay', 'Novel')
+
+def english_url(url):
+    """
+    Adds the language parameter forcing English to a TMDb URL
+    """
+    if '?' in url:
+        return url + '&language=en-US'
+    return url + '?language=en-US'
+
+def unenglish_url(url):
+    """
+    Removes the language parameter added by english_url, giving back the URL it was given
+    """
+    for suffix in ('?language=en-US', '&language=en-US'):
+        if url.endswith(suffix):
+            return url[:-len(suffix)]
+    return url
+
+def extract_details(soup, engine=None, domain=TMDB_DOMAIN):
+    """
+    Extracts crew, cast characters and facts with the domain's "more" selectors
+
+    Args:
+        soup (BeautifulSoup): The parsed TMDb movie page
+        engine (SelectorEngine): Selector engine, None for the shared one
+        domain (str): Config domain whose "more" block holds the selectors
+
+    Returns:
+        dict: crew ([{name, job}]), writers, characters ([{actor, character}]),
+              status, original_language, budget and revenue (None when missing)
+    """
+    engine = engine if engine is not None else get_engine()
+    details = {'crew': [], 'writers': [], 'characters': []}
+    details.update({field: None for field in FACT_FIELDS.values()})
+    if not engine.more_fields(domain):
+        return details
+
+    ### CREW
+    for crew_member in engine.select(domain, "crew_dom", soup):
+        name_element = engine.select_one(domain, "crew_name_dom", crew_member)
+        job_element = engine.select_one(domain, "crew_job_dom", crew_member) # They use 'character' for job in this context
+
+        name = name_element.get_text(strip=True) if name_element else "N/A"
+        job = job_element.get_text(strip=True) if job_element else "N/A"
+
+        details['crew'].append({"name": name, "job": job})
+    details['writers'] = [c["name"] for c in details['crew'] if any(job in c["job"] for job in WRITER_JOBS)]
+
+    ### CAST
+    for cast_member in engine.select(domain, "cast_dom", soup):
+        name_element = engine.select_one(domain, "cast_name_dom", cast_member)
+        character_element = engine.select_one(domain, "cast_character_dom", cast_member)
+
+        actor_name = name_element.get_text(strip=True) if name_element else "N/A"
+        character_name = character_element.get_text(strip=True) if character_element else "N/A"
+
+        details['characters'].append({"actor": actor_name, "character": character_name})
+
+    ### FACTS
+    for item in engine.select(domain, "facts_dom", soup):
+        label_element = engine.select_one(domain, "fact_label_dom", item)
+        if label_element:
+            label = label_element.get_text(strip=True).replace(':', '')
+            if label in FACT_FIELDS:
+                # Get the text directly after the strong tag, skipping any other tags
+                details[FACT_FIELDS[label]] = ''.join(item.find_all(string=True, recursive=False)[1:]).strip()
+
+    return details
+
+def scrape_movie_page(url, session=None, backend=None, methods=None, restricted=False, stream=False):
+    """
+    Fetches and parses a TMDb movie page once and extracts every field either script uses
+
+    The record holds the movie_data fields of tmdb_scraper (head data first,
+    then the DOM extractors) plus the crew, characters and facts printed by
+    ai_tool_scraper2, so each script's output can be built from it.
+
+    Args:
+        url (str): The TMDb movie page URL, without the language parameter
+        session (requests.Session or HttpCache): Optional session, e.g. the HTTP cache
+        backend (str): Parser backend, None for the fastest one installed
+        methods (dict): Optional dict receiving the fallback methods, see extract_movie_data
+        restricted (bool): Only build the page subtrees the extractors and the
+                           "more" selectors read; the page is parsed in full
+                           when the crew, cast and facts are not among them
+        stream (bool): Stop reading the page once the sections holding every
+                       field have been received
+
+    Returns:
+        tuple: (record, parsed page), the page for any further selectors;
+               call decompose() on it once done, to free it right away
+
+    Raises:
+        requests.RequestException: When the page cannot be fetched
+    """
+    methods = methods if methods is not None else {}
+    http = session if session is not None else requests
+    with metrics.timer('stage_seconds', stage='fetch'):
+        response = http.get(english_url(url), headers=HEADERS, stream=stream)
+    response.raise_for_status()
+
+    def parse(content):
+        with metrics.timer('stage_seconds', stage='head'):
+            known = head_movie_data(content)
+        record, soup = parse_movie_tree(content, backend, restricted, methods, known)
+        with metrics.timer('stage_seconds', stage='extract'):
+            details = extract_details(soup)
+        if restricted and not _has_details(details):
+            # The "more" selectors read outside the restricted subtrees
+            soup.decompose()
+            record, soup = parse_movie_tree(content, backend, False, methods, known)
+            with metrics.timer('stage_seconds', stage='extract'):
+                details = extract_details(soup)
+        record.update(details)
+        return record, soup
+
+    if stream:
+        return stream_movie_tree(response, parse, methods)
+    metrics.count('bytes_in_total', len(response.content), kind='page')
+    return parse(response.content)
+
+def _has_details(details):
+    return bool(details['crew'] or details['characters'] or
+                any(details[field] is not None for field in FACT_FIELDS.values()))
+
+def print_details(record):
+    """
+    Prints a record the way ai_tool_scraper2 reports TMDb pages
+    """
+    print("title: ", record['original_title'])
+    print("year: ", record['release_date'])
+    print("score: ", record.get('user_score'))
+    print(f"Genres: {', '.join(record['genres']) if record['genres'] else 'N/A'}")
+    print("tagline: ", record['tagline'])
+    print("runtime: ", record['runtime'])
+    print("overview: ", record.get('overview'))
+
+    print(f"Director(s): {', '.join(record['directors']) if record['directors'] else 'N/A'}")
+    print(f"Writer(s): {', '.join(record['writers']) if record['writers'] else 'N/A'}")
+
+    cast_list = record['characters']
+    print("\nTop Billed Cast:")
+    for i, actor in enumerate(cast_list[:5]): # Print top 5 for brevity
+        print(f"- {actor['actor']} as {actor['character']}")
+        if i == 4 and len(cast_list) > 5:
+            print(f"... and {len(cast_list) - 5} more cast members.")
+
+    print("\nMovie Facts:")
+    print(f"Status: {record['status'] or 'N/A'}")
+    print(f"Original Language: {record['original_language'] or 'N/A'}")
+    print(f"Budget: {record['budget'] or 'N/A'}")
+    print(f"Revenue: {record['revenue'] or 'N/A'}")
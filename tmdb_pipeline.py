@@ -0,0 +1,310 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from http_cache import HttpCache
+from memory_guard import MemoryGuard
+from method_stats import STATS_NAME, method_stats
+from mirror_server import MirrorSession
+from movie_catalog import MovieCatalog, url_key
+from parser_backend import available_backends
+from rate_control import ControlledSession, RequestController, find_controller
+from scrape_metrics import metrics
+from tmdb_scraper import (DOWNLOAD_FOLDER, HEADERS, HostLimiter, english_url, extract_record, make_downloader,
+                          make_session, read_batch_urls, save_movie, write_metrics)
+
+# Marks the end of the input of a stage
+DONE = None
+
+class QueueMonitor(threading.Thread):
+    """
+    Samples the depth of the pipeline queues at a fixed interval
+    """
+
+    def __init__(self, queues, interval=0.1, report_every=None):
+        super().__init__(daemon=True)
+        self.queues = queues
+        self.interval = interval
+        self.report_every = report_every
+        self.stopped = threading.Event()
+
+    def run(self):
+        last_report = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            depths = {name: q.qsize() for name, q in self.queues.items()}
+            for name, depth in depths.items():
+                metrics.observe('queue_depth', depth, queue=name)
+            if self.report_every and time.perf_counter() - last_report >= self.report_every:
+                last_report = time.perf_counter()
+                print("queue depth: " + ", ".join(f"{name} {depth}/{self.queues[name].maxsize}"
+                                                  for name, depth in depths.items()))
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def summary(self):
+        """
+        Returns the average and maximum depth of every queue
+        """
+        lines = ["queue depth:"]
+        for timer in metrics.to_dict()['timers']:
+            if timer['name'] == 'queue_depth':
+                name = timer['labels']['queue']
+                lines.append(f"  {name:<10} avg {timer['sum'] / timer['count']:>6.1f}, "
+                             f"max {timer['max']:>4.0f} of {self.queues[name].maxsize}")
+        return '\n'.join(lines)
+
+def run_pipeline(urls, download_folder, fetchers=8, parsers=None, writers=4, per_host=4, queue_size=16,
+                 backend=None, restricted=False, session=None, chunk_size=64 * 1024, catalog=None, refresh=False,
+                 quiet=False, report_every=None, memory=None):
+    """
+    Scrapes many movie pages with I/O and parsing in separate stages
+
+    Fetcher threads download raw page bytes, parse workers in a process pool
+    extract the records (so BeautifulSoup runs on every core instead of
+    contending for the GIL) and writer threads download the posters and save
+    the JSON files. Stages are connected by bounded queues, so a slow stage
+    holds back the ones feeding it instead of piling pages up in memory.
+
+    Args:
+        urls (list): TMDb movie page URLs
+        download_folder (str): Destination folder for JSON files and posters
+        fetchers (int): Number of page fetching threads
+        parsers (int): Number of parse processes, None for one per core
+        writers (int): Number of poster and JSON writing threads
+        per_host (int): Maximum concurrent requests against a single host
+        queue_size (int): Capacity of each queue between stages
+        backend (str): Parser backend, None for the fastest one installed
+        restricted (bool): Only build the page subtrees the extractors read
+        session (requests.Session or HttpCache): Shared session, None for a new pooled one
+        chunk_size (int): Poster download chunk size in bytes
+        catalog (MovieCatalog): Optional catalog receiving every record
+        refresh (bool): Scrape URLs already in the catalog again
+        quiet (bool): Only print errors and the final summary
+        report_every (float): Seconds between queue depth reports, None for none
+        memory (MemoryGuard): Hold back fetching while the process is over its RSS budget
+
+    Returns:
+        tuple: (number of movies saved, list of failed URLs)
+    """
+    if catalog is not None and not refresh:
+        known = catalog.known_urls()
+        skipped = len(urls)
+        urls = [url for url in urls if url_key(url) not in known]
+        skipped -= len(urls)
+        if skipped:
+            print(f"Skipping {skipped} URLs already in the catalog")
+
+    parsers = parsers or os.cpu_count() or 1
+    own_session = session is None
+    if own_session:
+        session = make_session(pool_size=fetchers + writers, controller=RequestController(per_host))
+    limiter = HostLimiter(per_host)
+    downloader = make_downloader(download_folder, session, chunk_size)
+
+    url_queue = queue.Queue()
+    parse_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+    for url in urls:
+        url_queue.put(url)
+    for _ in range(fetchers):
+        url_queue.put(DONE)
+
+    lock = threading.Lock()
+    saved = 0
+    failed = []
+
+    def fail(url, message):
+        print(message)
+        metrics.count('movies_total', result='failed')
+        with lock:
+            failed.append(url)
+        if memory is not None:
+            memory.done()
+
+    def fetch():
+        while True:
+            url = url_queue.get()
+            if url is DONE:
+                return
+            if memory is not None:
+                memory.wait()
+            page_url = english_url(url)
+            try:
+                with limiter.slot(url), metrics.timer('stage_seconds', stage='fetch'):
+                    response = session.get(page_url, headers=HEADERS)
+                response.raise_for_status()
+            except Exception as e:
+                # Not only RequestException: any failure must count the URL and free its memory slot
+                fail(url, f"Error fetching the webpage: {e}")
+                continue
+            metrics.count('bytes_in_total', len(response.content), kind='page')
+            parse_queue.put((url, page_url, response.content))
+
+    def parse(pool):
+        while True:
+            item = parse_queue.get()
+            if item is DONE:
+                return
+            url, page_url, content = item
+            try:
+                with metrics.timer('stage_seconds', stage='parse_wait'):
+                    record, worker_metrics, attempts = pool.submit(extract_record, content, page_url, backend,
+                                                                   restricted, method_stats.path).result()
+            except Exception as e:
+                fail(url, f"Error parsing the webpage: {e}")
+                continue
+            metrics.merge(worker_metrics)
+            method_stats.merge(attempts)
+            if not quiet:
+                print(f"Movie Title: {record.name}")
+            write_queue.put((url, record))
+
+    def write():
+        nonlocal saved
+        while True:
+            item = write_queue.get()
+            if item is DONE:
+                return
+            url, record = item
+            movie_data = record.to_json_data()
+            firstkey = list(movie_data.keys())
+            try:
+                with limiter.slot(movie_data[firstkey[0]]['img'] or ''):
+                    save_movie(movie_data, download_folder, session, downloader, catalog, quiet)
+            except Exception as e:
+                fail(url, f"Error processing {url}: {e}")
+                continue
+            metrics.count('movies_total', result='saved')
+            with lock:
+                saved += 1
+            if memory is not None:
+                memory.done()
+
+    monitor = QueueMonitor({'parse': parse_queue, 'write': write_queue}, report_every=report_every)
+    start = time.perf_counter()
+    monitor.start()
+    try:
+        # Worker processes are spawned rather than forked: forking while the
+        # fetcher threads hold locks could deadlock the children
+        with ProcessPoolExecutor(max_workers=parsers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            fetch_threads = [threading.Thread(target=fetch) for _ in range(fetchers)]
+            # One feeder thread per parse process keeps every process busy
+            parse_threads = [threading.Thread(target=parse, args=(pool,)) for _ in range(parsers)]
+            write_threads = [threading.Thread(target=write) for _ in range(writers)]
+            for thread in fetch_threads + parse_threads + write_threads:
+                thread.start()
+
+            # Shut the stages down in order, each once the one feeding it is done
+            for thread in fetch_threads:
+                thread.join()
+            for _ in parse_threads:
+                parse_queue.put(DONE)
+            for thread in parse_threads:
+                thread.join()
+            for _ in write_threads:
+                write_queue.put(DONE)
+            for thread in write_threads:
+                thread.join()
+    finally:
+        monitor.stop()
+        downloader.save()
+    if own_session:
+        session.close()
+
+    elapsed = time.perf_counter() - start
+    rate = len(urls) / elapsed if elapsed > 0 else 0.0
+    print(f"\nPipeline completed: {saved} saved, {len(failed)} failed, {elapsed:.1f}s ({rate:.2f} movies/s) "
+          f"with {fetchers} fetchers, {parsers} parse processes, {writers} writers")
+    for url in failed:
+        print(f"  failed: {url}")
+    print(downloader.summary())
+    if isinstance(session, HttpCache):
+        print(session.stats())
+    controller = find_controller(session)
+    if controller is not None:
+        print(controller.summary())
+    print(metrics.summary())
+    if method_stats.adaptive:
+        print(method_stats.summary())
+    print(monitor.summary())
+    if memory is not None:
+        print(memory.summary())
+    return saved, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape a batch of TMDb movie pages with pipelined fetch, parse and write stages.")
+    parser.add_argument('batch', help="File listing the movie URLs, one per line ('-' for stdin).")
+    parser.add_argument('--output', default=DOWNLOAD_FOLDER,
+                        help="Folder where JSON files and posters are saved.")
+    parser.add_argument('--fetchers', type=int, default=8,
+                        help="Number of page fetching threads.")
+    parser.add_argument('--parsers', type=int, default=None,
+                        help="Number of parse processes. Defaults to one per core.")
+    parser.add_argument('--writers', type=int, default=4,
+                        help="Number of poster and JSON writing threads.")
+    parser.add_argument('--per-host', type=int, default=4,
+                        help="Maximum concurrent requests against a single host.")
+    parser.add_argument('--queue-size', type=int, default=16,
+                        help="Capacity of the queues between stages.")
+    parser.add_argument('--report-every', type=float, default=None, metavar='SECONDS',
+                        help="Print the queue depths periodically.")
+    parser.add_argument('--parser', choices=available_backends(), default=None,
+                        help="HTML parser backend. Defaults to the fastest one installed.")
+    parser.add_argument('--restricted', action='store_true',
+                        help="Only build the page subtrees the extractors read.")
+    parser.add_argument('--adaptive-fallback', action='store_true',
+                        help="Skip the director and cast fallback methods that have not matched in the last "
+                             "pages (rates kept in .fallback_stats.json).")
+    parser.add_argument('--quiet', action='store_true',
+                        help="Do not print every scraped movie, only errors and the summary.")
+    parser.add_argument('--memory-budget', type=int, metavar='MB',
+                        help="Hold back fetching while the RSS of the main process is over MB.")
+    parser.add_argument('--trace-memory', type=int, default=0, metavar='N',
+                        help="With --memory-budget, trace allocations and report the N top allocating lines.")
+    parser.add_argument('--metrics-json', metavar='FILE',
+                        help="Write stage and field timings, fallback method counts and byte counts as JSON.")
+    parser.add_argument('--metrics-prom', metavar='FILE',
+                        help="Write the same metrics in the Prometheus text format.")
+    parser.add_argument('--catalog', metavar='DB',
+                        help="SQLite catalog assigning movie numbers; URLs already in it are skipped.")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Scrape URLs already in the catalog again.")
+    parser.add_argument('--chunk-size', type=int, default=64,
+                        help="Poster download chunk size in KB.")
+    parser.add_argument('--cache', metavar='DIR',
+                        help="Cache pages in DIR and revalidate them with ETag / If-Modified-Since.")
+    parser.add_argument('--mirror', metavar='BASE_URL',
+                        help="Send every request to a local mirror_server.py instead of the real site.")
+    args = parser.parse_args()
+
+    urls = read_batch_urls(args.batch)
+    method_stats.adaptive = args.adaptive_fallback
+    method_stats.load(os.path.join(args.output, STATS_NAME))
+    if args.mirror:
+        session = ControlledSession(MirrorSession(args.mirror), RequestController(args.per_host))
+    else:
+        session = make_session(pool_size=args.fetchers + args.writers, cache_dir=args.cache,
+                               controller=RequestController(args.per_host))
+    catalog = MovieCatalog(args.catalog) if args.catalog else None
+    print(f"Scraping {len(urls)} movies from TMDb...")
+    try:
+        run_pipeline(urls, args.output, fetchers=args.fetchers, parsers=args.parsers, writers=args.writers,
+                     per_host=args.per_host, queue_size=args.queue_size, backend=args.parser,
+                     restricted=args.restricted, session=session, chunk_size=args.chunk_size * 1024,
+                     catalog=catalog, refresh=args.refresh, quiet=args.quiet, report_every=args.report_every,
+                     memory=MemoryGuard(args.memory_budget, args.trace_memory) if args.memory_budget else None)
+    finally:
+        session.close()
+        if catalog is not None:
+            catalog.close()
+        method_stats.save()
+    write_metrics(args.metrics_json, args.metrics_prom)
+
+if __name__ == "__main__":
+    main()
@@ -1,311 +1,122 @@
 import requests
-from bs4 import BeautifulSoup
 import json
 import argparse # Import the argparse module
-import re
+import multiprocessing
 import os
-import mimetypes
-from urllib.parse import urljoin
-
-def scrape_movie_data(url):
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from http_cache import HttpCache
+from method_stats import STATS_NAME, method_stats
+from movie_catalog import MovieCatalog, url_key
+from parser_backend import available_backends
+from poster_downloader import PosterDownloader
+from rate_control import ControlledSession, RequestController, find_controller
+from response_archive import ArchivingSession, ResponseArchive, read_entry
+from scrape_metrics import metrics
+from streaming_fetch import stream_movie_page, stream_stats
+from tmdb_api import api_from_env
+from memory_guard import MemoryGuard
+from tmdb_extract import MovieRecord, parse_movie_page, build_json_data
+from tmdb_page import HEADERS, TMDB_DOMAIN, english_url, print_details, scrape_movie_page
+
+DOWNLOAD_FOLDER = "/home/masayume/DATA/E/INSPIRE/@COVERS/MediaCollection/"
+
+def scrape_movie_data(url, session=None, backend=None, restricted=False, stream=False, quiet=False, details=False):
     """
     Scrapes movie data from a TMDb movie page
     
     Args:
         url (str): The TMDb movie page URL
+        session (requests.Session): Optional pooled session to reuse connections
+        backend (str): Parser backend, None for the fastest one installed
+        restricted (bool): Only build the page subtrees the extractors read
+        stream (bool): Stop reading the page once every field has been received
+        quiet (bool): Do not print the title and the record of the movie
+        details (bool): Also extract and print the crew, characters and facts
+                        ai_tool_scraper2 reports, from the same parse
         
     Returns:
         dict: Dictionary containing scraped movie information
     """
-    
-    # Set up headers to mimic a real browser request and force English language
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept-Language': 'en-US,en;q=0.9'
-    }
-    
-    # Add language parameter to URL to force English
-    if '?' in url:
-        url += '&language=en-US'
-    else:
-        url += '?language=en-US'
+    page_url = english_url(url)
     
     try:
-        # Send GET request to the movie page
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        
-        # Parse the HTML content
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Initialize dictionary to store movie data
-        movie_data  = {}
-        json_data   = {}
-        
-        # Extract release date
-        release_date_element = soup.find('span', class_='release_date')
-        if release_date_element:
-            movie_data['release_date'] = re.sub(r'[()]', '', release_date_element.get_text(strip=True) )
-        else:
-            movie_data['release_date'] = None
-
-        # Movie Title
-        movie_title_element = soup.select_one("div.title.ott_true h2 a")
-        movie_title = movie_title_element.get_text(strip=True) if movie_title_element else "N/A"
-        print(f"Movie Title: {movie_title}")
-        if movie_title:
-            movie_data['original_title'] = movie_title
-            json_title = re.sub(r'[^a-zA-Z0-9]', '', movie_title) + re.sub(r'[()]', '',  movie_data['release_date'])
-            json_data[json_title] = {}
-            json_data[json_title]['number'] = 1 ###TODO
-            json_data[json_title]['name'] = movie_title
-            json_data[json_title]['year'] = movie_data['release_date']
+        methods = {}
+        if details:
+            # One parse serving both scripts' fields
+            movie_data, soup = scrape_movie_page(url, session, backend, methods, restricted, stream)
+            soup.decompose()
+            if not quiet:
+                print_details(movie_data)
         else:
-            movie_data['original_title'] = None
-
-        # Extract poster URL
-        poster_element = soup.find('img', class_='poster')
-        if poster_element and poster_element.get('src'):
-            # Convert relative URL to absolute URL
-            poster_url = urljoin('https://www.themoviedb.org', poster_element['src'])
-            movie_data['poster_url'] = poster_url            
-        else:
-            movie_data['poster_url'] = None
-        
-        json_data[json_title]['img'] = movie_data['poster_url']
-
-        # Extract movie genres
-        genres = []
-        genre_elements = soup.find_all('span', class_='genres')
-        for genre_span in genre_elements:
-            # Find all <a> tags within the current span.genres element
-            genre_links = genre_span.find_all('a')
-            for link in genre_links:
-                genre_name = link.get_text(strip=True)
-                if genre_name: # Ensure the text is not empty
-                    genres.append(genre_name)
-
-
-        movie_data['genres'] = genres
-        json_data[json_title]['theme'] = genres
-
-        # Extract director information
-        directors = []
-        
-        # Method 1: Look in the main content area for crew info
-        crew_section = soup.find('section', class_='header_poster_wrapper')
-        if crew_section:
-            # Look for all paragraph elements that might contain director info
-            for p in crew_section.find_all('p'):
-                text = p.get_text(strip=True)
-                if 'Director' in text:
-                    # Try to find the name in an anchor tag within this paragraph
-                    director_link = p.find('a')
-                    if director_link:
-                        directors.append(director_link.get_text(strip=True))
-        
-        # Method 2: Look for crew information in lists
-        if not directors:
-            crew_lists = soup.find_all('ol', class_='people')
-            for crew_list in crew_lists:
-                for item in crew_list.find_all('li'):
-                    # Check if this item contains director information
-                    paragraphs = item.find_all('p')
-                    for p in paragraphs:
-                        if 'Director' in p.get_text():
-                            # Look for the name in the same item
-                            name_link = item.find('a')
-                            if name_link:
-                                directors.append(name_link.get_text(strip=True))
-        
-        # Method 3: Look for director in facts section
-        if not directors:
-            facts_section = soup.find('section', class_='facts')
-            if facts_section:
-                for p in facts_section.find_all('p'):
-                    text = p.get_text(strip=True)
-                    if 'Director' in text:
-                        # Extract everything after "Director"
-                        director_name = text.split('Director')[-1].strip()
-                        if director_name:
-                            directors.append(director_name)
-        
-        # Method 4: Look for any element with director information
-        if not directors:
-            director_elements = soup.find_all(string=re.compile(r'Director', re.IGNORECASE))
-            for elem in director_elements:
-                parent = elem.parent
-                if parent:
-                    # Look for links in the parent or siblings
-                    links = parent.find_all('a')
-                    for link in links:
-                        link_text = link.get_text(strip=True)
-                        if link_text and link_text not in directors:
-                            directors.append(link_text)
-                            break
-        
-        movie_data['directors'] = directors
-        json_data[json_title]['author'] = directors
-
-        # Extract cast information
-        cast_members = []
-        
-        # Method 1: Look for cast in scroller sections with better filtering
-        cast_scroller = soup.find('div', class_='scroller')
-        if cast_scroller:
-            cast_items = cast_scroller.find_all('div', class_='card')
-            for item in cast_items:
-                # Find actor name in the link
-                name_link = item.find('a')
-                if name_link:
-                    actor_name = name_link.get_text(strip=True)
-                    # Filter out navigation text and non-actor content
-                    if (actor_name and 
-                        len(actor_name) > 2 and 
-                        actor_name.lower() not in ['view more', 'more', 'see all', 'view all', 'cast', 'crew']):
-                        # cast_members.append({'actor_name': actor_name})
-                        cast_members.append(actor_name)
-        
-        # Method 2: Look for cast in people lists with better filtering
-        if not cast_members:
-            people_lists = soup.find_all('ol', class_='people')
-            for people_list in people_lists:
-                # Skip if this looks like crew (contains "Director" text)
-                list_text = people_list.get_text()
-                if 'Director' not in list_text:
-                    for item in people_list.find_all('li'):
-                        name_link = item.find('a')
-                        if name_link:
-                            actor_name = name_link.get_text(strip=True)
-                            # Better filtering for actor names
-                            if (actor_name and 
-                                len(actor_name) > 2 and 
-                                not any(word in actor_name.lower() for word in ['view', 'more', 'see all', 'cast', 'crew', 'show all'])):
-                                # cast_members.append({'actor_name': actor_name})
-                                cast_members.append(actor_name)
-
-        
-        # Method 3: Look for specific cast section with h3 "Cast" heading
-        if not cast_members:
-            cast_headings = soup.find_all('h3', string=re.compile(r'Cast', re.IGNORECASE))
-            for heading in cast_headings:
-                # Look for the next sibling that contains cast information
-                next_section = heading.find_next_sibling()
-                if next_section:
-                    links = next_section.find_all('a')
-                    for link in links:
-                        actor_name = link.get_text(strip=True)
-                        # Filter out non-actor content
-                        if (actor_name and 
-                            len(actor_name) > 2 and 
-                            not any(word in actor_name.lower() for word in ['view', 'more', 'see', 'all', 'cast', 'crew', 'show'])):
-                            # cast_members.append({'actor_name': actor_name})
-                            cast_members.append(actor_name)
-
-        
-        # Method 4: Look for profile cards specifically
-        if not cast_members:
-            profile_cards = soup.find_all('div', class_='profile')
-            for card in profile_cards:
-                name_link = card.find('a')
-                if name_link:
-                    actor_name = name_link.get_text(strip=True)
-                    # Check if this is in a cast context (not crew)
-                    card_text = card.get_text().lower()
-                    if ('director' not in card_text and 
-                        'producer' not in card_text and
-                        actor_name and 
-                        len(actor_name) > 2 and 
-                        not any(word in actor_name.lower() for word in ['view', 'more', 'see', 'all', 'cast', 'crew', 'show'])):
-                        # cast_members.append({'actor_name': actor_name})
-                        cast_members.append(actor_name)
-        
-        # Method 5: Look for cast member names in any section with "cast" in the class or id
-        if not cast_members:
-            cast_sections = soup.find_all(['div', 'section'], class_=re.compile(r'cast', re.IGNORECASE))
-            cast_sections.extend(soup.find_all(['div', 'section'], id=re.compile(r'cast', re.IGNORECASE)))
+            # Send GET request to the movie page
+            http = session if session is not None else requests
+            with metrics.timer('stage_seconds', stage='fetch'):
+                response = http.get(page_url, headers=HEADERS, stream=stream)
+            response.raise_for_status()  # Raise an exception for bad status codes
             
-            for section in cast_sections:
-                # Look for person names (typically in <a> tags)
-                links = section.find_all('a')
-                for link in links:
-                    # Check if the link has an href that looks like a person URL
-                    href = link.get('href', '')
-                    if '/person/' in href:
-                        actor_name = link.get_text(strip=True)
-                        if (actor_name and 
-                            len(actor_name) > 2 and 
-                            not any(word in actor_name.lower() for word in ['view', 'more', 'see', 'all', 'cast', 'crew', 'show'])):
-                            # cast_members.append({'actor_name': actor_name})
-                            cast_members.append(actor_name)
-
-        # Remove duplicates while preserving order
-#        seen = set()
-#        unique_cast = []
-#        for member in cast_members:
-#            name = member['actor_name']
-#            if name not in seen:
-#                seen.add(name)
-#                unique_cast.append(member)
-        
-        # movie_data['cast'] = unique_cast
-        movie_data['cast'] = cast_members
-        json_data[json_title]['cast'] = cast_members
-
-        # Extract additional interesting data
+            # Parse the HTML content and extract every field in one pass over the tree
+            if stream:
+                movie_data = stream_movie_page(response, backend, restricted, methods=methods)
+            else:
+                metrics.count('bytes_in_total', len(response.content), kind='page')
+                movie_data = parse_movie_page(response.content, backend, restricted, methods)
+        metrics.count('fallback_method_total', field='directors', method=methods['directors'])
+        metrics.count('fallback_method_total', field='cast', method=methods['cast'])
+        json_data = build_json_data(movie_data, page_url)
+
+        if not quiet:
+            print(f"Movie Title: {movie_data['original_title']}")
+            jsondump = json.dumps(json_data, indent=2)
+            print(f"\njson_data:\n{jsondump} \n")
         
-        # Extract runtime
-        runtime_element = soup.find('span', class_='runtime')
-        if runtime_element:
-            movie_data['runtime'] = runtime_element.get_text(strip=True)
-        else:
-            movie_data['runtime'] = None
-
-        json_data[json_title]['length'] = movie_data['runtime']    
-        
-        # Extract rating/score
-        score_element = soup.find('div', class_='user_score_chart')
-        if score_element:
-            score_text = score_element.get('data-percent')
-            if score_text:
-                movie_data['user_score'] = f"{score_text}%"
-        else:
-            movie_data['user_score'] = None
-
-        json_data[json_title]['score'] = movie_data['user_score']    
+        return json_data
         
-        # Extract overview/plot
-        overview_element = soup.find('div', class_='overview')
-        if overview_element:
-            overview_text = overview_element.find('p')
-            if overview_text:
-                movie_data['overview'] = overview_text.get_text(strip=True)
-        else:
-            movie_data['overview'] = None
+    except requests.RequestException as e:
+        print(f"Error fetching the webpage: {e}")
+        return None
+    except Exception as e:
+        print(f"Error parsing the webpage: {e}")
+        return None
 
-        json_data[json_title]['overview'] = movie_data['overview']    
+def scrape_movie_api(url, api, quiet=False):
+    """
+    Gets the same record as scrape_movie_data from the TMDb JSON API
+    
+    Details and credits come in one request, so there is no HTML to parse
+    and no director or cast heuristics to run.
+    
+    Args:
+        url (str): The TMDb movie page URL
+        api (TmdbApi): The API client
+        quiet (bool): Do not print the title and the record of the movie
         
-        # Extract tagline
-        tagline_element = soup.find('h3', class_='tagline')
-        if tagline_element:
-            movie_data['tagline'] = tagline_element.get_text(strip=True)
-        else:
-            movie_data['tagline'] = None
-
-        json_data[json_title]['tagline'] = movie_data['tagline']    
-
-        json_data[json_title]['url'] = url
-
-        jsondump = json.dumps(json_data, indent=2)
-        print(f"\njson_data:\n{jsondump} \n")
+    Returns:
+        dict: Dictionary containing scraped movie information
+    """
+    url = english_url(url)
+    
+    try:
+        with metrics.timer('stage_seconds', stage='api'):
+            movie_data = api.movie_data(url)
+        json_data = build_json_data(movie_data, url)
+
+        if not quiet:
+            print(f"Movie Title: {movie_data['original_title']}")
+            jsondump = json.dumps(json_data, indent=2)
+            print(f"\njson_data:\n{jsondump} \n")
         
         return json_data
         
     except requests.RequestException as e:
-        print(f"Error fetching the webpage: {e}")
+        print(f"Error fetching the movie from the API: {e}")
         return None
     except Exception as e:
-        print(f"Error parsing the webpage: {e}")
+        print(f"Error reading the API response: {e}")
         return None
 
 def print_movie_data(movie_data):
@@ -352,27 +163,426 @@ def print_movie_data(movie_data):
     else:
         print("\nCast: N/A")
 
-def save_to_json(movie_data, filename='movie_data.json'):
+def save_to_json(movie_data, filename='movie_data.json', quiet=False):
     """
     Saves the scraped movie data to a JSON file
     
     Args:
         movie_data (dict): Dictionary containing movie information
         filename (str): Output filename for the JSON file
+        quiet (bool): Do not print the file name
     """
     try:
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(movie_data, f, indent=2, ensure_ascii=False)
-        print(f"\nMovie data saved to {filename}")
+            metrics.count('bytes_out_total', f.tell(), kind='json')
+        if not quiet:
+            print(f"\nMovie data saved to {filename}")
     except Exception as e:
         print(f"Error saving to JSON file: {e}")
 
-def main():
+def make_session(pool_size=10, cache_dir=None, cache_max_age=86400, cache_size_mb=1024, archive=None,
+                 controller=None):
+    """
+    Creates a keep-alive session whose connection pool is large enough
+    for pool_size concurrent workers, optionally behind the on-disk HTTP cache
+    
+    Every request goes through a RequestController, which adapts the
+    concurrency of each host to its 429 and 5xx responses and retries them.
+    
+    Args:
+        pool_size (int): Number of connections kept open per host
+        cache_dir (str): Folder of the HTTP cache, None to disable caching
+        cache_max_age (int): Seconds a cached response is used without revalidation
+        cache_size_mb (int): Size above which least recently used entries are evicted
+        archive (ResponseArchive): Optional archive receiving every downloaded response
+        controller (RequestController): Shared request controller, None for a default one
+        
+    Returns:
+        ControlledSession or HttpCache: The pooled session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session = ControlledSession(session, controller if controller is not None else RequestController())
+    if archive is not None:
+        session = ArchivingSession(session, archive)
+    if cache_dir:
+        return HttpCache(cache_dir, session, max_age=cache_max_age, max_bytes=cache_size_mb * 1024 * 1024)
+    return session
+
+class HostLimiter:
+    """
+    Caps the number of requests in flight against any single host
+    """
+
+    def __init__(self, per_host=4):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    def slot(self, url):
+        """
+        Returns the semaphore guarding the host of url, to be used in a with block
+        """
+        host = urlparse(url).hostname or ''
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._slots[host]
+
+def download_poster(movie_data, download_folder, session=None, downloader=None):
+    """
+    Downloads the poster of a scraped movie next to its JSON file
+    
+    Args:
+        movie_data (dict): json_data as returned by scrape_movie_data
+        download_folder (str): Destination folder
+        session (requests.Session): Optional pooled session to reuse connections
+        downloader (PosterDownloader): Shared downloader, None for a one-off one
+        
+    Returns:
+        str: The poster file name, relative to download_folder, None when the movie has no poster
+    """
+    firstkey = list(movie_data.keys())
+    if not movie_data[firstkey[0]]['img']:
+        return None
+
+    if downloader is not None:
+        return downloader.download(movie_data[firstkey[0]]['img'], firstkey[0])
+
+    downloader = make_downloader(download_folder, session)
+    try:
+        return downloader.download(movie_data[firstkey[0]]['img'], firstkey[0])
+    finally:
+        downloader.save()
+
+def make_downloader(download_folder, session=None, chunk_size=64 * 1024):
+    """
+    Creates the poster downloader for a folder
+    
+    Posters bypass the HTTP cache: the downloader keeps its own manifest of
+    validators and hashes and needs Range requests to resume transfers.
+    """
+    if isinstance(session, HttpCache):
+        session = session.session
+    return PosterDownloader(download_folder, session, chunk_size=chunk_size)
+
+def save_movie(movie_data, download_folder, session=None, downloader=None, catalog=None, quiet=False):
+    """
+    Downloads the poster and writes the <TitleYear>.json file of a scraped movie
+    
+    Args:
+        movie_data (dict): json_data as returned by scrape_movie_data
+        download_folder (str): Destination folder
+        session (requests.Session): Optional pooled session to reuse connections
+        downloader (PosterDownloader): Shared downloader, None for a one-off one
+        catalog (MovieCatalog): Optional catalog assigning the movie number
+        quiet (bool): Do not print the saved file names
+    """
+    firstkey = list(movie_data.keys())
+    filename = os.path.join(download_folder, firstkey[0] + ".json")
+
+    with metrics.timer('stage_seconds', stage='poster'):
+        movie_data[firstkey[0]]['img'] = download_poster(movie_data, download_folder, session, downloader)
+
+    with metrics.timer('stage_seconds', stage='save'):
+        if catalog is not None:
+            catalog.upsert(movie_data)
+        save_to_json(movie_data, filename, quiet)
+
+    if not quiet:
+        if movie_data[firstkey[0]]['img']:
+            print(f"Successfully downloaded poster for '{firstkey[0]}' to: {download_folder}")
+        else:
+            print(f"No poster for '{firstkey[0]}', saved its JSON only")
+
+def read_batch_urls(source):
+    """
+    Reads movie URLs, one per line, from a file or from stdin
+    
+    Args:
+        source (str): Path of the URL list, or '-' for stdin
+        
+    Returns:
+        list: URLs in input order, without blanks, comments and duplicates
+    """
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+    urls = []
+    seen = set()
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#') and line not in seen:
+            seen.add(line)
+            urls.append(line)
+    return urls
+
+def run_batch(urls, download_folder, workers=8, per_host=4, backend=None, restricted=False, session=None,
+              chunk_size=64 * 1024, catalog=None, refresh=False, stream=False, quiet=False, api=None,
+              details=False, memory=None, on_record=None):
+    """
+    Scrapes many movie pages concurrently over one shared keep-alive session
+    
+    Args:
+        urls (list): TMDb movie page URLs
+        download_folder (str): Destination folder for JSON files and posters
+        workers (int): Size of the worker pool
+        per_host (int): Maximum concurrent requests against a single host
+        backend (str): Parser backend, None for the fastest one installed
+        restricted (bool): Only build the page subtrees the extractors read
+        session (requests.Session or HttpCache): Shared session, None for a new pooled one
+        chunk_size (int): Poster download chunk size in bytes
+        catalog (MovieCatalog): Optional catalog receiving every record
+        refresh (bool): Scrape URLs already in the catalog again
+        stream (bool): Stop reading each page once every field has been received
+        quiet (bool): Only print errors and the final summary
+        api (TmdbApi): Get the movies from the TMDb JSON API instead of the HTML pages
+        details (bool): Also print the crew, characters and facts of every movie
+        memory (MemoryGuard): Hand out one page at a time per free worker and hold
+                              them back while the process is over its RSS budget
+        on_record (callable): Called with (url, json_data) of every scraped movie,
+                              from the worker threads, before its poster is downloaded
+        
+    Returns:
+        tuple: (number of movies saved, list of failed URLs)
+    """
+    if catalog is not None and not refresh:
+        known = catalog.known_urls()
+        skipped = len(urls)
+        urls = [url for url in urls if url_key(url) not in known]
+        skipped -= len(urls)
+        if skipped:
+            print(f"Skipping {skipped} URLs already in the catalog")
+
+    own_session = session is None
+    if own_session:
+        session = make_session(pool_size=workers, controller=RequestController(per_host))
+    limiter = HostLimiter(per_host)
+    downloader = make_downloader(download_folder, session, chunk_size)
+
+    def process(url):
+        with limiter.slot(url):
+            if api is not None:
+                movie_data = scrape_movie_api(url, api, quiet)
+            else:
+                movie_data = scrape_movie_data(url, session, backend, restricted, stream, quiet, details)
+        if not movie_data:
+            return False
+        if on_record is not None:
+            on_record(url, movie_data)
+        firstkey = list(movie_data.keys())
+        with limiter.slot(movie_data[firstkey[0]]['img'] or ''):
+            save_movie(movie_data, download_folder, session, downloader, catalog, quiet)
+        return True
+
+    saved = 0
+    failed = []
+    lock = threading.Lock()
+
+    def finish(url, future):
+        nonlocal saved
+        try:
+            done = future.result()
+        except Exception as e:
+            print(f"Error processing {url}: {e}")
+            done = False
+        metrics.count('movies_total', result='saved' if done else 'failed')
+        with lock:
+            if done:
+                saved += 1
+            else:
+                failed.append(url)
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            if memory is None:
+                futures = {executor.submit(process, url): url for url in urls}
+                for future in as_completed(futures):
+                    finish(futures[future], future)
+            else:
+                # No backlog of submitted pages, and no future kept once finished,
+                # so memory does not grow with the size of the batch
+                slots = threading.BoundedSemaphore(workers)
+
+                def finished(url):
+                    def callback(future):
+                        finish(url, future)
+                        memory.done()
+                        slots.release()
+                    return callback
+
+                for url in urls:
+                    slots.acquire()
+                    memory.wait()
+                    executor.submit(process, url).add_done_callback(finished(url))
+    finally:
+        # Keep the manifest of finished and partial posters for the next run
+        downloader.save()
+    if own_session:
+        session.close()
+
+    elapsed = time.perf_counter() - start
+    rate = len(urls) / elapsed if elapsed > 0 else 0.0
+    print(f"\nBatch completed: {saved} saved, {len(failed)} failed, {elapsed:.1f}s ({rate:.2f} movies/s)")
+    for url in failed:
+        print(f"  failed: {url}")
+    print(downloader.summary())
+    if stream:
+        print(stream_stats.summary())
+    if isinstance(session, HttpCache):
+        print(session.stats())
+    controller = find_controller(session)
+    if controller is not None:
+        print(controller.summary())
+    print(metrics.summary())
+    if method_stats.adaptive:
+        print(method_stats.summary())
+    if memory is not None:
+        print(memory.summary())
+    return saved, failed
+
+def extract_record(content, url, backend=None, restricted=False, stats_path=None):
+    """
+    Parse step of the pipeline and of replays, run in a worker process: turns page bytes into a record
+    
+    Args:
+        content (bytes): The movie page HTML
+        url (str): The page URL saved in the record
+        backend (str): Parser backend, None for the fastest one installed
+        restricted (bool): Only build the page subtrees the extractors read
+        stats_path (str): Fallback statistics the worker starts from, loaded once per process
+        
+    Returns:
+        tuple: (MovieRecord, metrics of the worker as a dict, fallback method outcomes for method_stats.merge)
+    """
+    if stats_path and method_stats.path != stats_path:
+        method_stats.load(stats_path)
+    metrics.reset()
+    methods = {'attempts': []}
+    movie_data = parse_movie_page(content, backend, restricted, methods)
+    metrics.count('fallback_method_total', field='directors', method=methods['directors'])
+    metrics.count('fallback_method_total', field='cast', method=methods['cast'])
+    return MovieRecord.from_movie_data(movie_data, url), metrics.to_dict(), methods['attempts']
+
+def replay_record(archive_folder, entry, backend=None, restricted=False, stats_path=None):
+    """
+    Replay worker: reads an archived movie page and extracts its record, see extract_record
+    """
+    return extract_record(read_entry(archive_folder, entry), entry['url'], backend, restricted, stats_path)
+
+def is_movie_page(entry):
+    """
+    Tells whether an archive entry is a TMDb movie page
+    """
+    parts = urlparse(entry['url'])
+    return (parts.hostname == TMDB_DOMAIN and parts.path.startswith('/movie/') and
+            entry['headers'].get('Content-Type', 'text/html').startswith('text/html'))
+
+def replay_archive(archive, download_folder, workers=None, backend=None, restricted=False, catalog=None,
+                   urls=None, quiet=False):
+    """
+    Extracts the records of the movie pages in the archive again, without the network
+    
+    The latest archived version of every movie page is parsed in a process
+    pool and its JSON file rewritten, e.g. after a selector fix. Posters are
+    not downloaded: records point to the poster already in the folder, or
+    keep the poster URL when there is none.
+    
+    Args:
+        archive (ResponseArchive): The archive of a previous run
+        download_folder (str): Destination folder for JSON files
+        workers (int): Number of parse processes, None for one per core
+        backend (str): Parser backend, None for the fastest one installed
+        restricted (bool): Only build the page subtrees the extractors read
+        catalog (MovieCatalog): Optional catalog receiving every record
+        urls (list): Only replay these movie URLs, None for every archived movie page
+        quiet (bool): Do not print every movie, only errors and the summary
+        
+    Returns:
+        tuple: (number of movies saved, list of failed URLs)
+    """
+    entries = [entry for entry in archive.latest() if is_movie_page(entry)]
+    if urls is not None:
+        wanted = {url_key(url) for url in urls}
+        entries = [entry for entry in entries if url_key(entry['url']) in wanted]
+    workers = workers or os.cpu_count() or 1
+    # Only reads the manifest: the downloader never fetches anything here
+    downloader = PosterDownloader(download_folder)
+
+    saved = 0
+    failed = []
+    without_poster = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(replay_record, archive.folder, entry, backend, restricted, method_stats.path):
+                   entry['url'] for entry in entries}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                record, worker_metrics, attempts = future.result()
+            except Exception as e:
+                print(f"Error parsing the archived page {url}: {e}")
+                failed.append(url)
+                metrics.count('movies_total', result='failed')
+                continue
+            metrics.merge(worker_metrics)
+            method_stats.merge(attempts)
+            poster = downloader.known_file(record.img)
+            if poster:
+                record.img = poster
+            else:
+                without_poster += 1
+            movie_data = record.to_json_data()
+            firstkey = list(movie_data.keys())
+            if catalog is not None:
+                catalog.upsert(movie_data)
+            save_to_json(movie_data, os.path.join(download_folder, firstkey[0] + ".json"), quiet)
+            saved += 1
+            metrics.count('movies_total', result='saved')
+
+    elapsed = time.perf_counter() - start
+    rate = len(entries) / elapsed if elapsed > 0 else 0.0
+    print(f"\nReplay completed: {saved} saved, {len(failed)} failed, {elapsed:.1f}s ({rate:.2f} movies/s) "
+          f"with {workers} parse processes")
+    for url in failed:
+        print(f"  failed: {url}")
+    if without_poster:
+        print(f"  {without_poster} records keep the poster URL: their poster was never downloaded")
+    print(metrics.summary())
+    return saved, failed
+
+def write_metrics(json_path=None, prom_path=None):
+    """
+    Writes the metrics collected during the run as JSON and/or Prometheus text
+    
+    Args:
+        json_path (str): Destination of the JSON metrics, None to skip
+        prom_path (str): Destination of the Prometheus text file, None to skip
+    """
+    if json_path:
+        metrics.write_json(json_path)
+        print(f"Metrics saved to {json_path}")
+    if prom_path:
+        metrics.write_prometheus(prom_path)
+        print(f"Metrics saved to {prom_path}")
+
+def main(argv=None, session=None):
     """
     Main function to run the movie scraper
+    
+    Args:
+        argv (list): Command line arguments, None for sys.argv
+        session (requests.Session): Warm session to reuse, e.g. the daemon's; None for a new one
     """
 
-    download_folder = "/home/masayume/DATA/E/INSPIRE/@COVERS/MediaCollection/"
+    download_folder = DOWNLOAD_FOLDER
     
     # The Shawshank Redemption TMDb URL with English language parameter
     movie_url = "https://www.themoviedb.org/movie/278-the-shawshank-redemption?language=en-US"
@@ -384,9 +594,124 @@ def main():
     parser.add_argument('url', type=str, nargs='?',
                         default="https://www.themoviedb.org/movie/278-the-shawshank-redemption?language=en-US",
                         help="The URL of the movie page to scrape. Defaults to The Shawshank Redemption.")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="Scrape every URL listed in FILE (one per line, '-' for stdin) instead of a single URL.")
+    parser.add_argument('--workers', type=int, default=8,
+                        help="Number of concurrent workers in batch mode.")
+    parser.add_argument('--per-host', type=int, default=4,
+                        help="Maximum concurrent requests against a single host in batch mode.")
+    parser.add_argument('--retries', type=int, default=4,
+                        help="Times a request is retried after a 429 or 5xx response or a connection error.")
+    parser.add_argument('--output', default=download_folder,
+                        help="Folder where JSON files and posters are saved.")
+    parser.add_argument('--parser', choices=available_backends(), default=None,
+                        help="HTML parser backend. Defaults to the fastest one installed.")
+    parser.add_argument('--restricted', action='store_true',
+                        help="Only build the page subtrees the extractors read.")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stop downloading a page as soon as every field has been received.")
+    parser.add_argument('--adaptive-fallback', action='store_true',
+                        help="Skip the director and cast fallback methods that have not matched in the last "
+                             "pages (rates kept in .fallback_stats.json).")
+    parser.add_argument('--details', action='store_true',
+                        help="Also print the crew, characters and facts ai_tool_scraper2.py reports, from the same download.")
+    parser.add_argument('--api', action='store_true',
+                        help="Get the movies from the TMDb JSON API instead of scraping the HTML pages.")
+    parser.add_argument('--api-key',
+                        help="TMDb v3 API key for --api. Defaults to TMDB_API_KEY, or TMDB_ACCESS_TOKEN as bearer token.")
+    parser.add_argument('--quiet', action='store_true',
+                        help="Do not print every scraped movie, only errors and the summary.")
+    parser.add_argument('--memory-budget', type=int, metavar='MB',
+                        help="In batch mode, hold back new pages while the process RSS is over MB.")
+    parser.add_argument('--trace-memory', type=int, default=0, metavar='N',
+                        help="With --memory-budget, trace allocations and report the N top allocating lines.")
+    parser.add_argument('--metrics-json', metavar='FILE',
+                        help="Write stage and field timings, fallback method counts and byte counts as JSON.")
+    parser.add_argument('--metrics-prom', metavar='FILE',
+                        help="Write the same metrics in the Prometheus text format.")
+    parser.add_argument('--catalog', metavar='DB',
+                        help="SQLite catalog assigning movie numbers; batch mode skips URLs already in it.")
+    parser.add_argument('--refresh', action='store_true',
+                        help="In batch mode, scrape URLs already in the catalog again.")
+    parser.add_argument('--chunk-size', type=int, default=64,
+                        help="Poster download chunk size in KB.")
+    parser.add_argument('--cache', metavar='DIR',
+                        help="Cache pages in DIR and revalidate them with ETag / If-Modified-Since.")
+    parser.add_argument('--cache-max-age', type=int, default=86400,
+                        help="Seconds a cached response is reused without revalidation.")
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help="Cache size in MB above which least recently used entries are evicted.")
+    parser.add_argument('--archive', metavar='DIR',
+                        help="Append every downloaded page to the compressed response archive in DIR.")
+    parser.add_argument('--archive-size', type=int, default=4096,
+                        help="Archive size in MB above which the oldest segments are deleted.")
+    parser.add_argument('--replay', action='store_true',
+                        help="Extract the movie pages of --archive again without the network and rewrite their "
+                             "JSON files. With --batch, only the listed movies.")
 
     # Parse the arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    download_folder = args.output
+    method_stats.adaptive = args.adaptive_fallback
+    method_stats.load(os.path.join(download_folder, STATS_NAME))
+
+    archive = None
+    if args.archive:
+        archive = ResponseArchive(args.archive, max_bytes=args.archive_size * 1024 * 1024)
+    elif args.replay:
+        parser.error("--replay needs --archive DIR")
+
+    if args.replay:
+        catalog = MovieCatalog(args.catalog) if args.catalog else None
+        urls = read_batch_urls(args.batch) if args.batch else None
+        print(f"Replaying the archived movie pages of {args.archive}...")
+        try:
+            replay_archive(archive, download_folder, backend=args.parser, restricted=args.restricted,
+                           catalog=catalog, urls=urls, quiet=args.quiet)
+        finally:
+            archive.close()
+            if catalog is not None:
+                catalog.close()
+        method_stats.save()
+        write_metrics(args.metrics_json, args.metrics_prom)
+        return
+
+    own_session = session is None
+    if own_session:
+        session = make_session(pool_size=args.workers, cache_dir=args.cache,
+                               cache_max_age=args.cache_max_age, cache_size_mb=args.cache_size, archive=archive,
+                               controller=RequestController(args.per_host, retries=args.retries))
+    elif archive is not None:
+        session = ArchivingSession(session, archive)
+    if args.cache and not own_session:
+        session = HttpCache(args.cache, session, max_age=args.cache_max_age,
+                            max_bytes=args.cache_size * 1024 * 1024)
+    api = None
+    if args.api:
+        try:
+            api = api_from_env(args.api_key, session)
+        except ValueError as e:
+            parser.error(str(e))
+    catalog = MovieCatalog(args.catalog) if args.catalog else None
+
+    if args.batch:
+        urls = read_batch_urls(args.batch)
+        print(f"Scraping {len(urls)} movies from TMDb with {args.workers} workers...")
+        run_batch(urls, download_folder, workers=args.workers, per_host=args.per_host,
+                  backend=args.parser, restricted=args.restricted, session=session,
+                  chunk_size=args.chunk_size * 1024, catalog=catalog, refresh=args.refresh,
+                  stream=args.stream, quiet=args.quiet, api=api, details=args.details,
+                  memory=MemoryGuard(args.memory_budget, args.trace_memory) if args.memory_budget else None)
+        if own_session:
+            session.close()
+        if catalog is not None:
+            catalog.close()
+        if archive is not None:
+            print(archive.stats())
+            archive.close()
+        method_stats.save()
+        write_metrics(args.metrics_json, args.metrics_prom)
+        return
 
     # Use the URL from the arguments
     movie_url = args.url    
@@ -394,49 +719,37 @@ def main():
     print(f"URL: {movie_url}")
     
     # Scrape the movie data
-    movie_data = scrape_movie_data(movie_url)
+    if api is not None:
+        movie_data = scrape_movie_api(movie_url, api, quiet=args.quiet)
+    else:
+        movie_data = scrape_movie_data(movie_url, session, backend=args.parser, restricted=args.restricted,
+                                       stream=args.stream, quiet=args.quiet, details=args.details)
     
     if movie_data:
         # Print the scraped data
-        print_movie_data(movie_data)
+        if not args.quiet:
+            print_movie_data(movie_data)
         
-        # Save to JSON file
-        firstkey = []
-        firstkey = list(movie_data.keys())
-
-        filename = os.path.join(download_folder, firstkey[0] + ".json")
-
-        response = requests.get(movie_data[firstkey[0]]['img'], stream=True)
-        response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-        content_type = response.headers.get('Content-Type')
-        extension = mimetypes.guess_extension(content_type) if content_type else None
-        poster_name = f"{firstkey[0]}{extension}"
-        file_path = os.path.join(download_folder, poster_name)
-
-        # Download the image in chunks
-        with open(file_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-
-        movie_data[firstkey[0]]['img'] = firstkey[0] + extension
+        # Save to JSON file and download the poster
+        downloader = make_downloader(download_folder, session, args.chunk_size * 1024)
+        try:
+            save_movie(movie_data, download_folder, session, downloader, catalog, args.quiet)
+            print("\nScraping completed successfully!")
+        except requests.RequestException as e:
+            print(f"Error downloading the poster: {e}")
+        finally:
+            downloader.save()
+            if catalog is not None:
+                catalog.close()
 
-        save_to_json(movie_data, filename)
-
-        print(f"Successfully downloaded poster for '{firstkey[0]}' to: {download_folder}")
-  
-        # Determine the file extension
-        # 1. Try to get it from the Content-Type header
-        content_type = response.headers.get('Content-Type')
-        extension = mimetypes.guess_extension(content_type) if content_type else None
-
-
-###TODO save the poster img (movie_data['poster_url']) too as firstkey[0] . proper image extension
-        
-        print("\nScraping completed successfully!")
     else:
         print("Failed to scrape movie data.")
+    if archive is not None:
+        archive.close()
+    method_stats.save()
+    write_metrics(args.metrics_json, args.metrics_prom)
 
 if __name__ == "__main__":
     # Install required packages if not already installed
     # pip install requests beautifulsoup4
-    main()
\ No newline at end of file
+    main()